@@ -0,0 +1,224 @@
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import effort_rating
+import heatmap_arbitrary_pitch
+import load_and_preprocess_data
+import substitution_insight
+from match_store import clear_match_cache
+from match_times import load_schedule
+from synthetic_data import generate_season
+
+# Paths
+benchmark_dir = "./benchmarks"
+
+# Data size multiplier -> (players, matches); 1x is the size of the real season
+SIZES = {1: (1, 6), 10: (2, 30), 100: (20, 30)}
+
+BENCHMARK_STAGES = ['preprocess', 'global_max_min', 'effort_rating', 'heatmap', 'substitution']
+
+# Calls per stage traced for peak memory; every call is timed
+MEMORY_SAMPLE = 6
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _heatmap(match, data_folder):
+    gps_data = heatmap_arbitrary_pitch.load_gps_data(match['date'], data_folder)
+    return heatmap_arbitrary_pitch.generate_heatmap(gps_data, match['date'], match['match_start'], match['match_end'])
+
+def _substitution(match, data_folder):
+    # Aligned from the sources on every call, without the aligned frame cache
+    match_data = substitution_insight.load_match_data(
+        match['date'], match['tolerance_start'], match['tolerance_end'], data_folder, cache_dir=None)
+    return substitution_insight.generate_substitution_recommendations(
+        match['date'], match['tolerance_start'], match['tolerance_end'], match_data, 22)
+
+def stage_calls(stage, season_dir, schedule, players):
+    """
+    Calls that make up one benchmark stage over a synthetic season.
+
+    Every call reads its match data itself, so loading is part of each stage's
+    time (measured cold, see measure_stage).
+
+    Yields:
+        callable: A setup function returning (function, args). Setup work, such
+        as the normalization bounds of effort ratings, is not timed.
+    """
+    raw_dir = os.path.join(season_dir, "raw_data", "players")
+    processed_dir = os.path.join(season_dir, "processed_data", "players")
+    output_dir = os.path.join(season_dir, "outputs")
+    match_dates = list(schedule['date'])
+
+    for player in players:
+        raw_path, data_folder = os.path.join(raw_dir, player), os.path.join(processed_dir, player)
+        if stage == 'global_max_min':
+            yield lambda data_folder=data_folder: (effort_rating.calculate_global_max_min, (match_dates, data_folder, {}))
+            continue
+
+        if stage == 'effort_rating':
+            # Normalization bounds are an input of the rating, not part of its cost
+            bounds = effort_rating.calculate_global_max_min(match_dates, data_folder, {})
+        for _, match in schedule.iterrows():
+            match_date = match['date']
+            if stage == 'preprocess':
+                yield lambda raw_path=raw_path, data_folder=data_folder, match_date=match_date: (
+                    load_and_preprocess_data.preprocess_match, (raw_path, data_folder, match_date))
+            elif stage == 'effort_rating':
+                yield lambda data_folder=data_folder, match_date=match_date, bounds=bounds: (
+                    effort_rating.calculate_effort_rating, (match_date, data_folder, output_dir, bounds, {}))
+            elif stage == 'heatmap':
+                yield lambda data_folder=data_folder, match=match: (_heatmap, (match, data_folder))
+            elif stage == 'substitution':
+                yield lambda data_folder=data_folder, match=match: (_substitution, (match, data_folder))
+
+def measure_stage(calls, memory=True):
+    """
+    Time every call of a stage, and trace peak memory on the first MEMORY_SAMPLE calls.
+
+    Memory is measured in a second pass so tracing overhead does not affect the
+    timings. tracemalloc sees Python and NumPy allocations, not Arrow buffers.
+    The in-process match cache is emptied (after any background reads finish)
+    before every call, so each call loads its data from disk.
+
+    Returns:
+        dict: calls, total and per-call seconds, and peak allocation of a single call in MiB.
+    """
+    calls = list(calls)
+    durations = []
+    for setup in calls:
+        with redirect_stdout(io.StringIO()):
+            func, args = setup()
+            clear_match_cache()
+            started = time.perf_counter()
+            func(*args)
+            durations.append(time.perf_counter() - started)
+
+    result = {
+        'calls': len(durations),
+        'seconds': float(np.sum(durations)),
+        'mean_seconds': float(np.mean(durations)) if durations else 0.0,
+        'max_seconds': float(np.max(durations)) if durations else 0.0,
+    }
+
+    if memory:
+        peak = 0
+        tracemalloc.start()
+        for setup in calls[:MEMORY_SAMPLE]:
+            with redirect_stdout(io.StringIO()):
+                func, args = setup()
+                clear_match_cache()
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                func(*args)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+        result['peak_mib'] = peak / 2 ** 20
+    return result
+
+def run_benchmarks(sizes=SIZES, stages=BENCHMARK_STAGES, memory=True, seed=0):
+    """
+    Benchmark each stage on deterministic synthetic seasons of the given sizes.
+
+    Seasons are generated once under benchmarks/data/ and reused. The working
+    directory is switched to each season so stage outputs stay inside it.
+
+    Returns:
+        dict: Run metadata and size -> stage -> measurements.
+    """
+    root = os.path.abspath(os.getcwd())
+    results = {
+        'commit': _git_commit(),
+        'created': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'sizes': {},
+    }
+
+    for size, (n_players, n_matches) in sizes.items():
+        season_dir = os.path.normpath(os.path.join(root, benchmark_dir, "data", f"size_{size}_seed_{seed}"))
+        schedule_path = os.path.join(season_dir, "reference_data", "hockey_matches_schedule.csv")
+        if not os.path.exists(schedule_path):
+            generate_season(season_dir, n_players, n_matches, seed)
+        schedule = load_schedule(schedule_path)
+        players = list(pd.read_csv(os.path.join(season_dir, "reference_data", "players.csv"))['player'])
+
+        os.chdir(season_dir)
+        try:
+            size_results = {'players': n_players, 'matches': n_matches, 'stages': {}}
+            for stage in stages:
+                print(f"[{size}x] {stage}...")
+                size_results['stages'][stage] = measure_stage(stage_calls(stage, season_dir, schedule, players), memory)
+        finally:
+            os.chdir(root)
+        results['sizes'][str(size)] = size_results
+    return results
+
+def compare_results(baseline, current, threshold=1.1):
+    """
+    Print the time and memory ratio of every stage between two benchmark runs.
+
+    Returns:
+        list: (size, stage, metric, ratio) for every ratio above threshold.
+    """
+    regressions = []
+    print(f"Comparing {current.get('commit')} against {baseline.get('commit')}:")
+    for size, size_results in current['sizes'].items():
+        for stage, measured in size_results['stages'].items():
+            base = baseline['sizes'].get(size, {}).get('stages', {}).get(stage)
+            if base is None:
+                continue
+            ratios = []
+            for metric in ('seconds', 'peak_mib'):
+                if base.get(metric) and metric in measured:
+                    ratio = measured[metric] / base[metric]
+                    ratios.append(f"{metric} x{ratio:.2f}")
+                    if ratio > threshold:
+                        regressions.append((size, stage, metric, ratio))
+            print(f"  [{size}x] {stage}: {', '.join(ratios)}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic seasons.")
+    parser.add_argument("--sizes", nargs="+", type=int, choices=sorted(SIZES), default=sorted(SIZES), help="Data size multipliers to run.")
+    parser.add_argument("--stages", nargs="+", choices=BENCHMARK_STAGES, default=BENCHMARK_STAGES, help="Stages to benchmark, in order.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the memory tracing pass.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic seasons.")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Compare the new results against an earlier run.")
+    args = parser.parse_args()
+
+    results = run_benchmarks({size: SIZES[size] for size in args.sizes}, args.stages, not args.no_memory, args.seed)
+
+    results_dir = os.path.join(benchmark_dir, "results")
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = results['created'].replace(':', '').replace('-', '')
+    results_path = os.path.join(results_dir, f"benchmark_{stamp}_{(results['commit'] or 'unknown')[:8]}.json")
+    with open(results_path, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Benchmark results saved to {results_path}.")
+
+    for size, size_results in results['sizes'].items():
+        for stage, measured in size_results['stages'].items():
+            memory = f", peak {measured['peak_mib']:.1f} MiB" if 'peak_mib' in measured else ""
+            print(f"[{size}x] {stage}: {measured['seconds']:.2f} s over {measured['calls']} calls{memory}")
+
+    if args.compare:
+        with open(args.compare, "r") as file:
+            if compare_results(json.load(file), results):
+                sys.exit(1)
@@ -1,60 +1,171 @@
 import os
+import json
+import hashlib
 import pandas as pd
+from instrumentation import instrumented
+from match_store import MatchData, prefetched, source_path
+from results_store import connect, write_effort_ratings
 
-def calculate_effort_rating(match_date, data_folder, output_folder, global_max_min):
+# On-disk cache of per-match effort components
+COMPONENT_CACHE_PATH = "./cache/effort_components.json"
+
+# Running global min/max used to normalize effort components
+NORMALIZATION_STATE_PATH = "./cache/normalization_state.json"
+
+# Effort components: key -> (signal, column, aggregation)
+EFFORT_COMPONENTS = {
+    'active_zone_minutes': ('active_zone_minutes_day', 'total minutes', 'sum'),
+    'calories': ('calories', 'calories', 'sum'),
+    'distance': ('distance', 'distance', 'sum'),
+    'steps': ('steps', 'steps', 'sum'),
+    'avg_heart_rate': ('heart_rate', 'beats per minute', 'mean'),
+    'peak_exercise_heart_rate': ('UserExercises', 'tracker_peak_heart_rate', 'max'),
+}
+
+# Version of the component definitions; cached components of another version are re-extracted
+COMPONENTS_VERSION = hashlib.sha256(json.dumps(EFFORT_COMPONENTS, sort_keys=True).encode()).hexdigest()[:16]
+
+# Columns read per signal for the effort components
+EFFORT_COLUMNS = {
+    signal: [column for other, column, _ in EFFORT_COMPONENTS.values() if other == signal]
+    for signal, _, _ in EFFORT_COMPONENTS.values()
+}
+
+# Weights of each normalized component in the effort rating
+EFFORT_WEIGHTS = {
+    'active_zone_minutes': 0.35,
+    'calories': 0.3,
+    'distance': 0.25,
+    'steps': 0.05,
+    'avg_heart_rate': 0.025,
+    'peak_exercise_heart_rate': 0.025,
+}
+
+@instrumented('compute')
+def extract_effort_components(match_date, data_folder):
     """
-    Calculate an effort rating (out of 10) for a given match day based on various metrics.
+    Compute the raw effort components for a match, reading its signals concurrently.
 
     Args:
         match_date (str): The date of the match (YYYY-MM-DD).
         data_folder (str): Path to the folder containing the match data.
-        output_folder (str): Path to the folder where results will be saved.
-        global_max_min (dict): Global max and min values for normalization.
 
     Returns:
-        None: Saves the effort rating to a CSV file.
+        dict: Component name -> value (0 when the source signal is missing).
     """
-    match_data_path = os.path.join(data_folder, f"match_{match_date}")
-    if not os.path.exists(match_data_path):
-        print(f"No data folder for match {match_date}. Skipping.")
-        return
+    signals = MatchData(match_date, data_folder).load_many(EFFORT_COLUMNS)
+    effort_components = {}
+    for key, (signal, column, aggregation) in EFFORT_COMPONENTS.items():
+        data = signals[signal]
+        value = data[column].agg(aggregation) if data is not None else 0
+        # Plain Python numbers so components can be cached as JSON
+        effort_components[key] = value.item() if hasattr(value, 'item') else value
+    return effort_components
 
-    # Ensure the effort ratings folder exists
-    effort_ratings_folder = os.path.join(output_folder, "effort_ratings")
-    os.makedirs(effort_ratings_folder, exist_ok=True)
+def _file_fingerprint(path, previous=None):
+    """
+    Fingerprint a source file by size, mtime and SHA-256 of its content.
 
-    # Initialize effort components
-    effort_components = {}
+    The content hash is only recomputed when size or mtime differ from the
+    previous fingerprint, so unchanged files are never re-read.
+    """
+    stat = os.stat(path)
+    fingerprint = {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if previous and all(previous.get(k) == fingerprint[k] for k in ('path', 'size', 'mtime_ns')):
+        fingerprint['sha256'] = previous['sha256']
+        return fingerprint
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    fingerprint['sha256'] = digest.hexdigest()
+    return fingerprint
+
+def load_component_cache(cache_path=COMPONENT_CACHE_PATH):
+    """
+    Load the per-match effort component cache, or an empty cache if none exists.
+    """
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as file:
+            return json.load(file)
+    return {}
+
+def save_component_cache(cache, cache_path=COMPONENT_CACHE_PATH):
+    """
+    Persist the per-match effort component cache.
+    """
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, "w") as file:
+        json.dump(cache, file, indent=2)
+
+def _content_key(sources):
+    # What the components depend on: each source's path and content hash, not its size or mtime
+    return {signal: (source['path'], source['sha256']) if source else None for signal, source in sources.items()}
+
+def _needs_extraction(match_date, data_folder, cache):
+    # Cheap pre-check (size and mtime only) of whether a match may be re-read, to decide what to prefetch
+    entry = cache.get(match_date, {})
+    sources = entry.get('sources')
+    if sources is None or entry.get('version') != COMPONENTS_VERSION:
+        return True
+    for signal in EFFORT_COLUMNS:
+        path = source_path(match_date, signal, data_folder)
+        previous = sources.get(signal)
+        if (path is None) != (previous is None):
+            return True
+        if path is not None:
+            stat = os.stat(path)
+            if (path, stat.st_size, stat.st_mtime_ns) != (previous['path'], previous['size'], previous['mtime_ns']):
+                return True
+    return False
+
+def get_effort_components(match_date, data_folder, cache):
+    """
+    Return the effort components for a match, re-reading its data only if it changed.
+
+    Sources are compared by content hash; size and mtime only decide whether a
+    file is rehashed, so a file rewritten with identical content is not re-read.
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        data_folder (str): Path to the folder containing the match data.
+        cache (dict): Component cache from load_component_cache, updated in place.
+
+    Returns:
+        dict or None: Effort components, or None if the match has no data folder.
+    """
+    if not os.path.exists(os.path.join(data_folder, f"match_{match_date}")):
+        return None
+
+    entry = cache.get(match_date, {})
+    previous_sources = entry.get('sources', {})
+    sources = {}
+    for signal, _, _ in EFFORT_COMPONENTS.values():
+        path = source_path(match_date, signal, data_folder)
+        sources[signal] = _file_fingerprint(path, previous_sources.get(signal)) if path else None
+
+    if (entry.get('version') == COMPONENTS_VERSION and 'components' in entry
+            and _content_key(sources) == _content_key(previous_sources)):
+        # Keep the new sizes and mtimes, so the next run skips rehashing
+        entry['sources'] = sources
+        return entry['components']
 
-    # Load and process data
-    def load_and_sum(file_path, column, key):
-        if os.path.exists(file_path):
-            data = pd.read_csv(file_path)
-            effort_components[key] = data[column].sum()
-        else:
-            effort_components[key] = 0
-
-    load_and_sum(os.path.join(match_data_path, "active_zone_minutes_day.csv"), "total minutes", "active_zone_minutes")
-    load_and_sum(os.path.join(match_data_path, "calories.csv"), "calories", "calories")
-    load_and_sum(os.path.join(match_data_path, "distance.csv"), "distance", "distance")
-    load_and_sum(os.path.join(match_data_path, "steps.csv"), "steps", "steps")
-
-    # Load heart rate data
-    hr_path = os.path.join(match_data_path, "heart_rate.csv")
-    if os.path.exists(hr_path):
-        hr_data = pd.read_csv(hr_path)
-        effort_components['avg_heart_rate'] = hr_data['beats per minute'].mean()
-    else:
-        effort_components['avg_heart_rate'] = 0
-
-    # Load User Exercises
-    exercises_path = os.path.join(match_data_path, "UserExercises.csv")
-    if os.path.exists(exercises_path):
-        exercises_data = pd.read_csv(exercises_path)
-        effort_components['peak_exercise_heart_rate'] = exercises_data['tracker_peak_heart_rate'].max()
-    else:
-        effort_components['peak_exercise_heart_rate'] = 0
+    components = extract_effort_components(match_date, data_folder)
+    cache[match_date] = {'version': COMPONENTS_VERSION, 'sources': sources, 'components': components}
+    return components
 
+def compute_effort_rating(effort_components, global_max_min):
+    """
+    Combine normalized effort components into a rating out of 10.
+
+    Args:
+        effort_components (dict): Raw effort components for a match.
+        global_max_min (dict): Global max and min values for normalization.
+
+    Returns:
+        float: The effort rating, rounded to 2 decimals.
+    """
     # Global normalization
     normalized_components = {
         key: (value - global_max_min[key]['min']) / (global_max_min[key]['max'] - global_max_min[key]['min'])
@@ -63,73 +174,110 @@ def calculate_effort_rating(match_date, data_folder, output_folder, global_max_m
     }
 
     # Weighted combination with adjusted weights
-    effort_rating = (
-        (normalized_components.get('active_zone_minutes', 0) * 0.35) +
-        (normalized_components.get('calories', 0) * 0.3) +
-        (normalized_components.get('distance', 0) * 0.25) +
-        (normalized_components.get('steps', 0) * 0.05) +
-        (normalized_components.get('avg_heart_rate', 0) * 0.025) +
-        (normalized_components.get('peak_exercise_heart_rate', 0) * 0.025)
+    effort_rating = sum(
+        normalized_components.get(key, 0) * weight for key, weight in EFFORT_WEIGHTS.items()
     ) * 10  # Scale to 10
 
     # Add a boost factor without lower clipping
     boost_factor = 0.3
-    effort_rating = round(effort_rating + boost_factor, 2)
+    return round(effort_rating + boost_factor, 2)
+
+def compute_effort_ratings(components):
+    """
+    Vectorized compute_effort_rating for many matches (or players) at once.
+
+    Every component is normalized by the min and max over all rows, so ratings
+    are comparable across the whole frame.
+
+    Args:
+        components (pd.DataFrame): One row of raw effort components per match.
+
+    Returns:
+        pd.Series: Effort ratings, rounded to 2 decimals, on the frame's index.
+    """
+    values = components[list(EFFORT_COMPONENTS)].astype(float)
+    spread = values.max() - values.min()
+    normalized = ((values - values.min()) / spread.where(spread > 0)).fillna(0)
+    weights = pd.Series(EFFORT_WEIGHTS)
+    effort_rating = normalized[weights.index].mul(weights).sum(axis=1) * 10
+
+    # Same boost factor as compute_effort_rating
+    boost_factor = 0.3
+    return (effort_rating + boost_factor).round(2)
+
+def write_effort_rating(match_date, effort_components, effort_rating, output_folder):
+    """
+    Save an effort rating CSV, leaving the file untouched if its content is unchanged.
+
+    Returns:
+        bool: True if the file was (re)written.
+    """
+    effort_ratings_folder = os.path.join(output_folder, "effort_ratings")
+    os.makedirs(effort_ratings_folder, exist_ok=True)
 
-    # Save the result
     output_path = os.path.join(effort_ratings_folder, f"effort_rating_{match_date}.csv")
-    pd.DataFrame([{**effort_components, 'effort_rating': effort_rating}]).to_csv(output_path, index=False)
+    content = pd.DataFrame([{**effort_components, 'effort_rating': effort_rating}]).to_csv(index=False)
+    if os.path.exists(output_path):
+        with open(output_path, "r") as file:
+            if file.read() == content:
+                return False
+
+    with open(output_path, "w") as file:
+        file.write(content)
     print(f"Effort rating for {match_date} saved to {output_path}.")
+    return True
+
+def calculate_effort_rating(match_date, data_folder, output_folder, global_max_min, cache=None):
+    """
+    Calculate an effort rating (out of 10) for a given match day based on various metrics.
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        data_folder (str): Path to the folder containing the match data.
+        output_folder (str): Path to the folder where results will be saved.
+        global_max_min (dict): Global max and min values for normalization.
+        cache (dict, optional): Effort component cache; loaded from disk if omitted.
+
+    Returns:
+        None: Saves the effort rating to a CSV file and the results store.
+    """
+    if cache is None:
+        cache = load_component_cache()
 
-def calculate_global_max_min(match_dates, data_folder):
+    effort_components = get_effort_components(match_date, data_folder, cache)
+    if effort_components is None:
+        print(f"No data folder for match {match_date}. Skipping.")
+        return
+
+    effort_rating = compute_effort_rating(effort_components, global_max_min)
+    write_effort_rating(match_date, effort_components, effort_rating, output_folder)
+    conn = connect()
+    write_effort_ratings(conn, [(match_date, effort_components, effort_rating)])
+    conn.close()
+
+def calculate_global_max_min(match_dates, data_folder, cache=None):
     """
     Calculate global max and min values for each metric across all matches.
 
     Args:
         match_dates (list): List of match dates (YYYY-MM-DD).
         data_folder (str): Path to the folder containing the match data.
+        cache (dict, optional): Effort component cache; loaded from disk if omitted.
 
     Returns:
         dict: Dictionary with global max and min values for each metric.
     """
-    metrics = ['active_zone_minutes', 'calories', 'distance', 'steps', 'avg_heart_rate', 'peak_exercise_heart_rate']
-    global_max_min = {metric: {'max': float('-inf'), 'min': float('inf')} for metric in metrics}
+    if cache is None:
+        cache = load_component_cache()
 
-    for match_date in match_dates:
-        match_data_path = os.path.join(data_folder, f"match_{match_date}")
-        if not os.path.exists(match_data_path):
-            continue
+    global_max_min = {metric: {'max': float('-inf'), 'min': float('inf')} for metric in EFFORT_COMPONENTS}
 
-        effort_components = {}
-
-        # Load and sum data
-        def load_and_sum(file_path, column, key):
-            if os.path.exists(file_path):
-                data = pd.read_csv(file_path)
-                effort_components[key] = data[column].sum()
-            else:
-                effort_components[key] = 0
-
-        load_and_sum(os.path.join(match_data_path, "active_zone_minutes_day.csv"), "total minutes", "active_zone_minutes")
-        load_and_sum(os.path.join(match_data_path, "calories.csv"), "calories", "calories")
-        load_and_sum(os.path.join(match_data_path, "distance.csv"), "distance", "distance")
-        load_and_sum(os.path.join(match_data_path, "steps.csv"), "steps", "steps")
-
-        # Heart rate
-        hr_path = os.path.join(match_data_path, "heart_rate.csv")
-        if os.path.exists(hr_path):
-            hr_data = pd.read_csv(hr_path)
-            effort_components['avg_heart_rate'] = hr_data['beats per minute'].mean()
-        else:
-            effort_components['avg_heart_rate'] = 0
-
-        # User Exercises
-        exercises_path = os.path.join(match_data_path, "UserExercises.csv")
-        if os.path.exists(exercises_path):
-            exercises_data = pd.read_csv(exercises_path)
-            effort_components['peak_exercise_heart_rate'] = exercises_data['tracker_peak_heart_rate'].max()
-        else:
-            effort_components['peak_exercise_heart_rate'] = 0
+    # Matches that have to be re-read are loaded in the background one ahead
+    stale = {match_date for match_date in match_dates if _needs_extraction(match_date, data_folder, cache)}
+    for match_date in prefetched(match_dates, EFFORT_COLUMNS, data_folder, wanted=stale):
+        effort_components = get_effort_components(match_date, data_folder, cache)
+        if effort_components is None:
+            continue
 
         # Update global max and min
         for key, value in effort_components.items():
@@ -139,6 +287,128 @@ def calculate_global_max_min(match_dates, data_folder):
 
     return global_max_min
 
+def load_normalization_state(state_path=NORMALIZATION_STATE_PATH):
+    """
+    Load the persistent normalization state, or an empty state if none exists.
+
+    The state holds the effort components of every ingested match and, per metric,
+    the running min/max together with the match that set each bound. Its 'bounds'
+    entry can be passed anywhere a global_max_min dict is expected.
+    """
+    if os.path.exists(state_path):
+        with open(state_path, "r") as file:
+            return json.load(file)
+    return {'matches': {}, 'bounds': {}}
+
+def save_normalization_state(state, state_path=NORMALIZATION_STATE_PATH):
+    """
+    Persist the normalization state.
+    """
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with open(state_path, "w") as file:
+        json.dump(state, file, indent=2)
+
+def _rebuild_bound(state, metric):
+    bound = {'max': float('-inf'), 'min': float('inf'), 'max_match': None, 'min_match': None}
+    for match_date, effort_components in state['matches'].items():
+        value = effort_components[metric]
+        if value > bound['max']:
+            bound['max'], bound['max_match'] = value, match_date
+        if value < bound['min']:
+            bound['min'], bound['min_match'] = value, match_date
+    state['bounds'][metric] = bound
+
+def update_normalization_state(state, match_date, effort_components):
+    """
+    Fold one match's effort components into the running global min/max.
+
+    Runs in O(1) per metric. Only when a match that currently holds a bound is
+    re-ingested with a different value is that metric's bound rebuilt from the
+    stored components of all matches.
+
+    Args:
+        state (dict): Normalization state from load_normalization_state, updated in place.
+        match_date (str): The date of the match (YYYY-MM-DD).
+        effort_components (dict): Raw effort components for the match.
+
+    Returns:
+        set: Metrics whose min or max moved.
+    """
+    previous = state['matches'].get(match_date)
+    state['matches'][match_date] = effort_components
+
+    moved = set()
+    for metric, value in effort_components.items():
+        bound = state['bounds'].get(metric)
+        if bound is None:
+            bound = state['bounds'][metric] = {'max': float('-inf'), 'min': float('inf'), 'max_match': None, 'min_match': None}
+
+        if previous is not None and previous.get(metric) != value and match_date in (bound['max_match'], bound['min_match']):
+            old_bound = (bound['max'], bound['min'])
+            _rebuild_bound(state, metric)
+            if (state['bounds'][metric]['max'], state['bounds'][metric]['min']) != old_bound:
+                moved.add(metric)
+            continue
+
+        if value > bound['max']:
+            bound['max'], bound['max_match'] = value, match_date
+            moved.add(metric)
+        if value < bound['min']:
+            bound['min'], bound['min_match'] = value, match_date
+            moved.add(metric)
+
+    return moved
+
+def ingest_matches(match_dates, data_folder, output_folder, state, cache=None):
+    """
+    Add (or refresh) matches and update effort ratings incrementally.
+
+    If the matches move no normalization bound, only their own ratings are written.
+    Otherwise every ingested match is re-rated from the stored components, and
+    only the rating files whose content actually changed are rewritten. The
+    affected ratings are also upserted into the results store in one batch.
+
+    Args:
+        match_dates (list): Match dates (YYYY-MM-DD) to ingest, e.g. the newest match.
+        data_folder (str): Path to the folder containing the match data.
+        output_folder (str): Path to the folder where results will be saved.
+        state (dict): Normalization state, updated in place.
+        cache (dict, optional): Effort component cache; loaded from disk if omitted.
+
+    Returns:
+        list: Match dates whose rating files were rewritten.
+    """
+    if cache is None:
+        cache = load_component_cache()
+
+    ingested = []
+    moved = set()
+    stale = {match_date for match_date in match_dates if _needs_extraction(match_date, data_folder, cache)}
+    for match_date in prefetched(match_dates, EFFORT_COLUMNS, data_folder, wanted=stale):
+        effort_components = get_effort_components(match_date, data_folder, cache)
+        if effort_components is None:
+            print(f"No data folder for match {match_date}. Skipping.")
+            continue
+        moved |= update_normalization_state(state, match_date, effort_components)
+        ingested.append(match_date)
+
+    affected = list(state['matches']) if moved else ingested
+
+    rewritten = []
+    ratings = []
+    for match_date in affected:
+        effort_components = state['matches'][match_date]
+        effort_rating = compute_effort_rating(effort_components, state['bounds'])
+        ratings.append((match_date, effort_components, effort_rating))
+        if write_effort_rating(match_date, effort_components, effort_rating, output_folder):
+            rewritten.append(match_date)
+
+    # All affected ratings go to the results store in one transaction
+    conn = connect()
+    write_effort_ratings(conn, ratings)
+    conn.close()
+    return rewritten
+
 # Example usage
 if __name__ == "__main__":
     data_folder = "./processed_data"
@@ -146,7 +416,10 @@ if __name__ == "__main__":
     os.makedirs(output_folder, exist_ok=True)
     match_dates = ["2024-10-09", "2024-10-16", "2024-10-30", "2024-11-06", "2024-11-13", "2024-11-27"]
 
-    global_max_min = calculate_global_max_min(match_dates, data_folder)
+    cache = load_component_cache()
+    state = load_normalization_state()
+
+    ingest_matches(match_dates, data_folder, output_folder, state, cache)
 
-    for match_date in match_dates:
-        calculate_effort_rating(match_date, data_folder, output_folder, global_max_min)
\ No newline at end of file
+    save_component_cache(cache)
+    save_normalization_state(state)
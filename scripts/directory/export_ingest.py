@@ -0,0 +1,197 @@
+import os
+import csv
+import argparse
+import numpy as np
+import pandas as pd
+from instrumentation import add, timed
+from match_store import SIGNAL_TYPES, TIMESTAMP_COLUMNS, TIMESTAMP_FORMATS
+from match_times import ISO_UTC_FORMAT, load_schedule, parse_timestamps
+from squad import squad_raw_data_path
+
+# Paths
+raw_data_path = "./raw_data/game_data"
+
+# Rows read from an export at a time; bounds memory regardless of export size
+CHUNK_ROWS = 100_000
+
+SECONDS_PER_DAY = 86_400
+
+# Event logs that are not in time order; their rows are deduplicated by ID instead
+ROW_KEYS = {'UserExercises': 'exercise_id'}
+
+def export_signal(export_path):
+    """
+    Signal type of an export file, from its name (e.g. heart_rate_2024-09-01_2024-12-01.csv).
+    """
+    file_name = os.path.basename(export_path)
+    matches = [signal for signal in SIGNAL_TYPES if file_name.startswith(f"{signal}_") or file_name == f"{signal}.csv"]
+    if not matches:
+        raise ValueError(f"Cannot tell the signal type of {export_path}; pass it explicitly.")
+    return max(matches, key=len)
+
+def partition_path(output_path, signal, match_date):
+    """
+    Raw per-match file that a signal's rows of one match day are appended to.
+    """
+    return os.path.join(output_path, f"match_{match_date}", f"{signal}_{match_date}.csv")
+
+def _read_header(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as file:
+        return next(csv.reader(file), [])
+
+def _tail(file, lines=2):
+    # Read backwards in blocks until the tail holds the last `lines` line breaks
+    file.seek(0, os.SEEK_END)
+    position = file.tell()
+    tail = b""
+    while position > 0 and tail.count(b"\n") <= lines:
+        step = min(1 << 16, position)
+        position -= step
+        file.seek(position)
+        tail = file.read(step) + tail
+    return tail
+
+def _repair_tail(path):
+    """
+    Make a partition end on a whole row.
+
+    Rows are always appended with their line break, so a last line without
+    one was cut short by an interrupted ingest and is removed, even if it has
+    the right number of fields (it may stop inside the last one).
+    """
+    with open(path, "rb+") as file:
+        tail = _tail(file)
+        last = tail.rpartition(b"\n")[2]
+        if last:
+            file.seek(0, os.SEEK_END)
+            file.truncate(file.tell() - len(last))
+
+def last_rows(path, signal):
+    """
+    Epoch seconds of the latest row of a partition, and the rows stored for that second.
+
+    Returns:
+        tuple: (epoch seconds or None if the partition has no rows, set of row tuples).
+
+    Raises:
+        ValueError: If the partition has no timestamp column for the signal.
+    """
+    if not os.path.exists(path):
+        return None, set()
+    column = TIMESTAMP_COLUMNS[signal][0]
+    if column not in _read_header(path):
+        raise ValueError(f"{path} has no {column} column.")
+    _repair_tail(path)
+    stored = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    seconds = parse_timestamps(stored[column], TIMESTAMP_FORMATS.get(signal, ISO_UTC_FORMAT))
+    if seconds.notna().sum() == 0:
+        return None, set()
+    last = int(seconds.max())
+    return last, set(stored[(seconds == last).fillna(False).astype(bool)].itertuples(index=False, name=None))
+
+def existing_keys(path, key):
+    """
+    Row IDs already in a partition of an event log signal.
+    """
+    if not os.path.exists(path):
+        return set()
+    _repair_tail(path)
+    return set(pd.read_csv(path, usecols=[key], dtype=str, keep_default_na=False, encoding="utf-8-sig")[key])
+
+def _append_rows(path, rows):
+    exists = os.path.exists(path) and os.path.getsize(path) > 0
+    if exists and _read_header(path) != list(rows.columns):
+        raise ValueError(f"Columns of the export do not match {path}.")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", newline="") as file:
+        rows.to_csv(file, header=not exists, index=False, lineterminator="\n")
+
+def ingest_export(export_path, output_path=raw_data_path, signal=None, schedule=None, chunk_rows=CHUNK_ROWS):
+    """
+    Stream a multi-day device export into the raw per-match files of scheduled matches.
+
+    The export is read chunk_rows rows at a time. Each row is routed by the
+    UTC day of its timestamp to the match on that day, if there is one, and
+    appended to raw_data/.../match_<YYYY-MM-DD>/<signal>_<YYYY-MM-DD>.csv as is.
+    Rows of other days are dropped. Ingestion is append-only and resumable, so
+    re-running an export, or one overlapping an earlier export, only adds
+    rows not ingested yet. For time series that means rows later than the
+    last row already in a match's file, so their exports must be in time
+    order. Rows of the last second already ingested are compared with the
+    stored rows of that second, so rows of it that were not written yet are
+    still added. Event logs (see ROW_KEYS) skip rows whose ID is already present.
+
+    Args:
+        export_path (str): Export CSV with the same columns as the per-match files.
+        output_path (str): Raw data directory holding the match folders.
+        signal (str, optional): Signal type; taken from the file name if omitted.
+        schedule (pd.DataFrame, optional): Match schedule; loaded if omitted.
+        chunk_rows (int): Rows read per chunk.
+
+    Returns:
+        dict: Match date -> number of rows appended.
+    """
+    signal = signal or export_signal(export_path)
+    if schedule is None:
+        schedule = load_schedule()
+    match_days = {int(pd.Timestamp(match_date).timestamp()) // SECONDS_PER_DAY: match_date for match_date in schedule['date']}
+    column = TIMESTAMP_COLUMNS[signal][0]
+    fmt = TIMESTAMP_FORMATS.get(signal, ISO_UTC_FORMAT)
+
+    seen, appended, skipped = {}, {}, 0
+    with timed('ingest', name=signal, bytes_read=os.path.getsize(export_path)):
+        chunks = pd.read_csv(export_path, chunksize=chunk_rows, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        for chunk in chunks:
+            add(rows=len(chunk))
+            seconds = parse_timestamps(chunk[column], fmt)
+            days = seconds // SECONDS_PER_DAY
+            on_match_day = days.isin(list(match_days)).fillna(False).astype(bool)
+
+            for day, rows in chunk[on_match_day].groupby(days[on_match_day], sort=True):
+                match_date = match_days[int(day)]
+                path = partition_path(output_path, signal, match_date)
+                key = ROW_KEYS.get(signal)
+                if match_date not in seen:
+                    seen[match_date] = existing_keys(path, key) if key else last_rows(path, signal)
+
+                if key:
+                    new = (~rows[key].isin(seen[match_date]) & ~rows[key].duplicated()).to_numpy()
+                else:
+                    last, last_second_rows = seen[match_date]
+                    row_seconds = seconds[rows.index].to_numpy()
+                    if last is None:
+                        new = np.ones(len(rows), dtype=bool)
+                    else:
+                        stored = np.array([row in last_second_rows for row in rows.itertuples(index=False, name=None)], dtype=bool)
+                        new = (row_seconds > last) | ((row_seconds == last) & ~stored)
+                skipped += int((~new).sum())
+                rows = rows[new]
+                if rows.empty:
+                    continue
+
+                _append_rows(path, rows)
+                if key:
+                    seen[match_date].update(rows[key])
+                else:
+                    latest = int(seconds[rows.index].max())
+                    latest_rows = set(rows[(seconds[rows.index] == latest).to_numpy()].itertuples(index=False, name=None))
+                    seen[match_date] = (latest, last_second_rows | latest_rows if latest == last else latest_rows)
+                appended[match_date] = appended.get(match_date, 0) + len(rows)
+
+    print(f"Ingested {sum(appended.values())} {signal} rows into {len(appended)} matches from {export_path}"
+          f" ({skipped} rows already ingested).")
+    return appended
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream device exports into the raw per-match files of scheduled matches.")
+    parser.add_argument("exports", nargs="+", help="Export CSV files, in time order per signal.")
+    parser.add_argument("--signal", choices=SIGNAL_TYPES, help="Signal type of the exports (default: from each file name).")
+    parser.add_argument("--player", help="Ingest into raw_data/players/<player> instead of raw_data/game_data.")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows read per chunk.")
+    args = parser.parse_args()
+
+    output_path = os.path.join(squad_raw_data_path, args.player) if args.player else raw_data_path
+    schedule = load_schedule()
+    for export_path in args.exports:
+        ingest_export(export_path, output_path, args.signal, schedule, args.chunk_rows)
+    print("Export ingestion completed.")
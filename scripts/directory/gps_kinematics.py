@@ -0,0 +1,274 @@
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+from instrumentation import timed
+from match_store import PROCESSED_DATA_DIR, MatchData
+from match_times import MATCH_WINDOWS, datetimes_to_epoch, load_schedule
+from pitch_projection import EARTH_RADIUS_M, M_PER_DEG_LAT
+from results_store import DEFAULT_PLAYER, connect, write_kinematics
+from time_index import match_windows
+
+GPS_COLUMNS = ['timestamp', 'latitude', 'longitude', 'altitude']
+
+# Samples further apart than this start a new segment; no speed is derived across the gap
+MAX_GAP_SECONDS = 5
+
+# Outlier rejection: a fix is dropped if it lies further than these from the
+# rolling median of its neighbours (positions in metres, altitude in metres)
+MEDIAN_WINDOW = 5
+JUMP_TOLERANCE_M = 8
+ALTITUDE_TOLERANCE_M = 15
+
+# Steps implying a faster speed than any player runs are discarded
+MAX_SPEED = 10
+
+# Centred moving average applied to step speeds, in samples
+SMOOTHING_WINDOW = 3
+
+# Default thresholds (m/s and seconds); 5.5 m/s is 19.8 km/h, 7 m/s is 25.2 km/h
+DEFAULT_THRESHOLDS = {'high_speed': 5.5, 'sprint': 7.0, 'min_sprint_seconds': 1}
+
+KINEMATICS_COLUMNS = [
+    'distance', 'high_speed_distance', 'sprint_distance', 'sprints',
+    'peak_speed', 'peak_acceleration', 'rejected_samples',
+]
+
+def haversine(latitude1, longitude1, latitude2, longitude2):
+    """
+    Great-circle distance in metres between arrays of points in decimal degrees.
+    """
+    latitude1, longitude1, latitude2, longitude2 = map(np.radians, (latitude1, longitude1, latitude2, longitude2))
+    h = (np.sin((latitude2 - latitude1) / 2) ** 2
+         + np.cos(latitude1) * np.cos(latitude2) * np.sin((longitude2 - longitude1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(h))
+
+def _segments(times, group):
+    # Segment ID per sample: a new segment starts at a new track or after a gap
+    new = np.ones(len(times), dtype=bool)
+    new[1:] = (group[1:] != group[:-1]) | (np.diff(times) > MAX_GAP_SECONDS)
+    return np.cumsum(new), new
+
+def _rolling(values, segment, window, reduce):
+    # Centred rolling reduction over window samples that stays inside each segment
+    offsets = np.arange(window) - window // 2
+    index = np.arange(len(values))[:, None] + offsets
+    inside = (index >= 0) & (index < len(values))
+    index = np.clip(index, 0, len(values) - 1)
+    inside &= segment[index] == segment[:, None]
+    with warnings.catch_warnings():
+        # Windows with no finite values (e.g. no altitude) reduce to NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return reduce(np.where(inside, values[index], np.nan), axis=1)
+
+def _nanmedian(windows, axis=1):
+    # Row medians ignoring NaN; np.nanmedian is much slower on short rows
+    ordered = np.sort(windows, axis=axis)
+    count = np.isfinite(windows).sum(axis=axis)
+    low = np.take_along_axis(ordered, np.maximum((count - 1) // 2, 0)[:, None], axis=axis)[:, 0]
+    high = np.take_along_axis(ordered, np.minimum(count // 2, windows.shape[1] - 1)[:, None], axis=axis)[:, 0]
+    return np.where(count > 0, (low + high) / 2, np.nan)
+
+def track_kinematics(times, latitude, longitude, altitude, group=None):
+    """
+    Vectorized per-sample distance, speed and acceleration of one or many GPS tracks.
+
+    Several tracks (matches, players) are processed in one pass by concatenating
+    them, sorted by time within each, with group telling them apart. Fixes are
+    rejected as jumps if they lie more than JUMP_TOLERANCE_M from the rolling
+    median position of their neighbours, or ALTITUDE_TOLERANCE_M from the
+    rolling median altitude (bad fixes flip altitude by tens of metres). The
+    kept fixes give haversine step distances; steps faster than MAX_SPEED are
+    discarded and the rest smoothed with a SMOOTHING_WINDOW moving average.
+
+    Args:
+        times (np.ndarray): int64 epoch seconds.
+        latitude (np.ndarray): Latitudes in decimal degrees.
+        longitude (np.ndarray): Longitudes in decimal degrees.
+        altitude (np.ndarray): Altitudes in metres (NaN if unknown).
+        group (np.ndarray, optional): Track index per sample; a single track if omitted.
+
+    Returns:
+        pd.DataFrame: One row per input sample with 'group', 'timestamp', 'valid'
+        (kept after outlier rejection), 'seconds' and 'distance' (of the step
+        ending at the sample), 'speed' (smoothed, m/s) and 'acceleration' (m/s²).
+    """
+    times = np.asarray(times, dtype=np.int64)
+    latitude, longitude = np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)
+    altitude = np.asarray(altitude, dtype=float)
+    group = np.zeros(len(times), dtype=np.int64) if group is None else np.asarray(group)
+
+    # Jump rejection against the rolling median, in local metres
+    segment, _ = _segments(times, group)
+    north = latitude * M_PER_DEG_LAT
+    east = longitude * M_PER_DEG_LAT * np.cos(np.radians(latitude))
+    deviation = np.hypot(
+        north - _rolling(north, segment, MEDIAN_WINDOW, _nanmedian),
+        east - _rolling(east, segment, MEDIAN_WINDOW, _nanmedian),
+    )
+    altitude_deviation = np.abs(altitude - _rolling(altitude, segment, MEDIAN_WINDOW, _nanmedian))
+    valid = (
+        np.isfinite(latitude) & np.isfinite(longitude) & (deviation <= JUMP_TOLERANCE_M)
+        & ~(altitude_deviation > ALTITUDE_TOLERANCE_M)
+    )
+    valid[1:] &= (times[1:] != times[:-1]) | (group[1:] != group[:-1])
+
+    # Steps between consecutive kept fixes of the same segment
+    kept = np.flatnonzero(valid)
+    kept_times, kept_group = times[kept], group[kept]
+    kept_segment, starts = _segments(kept_times, kept_group)
+    seconds = np.diff(kept_times, prepend=kept_times[:1]).astype(float)
+    distance = np.zeros(len(kept))
+    distance[1:] = haversine(latitude[kept[:-1]], longitude[kept[:-1]], latitude[kept[1:]], longitude[kept[1:]])
+    seconds[starts], distance[starts] = 0, 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        step_speed = np.where(starts, np.nan, distance / seconds)
+    too_fast = step_speed > MAX_SPEED
+    step_speed[too_fast], distance[too_fast] = np.nan, 0
+
+    speed = _rolling(step_speed, kept_segment, SMOOTHING_WINDOW, np.nanmean)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acceleration = np.diff(speed, prepend=np.nan) / seconds
+    acceleration[starts] = np.nan
+
+    columns = {'seconds': seconds, 'distance': distance, 'speed': speed, 'acceleration': acceleration}
+    samples = {'group': group, 'timestamp': times, 'valid': valid}
+    for column, values in columns.items():
+        samples[column] = np.full(len(times), 0.0 if column in ('seconds', 'distance') else np.nan)
+        samples[column][kept] = values
+    return pd.DataFrame(samples)
+
+def summarise_kinematics(samples, groups, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Distance, high-speed running, sprints and peaks per track from track_kinematics samples.
+
+    A step counts towards high-speed running (or sprint) distance when the
+    smoothed speed at its end is at or above the threshold. A sprint is a run
+    of consecutive samples at or above the sprint speed lasting at least
+    min_sprint_seconds.
+
+    Args:
+        samples (pd.DataFrame): Output of track_kinematics.
+        groups (int): Number of tracks.
+        thresholds (dict): 'high_speed' and 'sprint' in m/s, 'min_sprint_seconds'.
+
+    Returns:
+        pd.DataFrame: KINEMATICS_COLUMNS, one row per track in group order.
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **thresholds}
+    group = samples['group'].to_numpy()
+    distance, seconds = samples['distance'].to_numpy(), samples['seconds'].to_numpy()
+    speed = samples['speed'].to_numpy()
+
+    with np.errstate(invalid='ignore'):
+        high_speed = speed >= thresholds['high_speed']
+        sprinting = speed >= thresholds['sprint']
+
+    # Runs of sprinting samples among the kept samples of each segment
+    kept = samples['valid'].to_numpy()
+    kept_group, kept_sprinting = group[kept], sprinting[kept]
+    continues = np.zeros(len(kept_group), dtype=bool)
+    continues[1:] = kept_sprinting[:-1] & (kept_group[1:] == kept_group[:-1]) & (seconds[kept][1:] > 0)
+    run = np.cumsum(kept_sprinting & ~continues)
+    run_seconds = np.bincount(run[kept_sprinting], seconds[kept][kept_sprinting], minlength=run.max(initial=0) + 1)
+    run_start = kept_sprinting & ~continues
+    counted = run_seconds[run[run_start]] >= thresholds['min_sprint_seconds']
+
+    summary = {
+        'distance': np.bincount(group, distance, minlength=groups),
+        'high_speed_distance': np.bincount(group, distance * high_speed, minlength=groups),
+        'sprint_distance': np.bincount(group, distance * sprinting, minlength=groups),
+        'sprints': np.bincount(kept_group[run_start][counted], minlength=groups),
+        'peak_speed': np.full(groups, np.nan),
+        'peak_acceleration': np.full(groups, np.nan),
+        'rejected_samples': np.bincount(group, ~kept, minlength=groups).astype(int),
+    }
+    np.fmax.at(summary['peak_speed'], group, speed)
+    np.fmax.at(summary['peak_acceleration'], group, samples['acceleration'].to_numpy())
+    return pd.DataFrame(summary, columns=KINEMATICS_COLUMNS)
+
+def load_track(match, data_dir=PROCESSED_DATA_DIR, window='match'):
+    """
+    GPS fixes of one match window as arrays sorted by time.
+
+    Returns:
+        tuple or None: (times, latitude, longitude, altitude), or None if the
+        match has no GPS data in the window.
+    """
+    gps_data = MatchData(match['date'], data_dir).load('gps_location', GPS_COLUMNS)
+    if gps_data is None or gps_data.empty:
+        return None
+    gps_data = gps_data.dropna(subset=['timestamp', 'latitude', 'longitude'])
+    times = datetimes_to_epoch(gps_data['timestamp'])
+    start, end = match_windows(match)[window]
+    inside = (times >= start) & (times <= end)
+    if not inside.any():
+        return None
+    order = np.argsort(times[inside], kind='stable')
+    altitude = gps_data['altitude'] if 'altitude' in gps_data else pd.Series(np.nan, index=gps_data.index)
+    return tuple(
+        np.asarray(values)[inside][order]
+        for values in (times, gps_data['latitude'].to_numpy(dtype=float), gps_data['longitude'].to_numpy(dtype=float), altitude.to_numpy(dtype=float))
+    )
+
+def season_kinematics(schedule, data_dirs, window='match', thresholds=DEFAULT_THRESHOLDS):
+    """
+    Kinematics summary of every scheduled match of every player, computed in one batched pass.
+
+    Args:
+        schedule (pd.DataFrame): Match schedule from load_schedule.
+        data_dirs (dict): Player -> processed data directory.
+        window (str): Named match window to analyse.
+        thresholds (dict): See summarise_kinematics.
+
+    Returns:
+        pd.DataFrame: 'player', 'match_date' and KINEMATICS_COLUMNS per player-match with GPS data.
+    """
+    keys, tracks = [], []
+    for player, data_dir in data_dirs.items():
+        for _, match in schedule.iterrows():
+            track = load_track(match, data_dir, window)
+            if track is not None:
+                keys.append((player, match['date']))
+                tracks.append(track)
+    if not tracks:
+        return pd.DataFrame(columns=['player', 'match_date', *KINEMATICS_COLUMNS])
+
+    times, latitude, longitude, altitude = (np.concatenate(arrays) for arrays in zip(*tracks))
+    group = np.repeat(np.arange(len(tracks)), [len(track[0]) for track in tracks])
+    with timed('compute', name='gps_kinematics', rows=len(times)):
+        samples = track_kinematics(times, latitude, longitude, altitude, group)
+        summary = summarise_kinematics(samples, len(tracks), thresholds)
+    summary.insert(0, 'match_date', [match_date for _, match_date in keys])
+    summary.insert(0, 'player', [player for player, _ in keys])
+    return summary
+
+if __name__ == "__main__":
+    from squad import PLAYERS_PATH, load_players, player_data_dir
+
+    parser = argparse.ArgumentParser(description="Compute distance, high-speed running and sprints from GPS tracks.")
+    parser.add_argument("--squad", action="store_true", help="Run for every player in the squad registry.")
+    parser.add_argument("--players", default=PLAYERS_PATH, help="Path to the player registry CSV.")
+    parser.add_argument("--window", choices=list(MATCH_WINDOWS), default='match', help="Match window to analyse.")
+    parser.add_argument("--high-speed", type=float, default=DEFAULT_THRESHOLDS['high_speed'], help="High-speed running threshold in m/s.")
+    parser.add_argument("--sprint", type=float, default=DEFAULT_THRESHOLDS['sprint'], help="Sprint threshold in m/s.")
+    parser.add_argument("--min-sprint-seconds", type=float, default=DEFAULT_THRESHOLDS['min_sprint_seconds'], help="Shortest run counted as a sprint.")
+    args = parser.parse_args()
+
+    if args.squad:
+        data_dirs = {player: player_data_dir(player) for player in load_players(args.players)}
+    else:
+        data_dirs = {DEFAULT_PLAYER: PROCESSED_DATA_DIR}
+    thresholds = {'high_speed': args.high_speed, 'sprint': args.sprint, 'min_sprint_seconds': args.min_sprint_seconds}
+
+    summary = season_kinematics(load_schedule(), data_dirs, args.window, thresholds)
+    conn = connect()
+    write_kinematics(conn, summary)
+    conn.close()
+
+    for row in summary.to_dict('records'):
+        print(f"{row['player']} {row['match_date']}: {row['distance']:.0f} m, high-speed running {row['high_speed_distance']:.0f} m, "
+              f"{row['sprints']} sprints ({row['sprint_distance']:.0f} m), peak {row['peak_speed']:.1f} m/s, "
+              f"{row['rejected_samples']} fixes rejected")
+    print(f"GPS kinematics computed for {len(summary)} matches.")
@@ -1,53 +1,149 @@
 import os
-import pandas as pd
+import json
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.patches import Circle
 from scipy.ndimage import gaussian_filter
+from instrumentation import add, instrumented, timed
+from match_store import MatchData, source_path
+from match_times import load_schedule
+from pitch_projection import estimate_calibration, get_calibration, project, venue_key
+from results_store import connect, write_heatmap
+from time_index import TimeIndex
 
 # Constants for pitch dimensions (meters)
 PITCH_LENGTH = 91.4  # Standard length of a hockey pitch
 PITCH_WIDTH = 55.0   # Standard width of a hockey pitch
-M_PER_LAT = 111_000  # Approx meters per degree latitude
-M_PER_LON = 85_000   # Approx meters per degree longitude (varies by latitude)
+HEATMAP_BINS = [55, 91]  # Width x length bins, roughly one metre each
+
+# Schedule columns that aggregate heatmaps can be filtered on
+AGGREGATE_FILTERS = ['home_or_away', 'opponent', 'match_type', 'result']
+
+# GPS columns read for heatmaps; altitude is not needed
+GPS_COLUMNS = ['timestamp', 'latitude', 'longitude']
 
 # Paths
 processed_data_dir = "./processed_data"
 output_dir = "./outputs/heatmaps"
-os.makedirs(output_dir, exist_ok=True)
+counts_cache_dir = "./cache/heatmap_counts"
 
-def load_gps_data(match_date):
-    gps_file = os.path.join(processed_data_dir, f"match_{match_date}/gps_location.csv")
-    if not os.path.exists(gps_file):
+def load_gps_data(match_date, data_dir=processed_data_dir):
+    gps_data = MatchData(match_date, data_dir).load("gps_location", GPS_COLUMNS)
+    if gps_data is None:
         print(f"No GPS data found for {match_date}. Skipping.")
-        return None
-    return pd.read_csv(gps_file)
+    return gps_data
 
-def convert_to_pitch_coords(gps_data, center_lat, center_lon):
+def convert_to_pitch_coords(gps_data, calibration):
+    """
+    Add pitch coordinates in metres: 'latitude_m' along the pitch length and
+    'longitude_m' across its width, both centred on the middle of the pitch.
+    """
     gps_data = gps_data.copy()  # Avoid SettingWithCopyWarning
-    gps_data['latitude_m'] = (gps_data['latitude'] - center_lat) * M_PER_LAT
-    gps_data['longitude_m'] = (gps_data['longitude'] - center_lon) * M_PER_LON
+    width, length = project(gps_data['latitude'].to_numpy(), gps_data['longitude'].to_numpy(), calibration)
+    gps_data['latitude_m'] = length
+    gps_data['longitude_m'] = width
     return gps_data
 
-def generate_heatmap(gps_data, match_date, match_start, match_end):
+def calibrate_venues(schedule, data_dir=processed_data_dir):
+    """
+    Make sure every venue in the schedule has a cached pitch calibration.
+
+    Unknown venues are estimated from their earliest scheduled match with GPS
+    data in data_dir, so the result does not depend on processing order.
+    """
+    for _, match in schedule.sort_values('date').iterrows():
+        venue = venue_key(match)
+        if get_calibration(venue) is not None:
+            continue
+        gps_data = load_gps_data(match['date'], data_dir)
+        if gps_data is None or gps_data.empty:
+            continue
+        match_gps = TimeIndex(gps_data).slice(match['match_start'], match['match_end'])
+        get_calibration(venue, match_gps['latitude'].to_numpy(), match_gps['longitude'].to_numpy())
+
+class HeatmapRenderer:
+    """
+    Reusable heatmap figure built once with the object-oriented Agg API.
+
+    The pitch markings, axes and colorbar are drawn a single time; each render
+    only swaps the image data, colour limits and title before saving. No global
+    pyplot state is involved, so one renderer per worker process is safe.
+    """
+
+    def __init__(self, dpi=300):
+        self.dpi = dpi
+        self.figure = Figure(figsize=(10, 7))
+        FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+
+        extent = [-PITCH_WIDTH / 2, PITCH_WIDTH / 2, -PITCH_LENGTH / 2, PITCH_LENGTH / 2]
+        self.image = ax.imshow(np.zeros((91, 55)), extent=extent, origin='lower', cmap='YlOrRd')
+        self.figure.colorbar(self.image, ax=ax, label='Density')
+
+        # Add pitch markings
+        ax.axhline(0, color='black', linestyle='--', linewidth=1)  # Halfway line
+        ax.add_patch(Circle((0, PITCH_LENGTH / 4), 9, color='black', fill=False, linewidth=1))  # Top circle
+        ax.add_patch(Circle((0, -PITCH_LENGTH / 4), 9, color='black', fill=False, linewidth=1))  # Bottom circle
+
+        ax.set_xlim(-PITCH_WIDTH / 2, PITCH_WIDTH / 2)
+        ax.set_ylim(-PITCH_LENGTH / 2, PITCH_LENGTH / 2)
+        ax.set_xlabel("Width (m)")
+        ax.set_ylabel("Length (m)")
+        self.title = ax.set_title("")
+
+    def render(self, heatmap, title, path):
+        """
+        Draw a (width bins x length bins) density grid and save it as a PNG.
+        """
+        self.image.set_data(heatmap.T)
+        self.image.set_clim(heatmap.min(), heatmap.max())
+        self.title.set_text(title)
+        self.figure.savefig(path, dpi=self.dpi)
+
+_renderer = None
+
+def get_renderer():
+    """
+    The heatmap renderer of the current process, created on first use.
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = HeatmapRenderer()
+    return _renderer
+
+@instrumented('filter')
+def pitch_positions(gps_data, match_date, match_start, match_end, venue=None):
+    """
+    GPS samples of one match window that fall on the pitch, in pitch metres.
+
+    Positions are projected with the venue's cached calibration, so heatmaps
+    from the same ground line up. Without a venue the pitch is estimated from
+    this match alone.
+
+    Returns:
+        pd.DataFrame or None: The samples with 'latitude_m' (length) and
+        'longitude_m' (width) columns, or None if there is no usable GPS data.
+    """
     if gps_data is None or gps_data.empty:
         print(f"No GPS data available for {match_date}. Skipping heatmap.")
-        return
-
-    # Convert timestamp to datetime and make timezone-naive
-    gps_data['timestamp'] = pd.to_datetime(gps_data['timestamp'], errors='coerce').dt.tz_localize(None)
+        return None
 
     # Filter data within match timeframe
-    filtered_data = gps_data[(gps_data['timestamp'] >= match_start) & (gps_data['timestamp'] <= match_end)]
+    filtered_data = TimeIndex(gps_data).slice(match_start, match_end)
 
     if filtered_data.empty:
         print(f"No GPS data within match timeframe for {match_date}. Skipping heatmap.")
-        return
+        return None
 
-    # Calculate pitch center and convert GPS data
-    center_lat = filtered_data['latitude'].mean()
-    center_lon = filtered_data['longitude'].mean()
-    filtered_data = convert_to_pitch_coords(filtered_data, center_lat, center_lon)
+    # Project GPS data onto the pitch axes
+    latitude, longitude = filtered_data['latitude'].to_numpy(), filtered_data['longitude'].to_numpy()
+    if venue is not None:
+        calibration = get_calibration(venue, latitude, longitude)
+    else:
+        calibration = estimate_calibration(latitude, longitude)
+    filtered_data = convert_to_pitch_coords(filtered_data, calibration)
 
     # Filter points within pitch dimensions
     filtered_data = filtered_data[
@@ -59,49 +155,191 @@ def generate_heatmap(gps_data, match_date, match_start, match_end):
 
     if filtered_data.empty:
         print(f"No valid GPS data within pitch dimensions for {match_date}. Skipping heatmap.")
-        return
+        return None
+
+    return filtered_data
+
+@instrumented('compute')
+def compute_counts(gps_data, match_date, match_start, match_end, venue=None):
+    """
+    Raw (unsmoothed) count of GPS samples per pitch bin for one match window.
+
+    Returns:
+        np.ndarray or None: (55, 91) grid over pitch width x length, or None if
+        there is no usable GPS data.
+    """
+    filtered_data = pitch_positions(gps_data, match_date, match_start, match_end, venue)
+    if filtered_data is None:
+        return None
+    add(rows=len(filtered_data))
 
     # Create 2D histogram for heatmap
-    heatmap, xedges, yedges = np.histogram2d(
-        filtered_data['longitude_m'], filtered_data['latitude_m'], bins=[55, 91], range=[[-PITCH_WIDTH / 2, PITCH_WIDTH / 2], [-PITCH_LENGTH / 2, PITCH_LENGTH / 2]]
+    counts, xedges, yedges = np.histogram2d(
+        filtered_data['longitude_m'], filtered_data['latitude_m'], bins=HEATMAP_BINS, range=[[-PITCH_WIDTH / 2, PITCH_WIDTH / 2], [-PITCH_LENGTH / 2, PITCH_LENGTH / 2]]
     )
-    heatmap = gaussian_filter(heatmap, sigma=1)
+    return counts
 
-    # Plot the heatmap
-    plt.figure(figsize=(10, 7))
-    plt.imshow(heatmap.T, extent=[-PITCH_WIDTH / 2, PITCH_WIDTH / 2, -PITCH_LENGTH / 2, PITCH_LENGTH / 2], origin='lower', cmap='YlOrRd')
-    plt.colorbar(label='Density')
+def compute_heatmap(gps_data, match_date, match_start, match_end, venue=None):
+    """
+    Smoothed player density grid on the pitch for one match window.
 
-    # Add pitch markings
-    plt.axhline(0, color='black', linestyle='--', linewidth=1)  # Halfway line
-    plt.gca().add_patch(Circle((0, PITCH_LENGTH / 4), 9, color='black', fill=False, linewidth=1))  # Top circle
-    plt.gca().add_patch(Circle((0, -PITCH_LENGTH / 4), 9, color='black', fill=False, linewidth=1))  # Bottom circle
+    Returns:
+        np.ndarray or None: (55, 91) grid over pitch width x length, or None if
+        there is no usable GPS data.
+    """
+    counts = compute_counts(gps_data, match_date, match_start, match_end, venue)
+    return gaussian_filter(counts, sigma=1) if counts is not None else None
 
-    plt.xlim(-PITCH_WIDTH / 2, PITCH_WIDTH / 2)
-    plt.ylim(-PITCH_LENGTH / 2, PITCH_LENGTH / 2)
-    plt.title(f"Heatmap for Match {match_date}")
-    plt.xlabel("Width (m)")
-    plt.ylabel("Length (m)")
+def _counts_key(match_date, match_start, match_end, venue, data_dir=processed_data_dir):
+    # Everything the cached grid depends on: the GPS file, the window and the venue calibration
+    path = source_path(match_date, "gps_location", data_dir)
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return json.dumps({
+        'source': [path, stat.st_size, stat.st_mtime_ns],
+        'window': [str(match_start), str(match_end)],
+        'calibration': get_calibration(venue) if venue is not None else None,
+    }, sort_keys=True)
+
+def get_match_counts(match_date, match_start, match_end, venue=None, data_dir=processed_data_dir, cache_dir=counts_cache_dir):
+    """
+    Raw count grid of one match, from the on-disk cache when its inputs are unchanged.
+
+    Grids are stored as small .npz files in cache_dir (by default
+    cache/heatmap_counts), so aggregate heatmaps never need to re-read GPS data.
+    Each data directory (e.g. each squad player) needs its own cache_dir.
+
+    Args:
+        data_dir (str): Root of the processed data store the GPS data is read from.
+        cache_dir (str): Directory of the count grid cache for data_dir.
+
+    Returns:
+        np.ndarray or None: (55, 91) counts, or None if the match has no usable GPS data.
+    """
+    key = _counts_key(match_date, match_start, match_end, venue, data_dir)
+    if key is None:
+        print(f"No GPS data found for {match_date}. Skipping.")
+        return None
+
+    cache_path = os.path.join(cache_dir, f"heatmap_counts_{match_date}.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if str(cached['key']) == key:
+                return cached['counts'] if cached['counts'].size else None
+
+    counts = compute_counts(load_gps_data(match_date, data_dir), match_date, match_start, match_end, venue)
+    os.makedirs(cache_dir, exist_ok=True)
+    # An empty array records "no usable data" so the match is not re-read either
+    np.savez(cache_path, key=key, counts=counts if counts is not None else np.zeros((0, 0)))
+    return counts
+
+def aggregate_heatmap(schedule, data_dir=processed_data_dir, cache_dir=counts_cache_dir, **filters):
+    """
+    Smoothed heatmap summed over every scheduled match matching the filters.
+
+    Args:
+        schedule (pd.DataFrame): Parsed schedule from match_times.load_schedule.
+        data_dir (str): Root of the processed data store (a squad player's for their heatmap).
+        cache_dir (str): Directory of the count grid cache for data_dir.
+        **filters: Schedule column (see AGGREGATE_FILTERS) -> value or list of values,
+            e.g. home_or_away='home' or opponent=["Surrey 2's"].
+
+    Returns:
+        tuple: (heatmap or None, number of matches with data).
+    """
+    selected = schedule
+    for column, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        selected = selected[selected[column].isin(values)]
+
+    total = np.zeros(HEATMAP_BINS)
+    n_matches = 0
+    for _, match in selected.iterrows():
+        counts = get_match_counts(match['date'], match['match_start'], match['match_end'], venue_key(match), data_dir, cache_dir)
+        if counts is not None:
+            total += counts
+            n_matches += 1
+
+    if n_matches == 0:
+        return None, 0
+    return gaussian_filter(total, sigma=1), n_matches
+
+def generate_aggregate_heatmap(schedule, title, file_name, data_dir=processed_data_dir, cache_dir=counts_cache_dir, **filters):
+    """
+    Render and save an aggregate heatmap over the matches selected by filters.
+    """
+    heatmap, n_matches = aggregate_heatmap(schedule, data_dir, cache_dir, **filters)
+    if heatmap is None:
+        print(f"No GPS data for matches matching {filters}. Skipping heatmap.")
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    heatmap_file = os.path.join(output_dir, file_name)
+    get_renderer().render(heatmap, f"{title} ({n_matches} matches)", heatmap_file)
+    print(f"Aggregate heatmap saved to {heatmap_file}.")
+
+def generate_heatmap(gps_data, match_date, match_start, match_end, venue=None):
+    heatmap = compute_heatmap(gps_data, match_date, match_start, match_end, venue)
+    if heatmap is None:
+        return
+
+    # Save the plot
+    os.makedirs(output_dir, exist_ok=True)
+    heatmap_file = os.path.join(output_dir, f"heatmap_{match_date}.png")
+    with timed('render', match_date):
+        get_renderer().render(heatmap, f"Heatmap for Match {match_date}", heatmap_file)
+    print(f"Heatmap for match {match_date} saved to {heatmap_file}.")
+
+def process_match_heatmap(match_date, match_start, match_end, venue=None):
+    """
+    Load the GPS data of a single match, render its heatmap and store it in the results store.
+    """
+    counts = get_match_counts(match_date, match_start, match_end, venue)
+    if counts is None:
+        return
 
     # Save the plot
+    os.makedirs(output_dir, exist_ok=True)
     heatmap_file = os.path.join(output_dir, f"heatmap_{match_date}.png")
-    plt.savefig(heatmap_file, dpi=300)
-    plt.close()
+    with timed('render', match_date):
+        get_renderer().render(gaussian_filter(counts, sigma=1), f"Heatmap for Match {match_date}", heatmap_file)
+    with open(heatmap_file, "rb") as file:
+        png = file.read()
+    conn = connect()
+    write_heatmap(conn, match_date, png)
+    conn.close()
     print(f"Heatmap for match {match_date} saved to {heatmap_file}.")
 
-# Load match schedule
-schedule_path = "./reference_data/hockey_matches_schedule.csv"
-schedule = pd.read_csv(schedule_path)
-schedule['date'] = pd.to_datetime(schedule['date'], dayfirst=True).dt.strftime('%Y-%m-%d')
-schedule['match_start'] = pd.to_datetime(schedule['date'] + ' ' + schedule['start_time'], errors='coerce')
-schedule['match_end'] = pd.to_datetime(schedule['date'] + ' ' + schedule['end_time'], errors='coerce')
-
-# Iterate over matches
-for _, match in schedule.iterrows():
-    match_date = match['date']
-    match_start = match['match_start']
-    match_end = match['match_end']
-    gps_data = load_gps_data(match_date)
-    generate_heatmap(gps_data, match_date, match_start, match_end)
-
-print("Heatmap generation completed.")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate per-match heatmaps, or one aggregate heatmap over filtered matches.")
+    parser.add_argument("--aggregate", action="store_true", help="Render one heatmap summed over the selected matches.")
+    parser.add_argument("--player", help="Squad player whose matches are aggregated (with --aggregate); the single-player store if omitted.")
+    for column in AGGREGATE_FILTERS:
+        parser.add_argument(f"--{column.replace('_', '-')}", dest=column, nargs="+", help=f"Only matches with these {column} values.")
+    args = parser.parse_args()
+    if args.player and not args.aggregate:
+        parser.error("--player needs --aggregate; squad.py renders per-match heatmaps of squad players.")
+
+    # Load match schedule
+    schedule = load_schedule()
+    if args.player:
+        from squad import player_data_dir, squad_cache_dir
+
+        # Each player's count grids are cached separately, next to their other caches
+        data_dir, cache_dir = player_data_dir(args.player), os.path.join(squad_cache_dir, args.player, "heatmap_counts")
+    else:
+        data_dir, cache_dir = processed_data_dir, counts_cache_dir
+    calibrate_venues(schedule, data_dir)
+
+    if args.aggregate:
+        filters = {column: getattr(args, column) for column in AGGREGATE_FILTERS if getattr(args, column)}
+        suffix = "_".join(f"{column}-{'+'.join(values)}" for column, values in filters.items()) or "season"
+        title, prefix = (f"Aggregate Heatmap for {args.player}", f"heatmap_aggregate_{args.player}") if args.player else ("Aggregate Heatmap", "heatmap_aggregate")
+        generate_aggregate_heatmap(schedule, title, f"{prefix}_{suffix}.png", data_dir, cache_dir, **filters)
+    else:
+        # Iterate over matches
+        for _, match in schedule.iterrows():
+            process_match_heatmap(match['date'], match['match_start'], match['match_end'], venue_key(match))
+
+    print("Heatmap generation completed.")
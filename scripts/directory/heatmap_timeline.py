@@ -0,0 +1,154 @@
+import os
+import argparse
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from heatmap_arbitrary_pitch import (
+    HEATMAP_BINS,
+    PITCH_LENGTH,
+    PITCH_WIDTH,
+    calibrate_venues,
+    get_renderer,
+    load_gps_data,
+    output_dir,
+    pitch_positions,
+)
+from match_store import source_path
+from match_times import datetimes_to_epoch, load_schedule
+from pitch_projection import get_calibration, venue_key
+from time_index import match_windows, to_epoch
+
+# Paths
+timeline_cache_dir = "./cache/heatmap_timeline"
+
+# Width of the time buckets the cumulative histogram is built on
+BUCKET_SECONDS = 15
+
+class CumulativeHeatmap:
+    """
+    Prefix sum over time buckets of a match's 2D pitch histogram.
+
+    prefix[k] holds the counts of every sample before bucket k, so the counts of
+    any window are prefix[end bucket] - prefix[start bucket]: two lookups and one
+    subtraction, O(bins) regardless of how many GPS samples the window holds.
+    Window bounds are rounded to whole buckets.
+    """
+
+    def __init__(self, start, bucket_seconds, prefix):
+        self.start = start
+        self.bucket_seconds = bucket_seconds
+        self.prefix = prefix
+
+    @property
+    def end(self):
+        return self.start + (len(self.prefix) - 1) * self.bucket_seconds
+
+    def _bucket(self, time):
+        bucket = (to_epoch(time) - self.start) // self.bucket_seconds
+        return int(np.clip(bucket, 0, len(self.prefix) - 1))
+
+    def counts(self, start, end):
+        """
+        Raw counts per pitch bin between start and end (epoch seconds or datetimes).
+        """
+        lo, hi = self._bucket(start), self._bucket(end)
+        return self.prefix[max(lo, hi)] - self.prefix[lo]
+
+    def heatmap(self, start, end, sigma=1):
+        """
+        Smoothed density grid between start and end.
+        """
+        return gaussian_filter(self.counts(start, end).astype(float), sigma=sigma)
+
+    def frames(self, window_seconds=600, step_seconds=60, sigma=1):
+        """
+        Sliding-window heatmaps across the match, e.g. for an animation or a scrubber.
+
+        Yields:
+            tuple: (window start, window end, smoothed grid), times in epoch seconds.
+        """
+        for frame_end in range(self.start + step_seconds, self.end + 1, step_seconds):
+            frame_start = max(self.start, frame_end - window_seconds)
+            yield frame_start, frame_end, self.heatmap(frame_start, frame_end, sigma)
+
+def build_cumulative_heatmap(filtered_data, start, end, bucket_seconds=BUCKET_SECONDS):
+    """
+    Build the cumulative histogram from on-pitch positions (see pitch_positions).
+
+    Args:
+        filtered_data (pd.DataFrame): Samples with 'timestamp', 'longitude_m' and 'latitude_m'.
+        start (int): Epoch seconds of the first bucket.
+        end (int): Epoch seconds of the end of the last bucket.
+        bucket_seconds (int): Width of a time bucket.
+
+    Returns:
+        CumulativeHeatmap: The prefix sums, shape (buckets + 1, 55, 91).
+    """
+    n_buckets = max(1, -(-(end - start) // bucket_seconds))
+    n_cells = HEATMAP_BINS[0] * HEATMAP_BINS[1]
+
+    # Same bin edges as np.histogram2d, whose last bin includes the right edge
+    x = ((filtered_data['longitude_m'].to_numpy() + PITCH_WIDTH / 2) / PITCH_WIDTH * HEATMAP_BINS[0]).astype(int)
+    y = ((filtered_data['latitude_m'].to_numpy() + PITCH_LENGTH / 2) / PITCH_LENGTH * HEATMAP_BINS[1]).astype(int)
+    x = np.clip(x, 0, HEATMAP_BINS[0] - 1)
+    y = np.clip(y, 0, HEATMAP_BINS[1] - 1)
+    buckets = np.clip((datetimes_to_epoch(filtered_data['timestamp']) - start) // bucket_seconds, 0, n_buckets - 1)
+
+    flat = np.bincount((buckets * n_cells + x * HEATMAP_BINS[1] + y), minlength=n_buckets * n_cells)
+    prefix = np.zeros((n_buckets + 1, *HEATMAP_BINS), dtype=np.int32)
+    np.cumsum(flat.reshape(n_buckets, *HEATMAP_BINS), axis=0, out=prefix[1:])
+    return CumulativeHeatmap(start, bucket_seconds, prefix)
+
+def get_cumulative_heatmap(match, window='tolerance', bucket_seconds=BUCKET_SECONDS):
+    """
+    Cumulative heatmap of a scheduled match, cached on disk per match.
+
+    Args:
+        match (pd.Series): One row of match_times.load_schedule().
+        window (str): Named match window the histogram covers.
+        bucket_seconds (int): Width of a time bucket.
+
+    Returns:
+        CumulativeHeatmap or None: None if the match has no usable GPS data.
+    """
+    match_date, venue = match['date'], venue_key(match)
+    path = source_path(match_date, "gps_location")
+    if path is None:
+        return None
+    start, end = match_windows(match)[window]
+    stat = os.stat(path)
+    key = repr((path, stat.st_size, stat.st_mtime_ns, start, end, bucket_seconds, get_calibration(venue)))
+
+    cache_path = os.path.join(timeline_cache_dir, f"heatmap_timeline_{match_date}.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if str(cached['key']) == key:
+                return CumulativeHeatmap(start, bucket_seconds, cached['prefix'])
+
+    filtered_data = pitch_positions(load_gps_data(match_date), match_date, start, end, venue)
+    if filtered_data is None:
+        return None
+    cumulative = build_cumulative_heatmap(filtered_data, start, end, bucket_seconds)
+    os.makedirs(timeline_cache_dir, exist_ok=True)
+    np.savez_compressed(cache_path, key=key, prefix=cumulative.prefix)
+    return cumulative
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render sliding-window heatmap frames for one match.")
+    parser.add_argument("match_date", help="Match date (YYYY-MM-DD) from the schedule.")
+    parser.add_argument("--window", type=int, default=600, help="Frame window length in seconds.")
+    parser.add_argument("--step", type=int, default=300, help="Seconds between frames.")
+    args = parser.parse_args()
+
+    schedule = load_schedule()
+    calibrate_venues(schedule)
+    match = schedule.loc[schedule['date'] == args.match_date].iloc[0]
+    cumulative = get_cumulative_heatmap(match)
+    if cumulative is None:
+        print(f"No GPS data available for {args.match_date}.")
+    else:
+        frames_dir = os.path.join(output_dir, f"frames_{args.match_date}")
+        os.makedirs(frames_dir, exist_ok=True)
+        for index, (frame_start, frame_end, heatmap) in enumerate(cumulative.frames(args.window, args.step)):
+            minute = (frame_end - cumulative.start) // 60
+            get_renderer().render(heatmap, f"Match {args.match_date}, minute {minute}", os.path.join(frames_dir, f"frame_{index:03d}.png"))
+        print(f"Heatmap frames for {args.match_date} saved to {frames_dir}.")
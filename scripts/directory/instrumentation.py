@@ -0,0 +1,186 @@
+import os
+import sys
+import csv
+import json
+import time
+import cProfile
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Timings recorded in this process, one dict per timed block
+_records = []
+
+# Records of the timed blocks currently running in each thread, innermost last
+_local = threading.local()
+
+_profiler = None
+
+REPORT_FIELDS = ['pid', 'stage', 'name', 'match_date', 'rows', 'bytes_read', 'wall_s', 'cpu_s', 'peak_rss_mib']
+
+def peak_rss_mib():
+    """
+    Peak resident set size of this process so far, in MiB (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+def enable_profiling():
+    """
+    Run every timed block of this process under one cProfile profiler.
+    """
+    global _profiler
+    _profiler = cProfile.Profile()
+
+def _active():
+    if not hasattr(_local, 'active'):
+        _local.active = []
+    return _local.active
+
+@contextmanager
+def timed(stage, match_date=None, name=None, rows=None, bytes_read=None):
+    """
+    Time a block of work and record it for the run report.
+
+    Args:
+        stage (str): Kind of work: 'load', 'parse', 'write', 'filter', 'compute' or 'render'.
+        match_date (str, optional): Match the work belongs to.
+        name (str, optional): Finer label, e.g. the function or signal.
+        rows (int, optional): Rows processed; can also be set later with add().
+        bytes_read (int, optional): Bytes read from disk; can also be set later with add().
+
+    Yields:
+        dict: The record, completed with wall/CPU time and peak RSS on exit.
+    """
+    record = {'stage': stage, 'name': name, 'match_date': match_date, 'rows': rows, 'bytes_read': bytes_read}
+    active = _active()
+    # The profiler only follows the main thread; blocks in loader threads are timed but not profiled
+    profile = _profiler is not None and not active and threading.current_thread() is threading.main_thread()
+    if profile:
+        _profiler.enable()
+    active.append(record)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s'] = time.perf_counter() - wall
+        record['cpu_s'] = time.process_time() - cpu
+        active.pop()
+        if profile:
+            _profiler.disable()
+        record['peak_rss_mib'] = peak_rss_mib()
+        record['pid'] = os.getpid()
+        _records.append(record)
+
+def add(rows=None, bytes_read=None):
+    """
+    Add rows or bytes to the innermost running timed block, if any.
+    """
+    active = _active()
+    if not active:
+        return
+    record = active[-1]
+    if rows is not None:
+        record['rows'] = (record['rows'] or 0) + int(rows)
+    if bytes_read is not None:
+        record['bytes_read'] = (record['bytes_read'] or 0) + int(bytes_read)
+
+def instrumented(stage):
+    """
+    Decorator timing every call of a function as one block of the given stage.
+
+    The match is taken from the function's match_date argument, if it has one.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            match_date = signature.bind_partial(*args, **kwargs).arguments.get('match_date')
+            with timed(stage, match_date, func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def collect():
+    """
+    Return and clear the records made by this process, e.g. to send them from a worker to the parent.
+
+    Records with another pid are left alone: in the parent they were merged from
+    earlier workers, and in a forked worker they are copies of the parent's.
+    """
+    pid = os.getpid()
+    records = [record for record in _records if record['pid'] == pid]
+    _records[:] = [record for record in _records if record['pid'] != pid]
+    return records
+
+def merge(records):
+    """
+    Add records collected in another process to this process's report.
+    """
+    _records.extend(records)
+
+def summarize(records):
+    """
+    Totals per stage and per match, with throughput in rows per second of wall time.
+    """
+    def totals(group):
+        rows = sum(record['rows'] or 0 for record in group)
+        wall = sum(record['wall_s'] for record in group)
+        return {
+            'calls': len(group),
+            'rows': rows,
+            'bytes_read': sum(record['bytes_read'] or 0 for record in group),
+            'wall_s': wall,
+            'cpu_s': sum(record['cpu_s'] for record in group),
+            'rows_per_s': rows / wall if rows and wall > 0 else None,
+            'peak_rss_mib': max((record['peak_rss_mib'] or 0 for record in group), default=None),
+        }
+
+    by_stage, by_match = {}, {}
+    for record in records:
+        by_stage.setdefault(record['stage'], []).append(record)
+        if record['match_date'] is not None:
+            by_match.setdefault(record['match_date'], {}).setdefault(record['stage'], []).append(record)
+    return {
+        'stages': {stage: totals(group) for stage, group in by_stage.items()},
+        'matches': {
+            match_date: {stage: totals(group) for stage, group in stages.items()}
+            for match_date, stages in sorted(by_match.items())
+        },
+    }
+
+def write_report(report_path, metadata=None):
+    """
+    Write the run report: a JSON summary with every record, and the records as CSV.
+
+    Args:
+        report_path (str): Path of the JSON report; the CSV is written next to it.
+        metadata (dict, optional): Run details to include, e.g. stages and job count.
+
+    Returns:
+        tuple: (JSON path, CSV path).
+    """
+    records = list(_records)
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w") as file:
+        json.dump({**(metadata or {}), **summarize(records), 'records': records}, file, indent=2)
+
+    csv_path = os.path.splitext(report_path)[0] + ".csv"
+    with open(csv_path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records)
+
+    if _profiler is not None:
+        _profiler.dump_stats(os.path.splitext(report_path)[0] + ".prof")
+    return report_path, csv_path
@@ -0,0 +1,300 @@
+import time
+import argparse
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from match_store import read_signal
+from match_times import datetimes_to_epoch, load_schedule
+from substitution_insight import FATIGUE_WINDOW_SECONDS, MAX_SAMPLE_GAP_SECONDS, processed_data_dir
+
+class P2Quantile:
+    """
+    Streaming quantile estimate using the P-square algorithm (Jain & Chlamtac, 1985).
+
+    Keeps five markers, so each update is O(1) in time and memory regardless of
+    how many observations have been seen.
+    """
+
+    def __init__(self, quantile):
+        self.quantile = quantile
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def update(self, value):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        # Find the cell containing the value, extending the extremes if needed
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Nudge the middle markers towards their desired positions
+        for i in range(1, 4):
+            offset = self.desired[i] - self.positions[i]
+            if (offset >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+               (offset <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                self.positions[i] += step
+
+    def _parabolic(self, i, step):
+        n, q = self.positions, self.heights
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i, step):
+        n, q = self.positions, self.heights
+        return q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+
+    def value(self):
+        """
+        Current quantile estimate, or NaN before any observation.
+        """
+        if not self.heights:
+            return float('nan')
+        if len(self.heights) < 5:
+            return float(np.quantile(self.heights, self.quantile))
+        return self.heights[2]
+
+class StreamingSubstitutionEngine:
+    """
+    Incremental version of generate_substitution_recommendations for live feeds.
+
+    Heart rate and distance samples are pushed one at a time in time order;
+    late or duplicate samples (at or before the previous sample of the same
+    signal) are dropped and counted. All rolling state is bounded: a deque of
+    the samples inside the fatigue window, the last five distance drop flags,
+    and a P-square estimate of the 40th percentile rate of change in place of
+    the whole-match quantile.
+    """
+
+    def __init__(self, start_time, age, hr_max=None, window_seconds=FATIGUE_WINDOW_SECONDS, max_gap_seconds=MAX_SAMPLE_GAP_SECONDS, min_time_on_pitch=300):
+        """
+        Args:
+            start_time (float): Epoch seconds of the match start (or last substitution).
+            age (int): Player age, used for the HRmax estimate.
+            hr_max (float, optional): Measured HRmax; estimated as 220 - age if omitted.
+            window_seconds (int): Length of the sustained high heart rate window.
+            max_gap_seconds (int): Longest interval a single heart rate sample may cover.
+            min_time_on_pitch (int): Minimum seconds between two recommendations.
+        """
+        if hr_max is None:
+            hr_max = 220 - age
+        self.high_heart_rate_threshold = 0.8 * hr_max
+        self.window_seconds = window_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.min_time_on_pitch = min_time_on_pitch
+        self.last_substitution_time = start_time
+
+        # Heart rate window: (time, interval, effort time) per sample
+        self.hr_window = deque()
+        self.hr_window_effort = 0
+        self.last_hr_time = None
+
+        # Distance drop detection
+        self.static_threshold = -0.3
+        self.rate_quantile = P2Quantile(0.4)
+        self.drop_flags = deque(maxlen=5)
+        self.last_distance = None
+
+        # Late or duplicate samples dropped, and decision latency (seconds) per accepted sample
+        self.dropped_samples = 0
+        self.samples = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_p99 = P2Quantile(0.99)
+
+    def push_heart_rate(self, timestamp, bpm):
+        """
+        Consume one heart rate sample; a sample at or before the previous one is dropped.
+
+        Returns:
+            list: Recommendations triggered by this sample (usually empty).
+        """
+        if self.last_hr_time is not None and timestamp <= self.last_hr_time:
+            self.dropped_samples += 1
+            return []
+        started = time.perf_counter()
+        interval = 1 if self.last_hr_time is None else min(timestamp - self.last_hr_time, self.max_gap_seconds)
+        self.last_hr_time = timestamp
+
+        effort_time = interval if bpm > self.high_heart_rate_threshold else 0
+        self.hr_window.append((timestamp, interval, effort_time))
+        self.hr_window_effort += effort_time
+
+        window_start = timestamp - self.window_seconds
+        while self.hr_window[0][0] <= window_start:
+            self.hr_window_effort -= self.hr_window.popleft()[2]
+
+        # The oldest sample's interval may reach back past the window start
+        first_time, first_interval, first_effort = self.hr_window[0]
+        overhang = max(0, window_start - (first_time - first_interval)) if first_effort else 0
+
+        recommendations = []
+        if self.hr_window_effort - overhang >= self.window_seconds:
+            recommendations = self._trigger(timestamp, "Sustained high heart rate detected. Consider substitution.")
+        self._record_latency(started)
+        return recommendations
+
+    def push_distance(self, timestamp, distance):
+        """
+        Consume one distance sample; a sample at or before the previous one is dropped.
+
+        Returns:
+            list: Recommendations triggered by this sample (usually empty).
+        """
+        if self.last_distance is not None and timestamp <= self.last_distance[0]:
+            self.dropped_samples += 1
+            return []
+        started = time.perf_counter()
+        recommendations = []
+        if self.last_distance is not None:
+            last_time, last_value = self.last_distance
+            rate_of_change = (distance - last_value) / (timestamp - last_time)
+            self.rate_quantile.update(rate_of_change)
+            drop_threshold = min(self.static_threshold, self.rate_quantile.value())
+            self.drop_flags.append(rate_of_change < drop_threshold)
+            if sum(self.drop_flags) >= 2:
+                recommendations = self._trigger(timestamp, "Sustained significant drop in movement rate detected. Consider substitution.")
+        self.last_distance = (timestamp, distance)
+        self._record_latency(started)
+        return recommendations
+
+    def push(self, signal, timestamp, value):
+        """
+        Consume one sample of either signal ('heart_rate' or 'distance').
+        """
+        if signal == 'heart_rate':
+            return self.push_heart_rate(timestamp, value)
+        if signal == 'distance':
+            return self.push_distance(timestamp, value)
+        raise ValueError(f"Unsupported signal: {signal}")
+
+    def _trigger(self, timestamp, reason):
+        if timestamp - self.last_substitution_time < self.min_time_on_pitch:
+            return []
+        self.last_substitution_time = timestamp
+        return [f"{pd.Timestamp(timestamp, unit='s')}: {reason}"]
+
+    def _record_latency(self, started):
+        latency = time.perf_counter() - started
+        self.samples += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_p99.update(latency)
+
+    def latency_report(self):
+        """
+        Summary of per-sample decision latency, in microseconds, and the number of dropped samples.
+        """
+        return {
+            'samples': self.samples,
+            'dropped': self.dropped_samples,
+            'mean_us': 1e6 * self.latency_total / self.samples if self.samples else 0.0,
+            'p99_us': 1e6 * self.latency_p99.value() if self.samples else 0.0,
+            'max_us': 1e6 * self.latency_max,
+        }
+
+def run_stream(engine, samples):
+    """
+    Feed (signal, timestamp, value) samples from any iterable into the engine.
+
+    Yields:
+        str: Each recommendation as soon as it triggers.
+    """
+    for signal, timestamp, value in samples:
+        yield from engine.push(signal, timestamp, value)
+
+async def run_queue(engine, queue, on_recommendation=print):
+    """
+    Consume samples or small batches of samples from an asyncio queue until None is received.
+
+    Args:
+        engine (StreamingSubstitutionEngine): The engine to feed.
+        queue (asyncio.Queue): Yields (signal, timestamp, value) tuples or lists of them.
+        on_recommendation (callable): Called with each recommendation as it triggers.
+    """
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        batch = item if isinstance(item, list) else [item]
+        for signal, timestamp, value in batch:
+            for recommendation in engine.push(signal, timestamp, value):
+                on_recommendation(recommendation)
+
+def replay_match(match_date, start_time, end_time, speed=None):
+    """
+    Replay a processed match's heart rate and distance samples in time order.
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        start_time (pd.Timestamp): Start of the replay window.
+        end_time (pd.Timestamp): End of the replay window.
+        speed (float, optional): Playback speed relative to wall-clock time
+            (1 = real time, 60 = one match minute per second). None replays
+            as fast as possible.
+
+    Yields:
+        tuple: (signal, epoch seconds, value) samples.
+    """
+    frames = []
+    for signal, column in (('heart_rate', 'beats per minute'), ('distance', 'distance')):
+        data = read_signal(match_date, signal, columns=['timestamp', column], data_dir=processed_data_dir)
+        if data is None:
+            continue
+        data = data[(data['timestamp'] >= start_time) & (data['timestamp'] <= end_time)]
+        frames.append(pd.DataFrame({'signal': signal, 'timestamp': datetimes_to_epoch(data['timestamp']), 'value': data[column].to_numpy(dtype=float)}))
+    if not frames:
+        return
+
+    samples = pd.concat(frames).sort_values('timestamp', kind='stable')
+    replay_started = time.monotonic()
+    first_timestamp = samples['timestamp'].iloc[0]
+    for signal, timestamp, value in samples.itertuples(index=False):
+        if speed:
+            delay = (timestamp - first_timestamp) / speed - (time.monotonic() - replay_started)
+            if delay > 0:
+                time.sleep(delay)
+        yield signal, int(timestamp), value
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a processed match through the live substitution engine.")
+    parser.add_argument("match_date", help="Match date (YYYY-MM-DD) from the schedule.")
+    parser.add_argument("--speed", type=float, default=None, help="Playback speed (1 = real time). Omit to replay as fast as possible.")
+    parser.add_argument("--age", type=int, default=22, help="Player age, used to estimate HRmax.")
+    parser.add_argument("--hr-max", type=float, default=None, help="Measured HRmax; estimated from --age if omitted.")
+    args = parser.parse_args()
+
+    schedule = load_schedule()
+    match = schedule.loc[schedule['date'] == args.match_date].iloc[0]
+    engine = StreamingSubstitutionEngine(int(match['tolerance_start'].timestamp()), args.age, args.hr_max)
+
+    for recommendation in run_stream(engine, replay_match(args.match_date, match['tolerance_start'], match['tolerance_end'], args.speed)):
+        print(recommendation)
+
+    report = engine.latency_report()
+    print(f"Processed {report['samples']} samples ({report['dropped']} late or duplicate dropped): mean {report['mean_us']:.1f} us, "
+          f"p99 {report['p99_us']:.1f} us, max {report['max_us']:.1f} us per decision.")
@@ -1,51 +1,75 @@
 import os
 import pandas as pd
+from instrumentation import add, timed
+from match_store import SIGNAL_TYPES, map_concurrently, write_signal
 
-def load_and_preprocess_data(raw_data_path, processed_data_path):
+def preprocess_match(raw_data_path, processed_data_path, match_date):
     """
-    Load and preprocess match day data, then save it separately for each match day.
+    Load and preprocess the data of a single match day.
+
+    Each data type is cast to its typed schema and written as a Parquet partition
+    (match_<YYYY-MM-DD>/<data_type>.parquet) in the columnar match store. The
+    data types are processed concurrently, so a match takes about as long as
+    its largest file.
 
     Args:
         raw_data_path (str): Path to the raw_data/game_data directory.
         processed_data_path (str): Path to save the processed data.
+        match_date (str): The date of the match (YYYY-MM-DD).
     """
-    # Get a list of all match folders
-    match_folders = [f for f in os.listdir(raw_data_path) if f.startswith('match_')]
-
-    # Loop through each match folder
-    for match_folder in match_folders:
-        match_path = os.path.join(raw_data_path, match_folder)
-        match_date = match_folder.split('_')[-1]  # Extract the date from the folder name
+    match_path = os.path.join(raw_data_path, f"match_{match_date}")
 
-        # Create a directory to save processed data for this match day
-        match_processed_path = os.path.join(processed_data_path, f"match_{match_date}")
-        os.makedirs(match_processed_path, exist_ok=True)
+    # Create a directory to save processed data for this match day
+    match_processed_path = os.path.join(processed_data_path, f"match_{match_date}")
+    os.makedirs(match_processed_path, exist_ok=True)
 
-        print(f"Processing data for {match_date}...")
+    print(f"Processing data for {match_date}...")
 
-        # Load and save each data type
-        data_types = ['heart_rate', 'gps_location', 'steps', 'calories', 'distance', 'active_zone_minutes_day', 'UserExercises']
-        for data_type in data_types:
-            file_name = f"{data_type}_{match_date}.csv"
-            file_path = os.path.join(match_path, file_name)
+    def process_file(data_type):
+        file_name = f"{data_type}_{match_date}.csv"
+        file_path = os.path.join(match_path, file_name)
 
-            try:
-                # Load the data
+        try:
+            # Load the data
+            with timed('parse', match_date, data_type, bytes_read=os.path.getsize(file_path)):
                 data = pd.read_csv(file_path)
-                # Save the data in the processed folder
-                processed_file_path = os.path.join(match_processed_path, f"{data_type}.csv")
-                data.to_csv(processed_file_path, index=False)
-                print(f"Saved {data_type} data for {match_date}.")
-            except FileNotFoundError:
-                print(f"File not found: {file_path}")
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
+                add(rows=len(data))
+            # Save the typed data in the processed folder
+            write_signal(data, match_date, data_type, processed_data_path)
+            return f"Saved {data_type} data for {match_date}."
+        except FileNotFoundError:
+            return f"File not found: {file_path}"
+        except Exception as e:
+            return f"Error processing {file_path}: {e}"
+
+    # Each data type is read and written on its own loader thread
+    for message in map_concurrently(process_file, SIGNAL_TYPES):
+        print(message)
+
+def list_raw_match_dates(raw_data_path):
+    """
+    List the dates (YYYY-MM-DD) of all match folders in the raw data directory.
+    """
+    return [f.split('_')[-1] for f in os.listdir(raw_data_path) if f.startswith('match_')]
+
+def load_and_preprocess_data(raw_data_path, processed_data_path):
+    """
+    Load and preprocess match day data, then save it separately for each match day.
+
+    Args:
+        raw_data_path (str): Path to the raw_data/game_data directory.
+        processed_data_path (str): Path to save the processed data.
+    """
+    # Loop through each match folder
+    for match_date in list_raw_match_dates(raw_data_path):
+        preprocess_match(raw_data_path, processed_data_path, match_date)
 
     print("Finished processing all matches.")
 
-# Paths to raw and processed data
-raw_data_path = './raw_data/game_data'
-processed_data_path = './processed_data'
+if __name__ == "__main__":
+    # Paths to raw and processed data
+    raw_data_path = './raw_data/game_data'
+    processed_data_path = './processed_data'
 
-# Run the function
-load_and_preprocess_data(raw_data_path, processed_data_path)
\ No newline at end of file
+    # Run the function
+    load_and_preprocess_data(raw_data_path, processed_data_path)
@@ -0,0 +1,368 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+import pandas as pd
+from instrumentation import add, timed
+from match_times import EXERCISE_FORMAT, ISO_UTC_FORMAT, epoch_to_datetimes, parse_timestamps
+
+# Root of the processed, columnar match store. Each match is a partition folder
+# (match_<YYYY-MM-DD>) holding one Parquet file per signal type.
+PROCESSED_DATA_DIR = "./processed_data"
+
+SIGNAL_TYPES = ['heart_rate', 'gps_location', 'steps', 'calories', 'distance', 'active_zone_minutes_day', 'UserExercises']
+
+# Columns holding timestamps; these are stored as int64 seconds since the UTC epoch
+TIMESTAMP_COLUMNS = {
+    'heart_rate': ['timestamp'],
+    'gps_location': ['timestamp'],
+    'steps': ['timestamp'],
+    'calories': ['timestamp'],
+    'distance': ['timestamp'],
+    'active_zone_minutes_day': ['timestamp'],
+    'UserExercises': ['exercise_start', 'exercise_end', 'exercise_created', 'exercise_last_updated'],
+}
+
+# Fixed string format of the timestamp columns in the device exports
+TIMESTAMP_FORMATS = {'UserExercises': EXERCISE_FORMAT}
+
+# Storage dtypes for the value columns of each signal
+COLUMN_DTYPES = {
+    'heart_rate': {'beats per minute': 'uint8'},
+    'gps_location': {'latitude': 'float64', 'longitude': 'float64', 'altitude': 'float32'},
+    'steps': {'steps': 'int32'},
+    'calories': {'calories': 'float64'},
+    'distance': {'distance': 'float64'},
+    'active_zone_minutes_day': {'heart rate zone': 'category', 'total minutes': 'int16'},
+    'UserExercises': {},
+}
+
+# Matches whose loaded signals are kept in memory by MatchData, least recently used first
+MATCH_CACHE_SIZE = 4
+_match_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Files read at once. Reads are I/O-bound (and pandas parses without holding
+# the GIL), so a match loads in about the time of its slowest file
+LOAD_WORKERS = 8
+
+# Upcoming matches read in the background while the current one is analysed
+PREFETCH_DEPTH = 1
+
+# Loader thread pool, created on first use, and reads in flight
+_loader = None
+_in_flight = {}
+
+
+def signal_path(match_date, signal, data_dir=PROCESSED_DATA_DIR):
+    """
+    Path of the Parquet partition holding one signal for one match.
+    """
+    return os.path.join(data_dir, f"match_{match_date}", f"{signal}.parquet")
+
+
+def source_path(match_date, signal, data_dir=PROCESSED_DATA_DIR):
+    """
+    Path of the file backing one signal for one match.
+
+    Returns:
+        str or None: The Parquet partition, else a legacy processed CSV, else None.
+    """
+    path = signal_path(match_date, signal, data_dir)
+    if os.path.exists(path):
+        return path
+    csv_path = os.path.join(data_dir, f"match_{match_date}", f"{signal}.csv")
+    return csv_path if os.path.exists(csv_path) else None
+
+
+def apply_schema(data, signal):
+    """
+    Cast a raw signal frame to its storage schema.
+
+    Args:
+        data (pd.DataFrame): Signal data as read from the device export.
+        signal (str): Signal type, one of SIGNAL_TYPES.
+
+    Returns:
+        pd.DataFrame: Typed copy of the data with epoch-second timestamps.
+    """
+    data = data.copy()
+    for column in TIMESTAMP_COLUMNS.get(signal, []):
+        if column in data.columns and not pd.api.types.is_integer_dtype(data[column]):
+            data[column] = parse_timestamps(data[column], TIMESTAMP_FORMATS.get(signal, ISO_UTC_FORMAT))
+    for column, dtype in COLUMN_DTYPES.get(signal, {}).items():
+        if column not in data.columns:
+            continue
+        if dtype == 'uint8':
+            data[column] = data[column].round()
+        data[column] = data[column].astype(dtype)
+    return data
+
+
+def write_signal(data, match_date, signal, data_dir=PROCESSED_DATA_DIR):
+    """
+    Write one signal for one match to the columnar store.
+
+    Args:
+        data (pd.DataFrame): Signal data as read from the device export.
+        match_date (str): The date of the match (YYYY-MM-DD).
+        signal (str): Signal type, one of SIGNAL_TYPES.
+        data_dir (str): Root of the processed data store.
+
+    Returns:
+        str: Path of the written Parquet file.
+    """
+    path = signal_path(match_date, signal, data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with timed('write', match_date, signal, rows=len(data)):
+        apply_schema(data, signal).to_parquet(path, index=False)
+    return path
+
+
+def read_signal(match_date, signal, columns=None, data_dir=PROCESSED_DATA_DIR, epoch=False):
+    """
+    Load one signal for one match as a typed frame.
+
+    Reads the Parquet partition written by load_and_preprocess_data, falling back
+    to a legacy processed CSV for matches that have not been re-processed yet.
+    Timestamp columns are returned as timezone-naive UTC datetimes, or left as
+    int64 epoch seconds when epoch is True.
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        signal (str): Signal type, one of SIGNAL_TYPES.
+        columns (list, optional): Subset of columns to load.
+        data_dir (str): Root of the processed data store.
+        epoch (bool): Keep timestamps as int64 seconds since the UTC epoch.
+
+    Returns:
+        pd.DataFrame or None: The signal data, or None if it does not exist.
+    """
+    path = source_path(match_date, signal, data_dir)
+    if path is None:
+        return None
+    with timed('load', match_date, signal, bytes_read=os.path.getsize(path)):
+        if path.endswith('.parquet'):
+            data = pd.read_parquet(path, columns=columns)
+        else:
+            data = apply_schema(pd.read_csv(path, usecols=columns), signal)
+
+        if not epoch:
+            for column in TIMESTAMP_COLUMNS.get(signal, []):
+                if column in data.columns:
+                    data[column] = epoch_to_datetimes(data[column])
+        add(rows=len(data))
+    return data
+
+
+def _loader_pool():
+    global _loader
+    if _loader is None:
+        _loader = ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix='match-loader')
+    return _loader
+
+
+def _reset_after_fork():
+    # Threads do not survive a fork: a forked worker starts its own pool and
+    # lock, and must not wait for reads the parent had in flight
+    global _loader, _cache_lock
+    _loader = None
+    _cache_lock = threading.Lock()
+    _in_flight.clear()
+
+
+if hasattr(os, 'register_at_fork'):  # Not available on Windows
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def map_concurrently(func, items):
+    """
+    Apply func to every item on the loader thread pool.
+
+    Returns:
+        list: The results in the order of items; the first exception is re-raised.
+    """
+    return list(_loader_pool().map(func, items))
+
+
+def _cached_signal(match_date, signal, columns, data_dir):
+    """
+    Load columns of a signal through the in-process match cache.
+
+    Columns already in memory are not read again; missing ones are read and
+    added to the cached frame. A cached frame is dropped when its source file
+    changes, and the least recently used match is evicted past MATCH_CACHE_SIZE.
+    Safe to call from several threads: files are read outside the cache lock.
+
+    Returns:
+        pd.DataFrame or None: The cached frame, holding at least the requested columns.
+    """
+    key = (os.path.abspath(data_dir), match_date)
+    path = source_path(match_date, signal, data_dir)
+    source = (path, os.stat(path).st_mtime_ns) if path else None
+
+    with _cache_lock:
+        signals = _match_cache.pop(key, {})
+        _match_cache[key] = signals
+        while len(_match_cache) > MATCH_CACHE_SIZE:
+            _match_cache.popitem(last=False)
+        if path is None:
+            signals.pop(signal, None)
+            return None
+        entry = signals.get(signal)
+        if entry is None or entry['source'] != source:
+            entry = signals[signal] = {'source': source, 'frame': None, 'complete': False}
+        frame, complete = entry['frame'], entry['complete']
+
+    if columns is None:
+        if complete:
+            return frame
+        data = read_signal(match_date, signal, data_dir=data_dir)
+    elif frame is None:
+        data = read_signal(match_date, signal, columns=list(columns), data_dir=data_dir)
+    else:
+        missing = [column for column in columns if column not in frame.columns]
+        if not missing:
+            return frame
+        data = read_signal(match_date, signal, columns=missing, data_dir=data_dir)
+
+    with _cache_lock:
+        # Another thread may have added columns meanwhile; keep them all
+        current = entry['frame']
+        if columns is not None and current is not None:
+            new_columns = [column for column in data.columns if column not in current.columns]
+            data = pd.concat([current, data[new_columns]], axis=1) if new_columns else current
+        entry['frame'] = data
+        entry['complete'] = entry['complete'] or columns is None
+    return data
+
+
+def _load_in_background(match_date, signal, columns, data_dir):
+    key = (os.path.abspath(data_dir), match_date, signal)
+    try:
+        return _cached_signal(match_date, signal, columns, data_dir)
+    finally:
+        with _cache_lock:
+            _in_flight.pop(key, None)
+
+
+def clear_match_cache():
+    """
+    Wait for reads in flight, then drop every cached signal, so the next loads read from disk.
+    """
+    with _cache_lock:
+        pending = list(_in_flight.values())
+    wait(pending)
+    with _cache_lock:
+        _match_cache.clear()
+
+
+def prefetched(match_dates, columns, data_dir=PROCESSED_DATA_DIR, depth=PREFETCH_DEPTH, wanted=None):
+    """
+    Iterate over match dates while the next matches' columns are read in the background.
+
+    Args:
+        match_dates (iterable): Match dates (YYYY-MM-DD) in processing order.
+        columns (dict): Signal -> columns (None for all) to prefetch.
+        data_dir (str): Root of the processed data store.
+        depth (int): Number of upcoming matches read ahead.
+        wanted (set, optional): Only these matches are prefetched, e.g. those whose results are stale.
+
+    Yields:
+        str: Each match date, once the following ones have been queued.
+    """
+    match_dates = list(match_dates)
+    upcoming = [match_date for match_date in match_dates if wanted is None or match_date in wanted]
+    for match_date in match_dates:
+        if match_date in upcoming:
+            upcoming.remove(match_date)
+        for next_date in upcoming[:depth]:
+            MatchData(next_date, data_dir, columns=columns).prefetch()
+        yield match_date
+
+
+class MatchData:
+    """
+    Lazy handle on the signals of one match.
+
+    A signal is read on first access, and only the columns asked for. Loaded
+    columns are shared by every handle on the same match in the process, so
+    analyses of one match read each column from disk once. Each access returns
+    its own frame (copy-on-write), which callers may modify freely.
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        data_dir (str): Root of the processed data store.
+        columns (dict, optional): Signal -> columns loaded by get() and [];
+            signals not listed are loaded in full.
+        dtypes (dict, optional): Column -> dtype to cast returned frames to.
+    """
+
+    def __init__(self, match_date, data_dir=PROCESSED_DATA_DIR, columns=None, dtypes=None):
+        self.match_date = match_date
+        self.data_dir = data_dir
+        self.columns = columns or {}
+        self.dtypes = dtypes or {}
+
+    @property
+    def exists(self):
+        return os.path.isdir(os.path.join(self.data_dir, f"match_{self.match_date}"))
+
+    def prefetch(self, signals=None):
+        """
+        Start reading signals on the loader threads without waiting for them.
+
+        Later load() calls wait for a read in flight instead of starting another.
+
+        Args:
+            signals (list, optional): Signals to read; the signals of the handle's
+                columns (or all SIGNAL_TYPES) if omitted.
+        """
+        if not self.exists:
+            return
+        for signal in signals or list(self.columns) or SIGNAL_TYPES:
+            key = (os.path.abspath(self.data_dir), self.match_date, signal)
+            with _cache_lock:
+                if key in _in_flight:
+                    continue
+                _in_flight[key] = _loader_pool().submit(
+                    _load_in_background, self.match_date, signal, self.columns.get(signal), self.data_dir
+                )
+
+    def load_many(self, requests):
+        """
+        Several signals of the match, read concurrently.
+
+        Args:
+            requests (dict): Signal -> columns to load (None for all).
+
+        Returns:
+            dict: Signal -> frame, or None if the signal does not exist.
+        """
+        frames = map_concurrently(lambda request: self.load(*request), requests.items())
+        return dict(zip(requests, frames))
+
+    def load(self, signal, columns=None):
+        """
+        One signal of the match, or None if it does not exist.
+
+        Args:
+            signal (str): Signal type, one of SIGNAL_TYPES.
+            columns (list, optional): Columns to load; all columns if omitted.
+        """
+        pending = _in_flight.get((os.path.abspath(self.data_dir), self.match_date, signal))
+        if pending is not None:
+            wait([pending])
+        frame = _cached_signal(self.match_date, signal, columns, self.data_dir)
+        if frame is None:
+            return None
+        frame = frame[list(columns)] if columns is not None else frame.copy(deep=False)
+        dtypes = {column: dtype for column, dtype in self.dtypes.items() if column in frame.columns}
+        return frame.astype(dtypes) if dtypes else frame
+
+    def get(self, signal, default=None):
+        frame = self.load(signal, self.columns.get(signal))
+        return default if frame is None else frame
+
+    def __getitem__(self, signal):
+        return self.load(signal, self.columns.get(signal))
@@ -0,0 +1,122 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# Paths
+SCHEDULE_PATH = "./reference_data/hockey_matches_schedule.csv"
+
+# Fixed formats of the device exports: signal files use ISO 8601 with a Z suffix,
+# UserExercises uses a space separator and a numeric UTC offset
+ISO_UTC_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+EXERCISE_FORMAT = '%Y-%m-%d %H:%M:%S%z'
+
+# Schedule start and end times are local wall-clock times at the venue
+SCHEDULE_TIMEZONE = 'Europe/London'
+
+# Derived match windows, relative to the scheduled start and end
+TOLERANCE_BEFORE = timedelta(minutes=5)
+TOLERANCE_AFTER = timedelta(minutes=10)
+HALFTIME_OFFSET = timedelta(minutes=35)
+HALFTIME_LENGTH = timedelta(minutes=10)
+
+# Window name -> (start column, end column) in the parsed schedule
+MATCH_WINDOWS = {
+    'match': ('match_start', 'match_end'),
+    'tolerance': ('tolerance_start', 'tolerance_end'),
+    'first_half': ('first_half_start', 'first_half_end'),
+    'halftime': ('halftime_start', 'halftime_end'),
+    'second_half': ('second_half_start', 'second_half_end'),
+}
+
+_EPOCH = pd.Timestamp(0, tz='UTC')
+_schedule_cache = {}
+
+def parse_timestamps(values, fmt=ISO_UTC_FORMAT):
+    """
+    Parse timestamp strings with a fixed format into seconds since the UTC epoch.
+
+    Falls back to generic ISO 8601 parsing only if a value does not match fmt.
+
+    Args:
+        values (pd.Series): Timestamp strings.
+        fmt (str): strptime format of the strings.
+
+    Returns:
+        pd.Series: int64 seconds, or nullable Int64 if any value is missing.
+    """
+    try:
+        parsed = pd.to_datetime(values, format=fmt, utc=True)
+    except ValueError:
+        parsed = pd.to_datetime(values, format='ISO8601', utc=True, errors='coerce')
+    seconds = (parsed - _EPOCH) // pd.Timedelta(seconds=1)
+    return seconds.astype('Int64' if seconds.hasnans else 'int64')
+
+def datetimes_to_epoch(timestamps):
+    """
+    Convert timezone-naive UTC datetimes to an int64 array of epoch seconds.
+    """
+    return np.asarray(timestamps).astype('datetime64[s]').astype(np.int64)
+
+def epoch_to_datetimes(seconds):
+    """
+    Convert epoch seconds to timezone-naive UTC datetimes.
+    """
+    return pd.to_datetime(seconds, unit='s')
+
+def _local_to_utc(local_times):
+    # Localize venue wall-clock times, then drop the zone so they compare with naive UTC data
+    return local_times.dt.tz_localize(SCHEDULE_TIMEZONE, ambiguous='NaT', nonexistent='NaT').dt.tz_convert('UTC').dt.tz_localize(None)
+
+def _parse_schedule(schedule_path):
+    schedule = pd.read_csv(schedule_path)
+    schedule.columns = schedule.columns.str.strip()
+
+    match_day = pd.to_datetime(schedule['date'], format='%d/%m/%Y')
+    schedule['date'] = match_day.dt.strftime('%Y-%m-%d')
+    schedule['match_start'] = _local_to_utc(match_day + pd.to_timedelta(schedule['start_time']))
+    schedule['match_end'] = _local_to_utc(match_day + pd.to_timedelta(schedule['end_time']))
+
+    # Add tolerance periods
+    schedule['tolerance_start'] = schedule['match_start'] - TOLERANCE_BEFORE
+    schedule['tolerance_end'] = schedule['match_end'] + TOLERANCE_AFTER
+
+    # Add half-time period
+    schedule['halftime_start'] = schedule['match_start'] + HALFTIME_OFFSET
+    schedule['halftime_end'] = schedule['halftime_start'] + HALFTIME_LENGTH
+
+    # Create match periods that exclude halftime
+    schedule['first_half_start'] = schedule['tolerance_start']
+    schedule['first_half_end'] = schedule['halftime_start']
+    schedule['second_half_start'] = schedule['halftime_end']
+    schedule['second_half_end'] = schedule['tolerance_end']
+
+    # Epoch-second copies of every window bound for index lookups
+    for start_column, end_column in MATCH_WINDOWS.values():
+        for column in (start_column, end_column):
+            schedule[f"{column}_epoch"] = datetimes_to_epoch(schedule[column])
+
+    return schedule
+
+def load_schedule(schedule_path=SCHEDULE_PATH):
+    """
+    Load the match schedule with all derived match windows in UTC.
+
+    The schedule's local start and end times are converted from SCHEDULE_TIMEZONE
+    to UTC (so BST matches shift by an hour), then the tolerance, half and
+    halftime windows are derived. Window columns are timezone-naive UTC datetimes,
+    directly comparable with read_signal timestamps, with *_epoch int64 copies.
+    The parsed schedule is cached per process until the file's mtime changes.
+
+    Args:
+        schedule_path (str): Path to the schedule CSV.
+
+    Returns:
+        pd.DataFrame: A copy of the parsed schedule, one row per match.
+    """
+    key = (os.path.abspath(schedule_path), os.stat(schedule_path).st_mtime_ns)
+    if key not in _schedule_cache:
+        _schedule_cache.clear()
+        _schedule_cache[key] = _parse_schedule(schedule_path)
+    return _schedule_cache[key].copy()
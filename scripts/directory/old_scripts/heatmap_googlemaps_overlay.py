@@ -1,9 +1,9 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
 import folium
 from folium.plugins import HeatMap
-from datetime import timedelta
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 import time
@@ -16,31 +16,12 @@ output_dir2 = "./outputs/heatmaps/centre"  # Directory for map screenshots
 os.makedirs(output_dir, exist_ok=True)
 os.makedirs(output_dir2, exist_ok=True)
 
-# Load Match Schedule
-schedule_path = "./reference_data/hockey_matches_schedule.csv"
-schedule = pd.read_csv(schedule_path)
+# Load Match Schedule (shared loader from scripts/directory, windows in UTC)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from match_store import read_signal
+from match_times import load_schedule
 
-# Clean column names
-schedule.columns = schedule.columns.str.strip()
-
-# Process match timings
-schedule['date'] = pd.to_datetime(schedule['date'], dayfirst=True).dt.strftime('%Y-%m-%d')
-schedule['match_start'] = pd.to_datetime(schedule['date'] + ' ' + schedule['start_time'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-schedule['match_end'] = pd.to_datetime(schedule['date'] + ' ' + schedule['end_time'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-
-# Add tolerance periods
-schedule['tolerance_start'] = schedule['match_start'] - timedelta(minutes=5)
-schedule['tolerance_end'] = schedule['match_end'] + timedelta(minutes=10)
-
-# Add half-time period
-schedule['halftime_start'] = schedule['match_start'] + timedelta(minutes=35)
-schedule['halftime_end'] = schedule['halftime_start'] + timedelta(minutes=10)
-
-# Create match periods excluding halftime
-schedule['first_half_start'] = schedule['tolerance_start']
-schedule['first_half_end'] = schedule['halftime_start']
-schedule['second_half_start'] = schedule['halftime_end']
-schedule['second_half_end'] = schedule['tolerance_end']
+schedule = load_schedule()
 
 # Debugging - Check the processed schedule
 print(schedule.columns)  # Print column names
@@ -52,18 +33,13 @@ def load_gps_data(match_date, start_time, end_time):
     """
     Load GPS data for a specific match date and filter by the match timeframe.
     """
-    gps_file = os.path.join(processed_data_dir, f"match_{match_date}/gps_location.csv")
-    if not os.path.exists(gps_file):
+    # Timestamps come back parsed as timezone-naive UTC
+    gps_data = read_signal(match_date, "gps_location", data_dir=processed_data_dir)
+    if gps_data is None:
         print(f"GPS data not found for match {match_date}. Skipping.")
         return None
 
-    gps_data = pd.read_csv(gps_file)
-
-    # Convert timestamp to datetime
-    gps_data['timestamp'] = pd.to_datetime(gps_data['timestamp'])
-
-    # Convert GPS timestamps and match times to timezone-naive for comparison
-    gps_data['timestamp'] = gps_data['timestamp'].dt.tz_localize(None)
+    # Match times are timezone-naive UTC as well
     start_time = start_time.tz_localize(None) if start_time.tzinfo else start_time
     end_time = end_time.tz_localize(None) if end_time.tzinfo else end_time
 
@@ -0,0 +1,447 @@
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import effort_rating
+import heatmap_arbitrary_pitch
+import instrumentation
+import load_and_preprocess_data
+import substitution_insight
+from match_store import SIGNAL_TYPES, signal_path
+from match_times import SCHEDULE_PATH, load_schedule
+from pipeline_runner import (
+    STAGES,
+    _effort_components_task,
+    _preprocess_task,
+    _run_task,
+    output_folder,
+    processed_data_path,
+    raw_data_path,
+    write_run_report,
+)
+from pitch_projection import CALIBRATION_CACHE_PATH, VENUES_PATH, get_calibration, venue_key
+
+# Paths
+STATE_PATH = "./cache/orchestrator_state.json"
+component_dir = "./cache/effort_components"
+
+# Modules each task kind runs; they and every script module they import make up its code version
+TASK_CODE = {
+    'preprocess': [load_and_preprocess_data],
+    'effort_components': [effort_rating],
+    'effort_ratings': [effort_rating],
+    'calibrate': [heatmap_arbitrary_pitch],
+    'heatmap': [heatmap_arbitrary_pitch],
+    'substitution': [substitution_insight],
+}
+
+# Pipeline stage -> task kinds it is made of
+STAGE_TASKS = {
+    'preprocess': ['preprocess'],
+    'effort': ['effort_components', 'effort_ratings'],
+    'heatmap': ['calibrate', 'heatmap'],
+    'substitution': ['substitution'],
+}
+
+class Task:
+    """
+    One node of the pipeline DAG: a module-level function call with declared files.
+
+    Args:
+        kind (str): Task kind, a key of TASK_CODE.
+        key (str): Match date, or the kind itself for season-wide tasks.
+        func (callable): Module-level function, so it can run in a worker process.
+        args (tuple): Arguments of func; their repr is part of the fingerprint.
+        inputs (list): Files read by the task. Missing files are fingerprinted as absent.
+        outputs (list): Files written by the task.
+        deps (list): Names of the tasks that must finish first.
+        params (callable, optional): Returns extra JSON-serializable values to
+            fingerprint, evaluated once the dependencies have run.
+    """
+
+    def __init__(self, kind, key, func, args, inputs=(), outputs=(), deps=(), params=None):
+        self.kind = kind
+        self.key = key
+        self.func = func
+        self.args = args
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.params = params
+
+    @property
+    def name(self):
+        return self.kind if self.kind == self.key else f"{self.kind}:{self.key}"
+
+def load_state(state_path=STATE_PATH):
+    """
+    Load the orchestrator state: file fingerprints and the fingerprint and outputs of every finished task.
+    """
+    if os.path.exists(state_path):
+        with open(state_path, "r") as file:
+            return json.load(file)
+    return {'files': {}, 'tasks': {}}
+
+def save_state(state, state_path=STATE_PATH):
+    """
+    Persist the orchestrator state atomically.
+    """
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    temp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(temp_path, state_path)
+
+def local_imports(modules):
+    """
+    The given modules and every module of this directory they import, directly or indirectly.
+
+    Imports are read from the top-level statements of each module's source, so
+    the set follows the code rather than a hand-kept list.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    found = {}
+    pending = list(modules)
+    while pending:
+        module = pending.pop()
+        if module.__name__ in found:
+            continue
+        found[module.__name__] = module
+        with open(module.__file__, "r") as file:
+            tree = ast.parse(file.read())
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                if os.path.exists(os.path.join(directory, f"{name}.py")):
+                    pending.append(sys.modules.get(name) or __import__(name))
+    return list(found.values())
+
+def code_version(kind):
+    """
+    SHA-256 of the source of every module a task kind depends on.
+    """
+    digest = hashlib.sha256()
+    for module in sorted(local_imports(TASK_CODE[kind]), key=lambda module: module.__name__):
+        with open(module.__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def task_fingerprint(task, files, code_versions):
+    """
+    Fingerprint a task by its code version, arguments, extra params and input contents.
+
+    Args:
+        task (Task): The task.
+        files (dict): Path -> file fingerprint from earlier runs, updated in place.
+            Content hashes are reused while a file's size and mtime are unchanged.
+        code_versions (dict): Task kind -> code version, filled on first use.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    if task.kind not in code_versions:
+        code_versions[task.kind] = code_version(task.kind)
+
+    inputs = {}
+    for path in sorted(set(task.inputs)):
+        if os.path.exists(path):
+            files[path] = effort_rating._file_fingerprint(path, files.get(path))
+            inputs[path] = files[path]['sha256']
+        else:
+            files.pop(path, None)
+            inputs[path] = None
+
+    description = {
+        'code': code_versions[task.kind],
+        'args': repr(task.args),
+        'params': task.params() if task.params else None,
+        'inputs': inputs,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+def _execute(name, func, args):
+    # Time the whole task as one record of the run report
+    with instrumentation.timed('task', name=name):
+        return func(*args)
+
+def run_tasks(tasks, jobs=1, state_path=STATE_PATH, force=False):
+    """
+    Run a DAG of tasks, skipping those whose fingerprint and outputs are unchanged.
+
+    A task becomes ready once all of its dependencies have finished; ready tasks
+    run concurrently over a process pool. Fingerprints are taken when a task is
+    ready, so a dependency that rewrites its outputs with identical content
+    does not invalidate its dependents. Tasks downstream of a failure are not
+    run. The state is saved after every finished task, so an interrupted run
+    resumes where it stopped.
+
+    Args:
+        tasks (list): Task objects; dependencies missing from the list are ignored.
+        jobs (int): Number of worker processes. 1 runs everything in-process.
+        state_path (str): Path of the orchestrator state.
+        force (bool): Run every task even if it is up to date.
+
+    Returns:
+        dict: Task name -> (status, detail), status being 'ran', 'up to date',
+        'failed' (detail is the traceback) or 'blocked' (detail names the failed dependency).
+    """
+    state = load_state(state_path)
+    code_versions = {}
+    by_name = {task.name: task for task in tasks}
+    deps = {task.name: [dep for dep in task.deps if dep in by_name] for task in tasks}
+    dependents = {name: [] for name in by_name}
+    for name, task_deps in deps.items():
+        for dep in task_deps:
+            dependents[dep].append(name)
+    waiting = {name: len(task_deps) for name, task_deps in deps.items()}
+    ready = [name for name, count in waiting.items() if count == 0]
+
+    statuses, fingerprints, running = {}, {}, {}
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    def finish(name, status, detail=None):
+        statuses[name] = (status, detail)
+        for dependent in dependents[name]:
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                ready.append(dependent)
+
+    try:
+        while ready or running:
+            while ready:
+                task = by_name[ready.pop(0)]
+                failed = [dep for dep in deps[task.name] if statuses[dep][0] in ('failed', 'blocked')]
+                if failed:
+                    finish(task.name, 'blocked', failed[0])
+                    continue
+
+                fingerprint = task_fingerprint(task, state['files'], code_versions)
+                previous = state['tasks'].get(task.name, {})
+                if (not force and previous.get('fingerprint') == fingerprint
+                        and all(os.path.exists(path) for path in previous.get('outputs', []))):
+                    finish(task.name, 'up to date')
+                    continue
+
+                fingerprints[task.name] = fingerprint
+                args = (task.name, task.func, task.args)
+                if executor is None:
+                    running[task.name] = _run_task(_execute, args)
+                else:
+                    running[task.name] = executor.submit(_run_task, _execute, args)
+
+            if executor is None:
+                done = list(running)
+            else:
+                finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                done = [name for name, future in running.items() if future in finished]
+
+            for name in done:
+                outcome = running.pop(name)
+                ok, value, records = outcome if executor is None else outcome.result()
+                instrumentation.merge(records)
+                if not ok:
+                    # Forget the old fingerprint so the task reruns even if nothing changes
+                    state['tasks'].pop(name, None)
+                    finish(name, 'failed', value)
+                    continue
+                state['tasks'][name] = {
+                    'fingerprint': fingerprints[name],
+                    'outputs': [path for path in by_name[name].outputs if os.path.exists(path)],
+                }
+                finish(name, 'ran')
+            save_state(state, state_path)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        save_state(state, state_path)
+
+    return statuses
+
+def _signal_inputs(match_date, signals, data_dir):
+    # A signal is read from its Parquet partition, else from a legacy processed CSV
+    paths = []
+    for signal in signals:
+        path = signal_path(match_date, signal, data_dir)
+        paths += [path, os.path.splitext(path)[0] + ".csv"]
+    return paths
+
+def component_path(match_date):
+    return os.path.join(component_dir, f"{match_date}.json")
+
+def _effort_components_file_task(match_date, data_folder, path):
+    previous = None
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            previous = json.load(file)
+    entry = _effort_components_task(match_date, data_folder, previous)
+    if entry is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(entry, file, indent=2)
+    return entry['components']
+
+def _effort_ratings_task(match_dates, data_folder, output_folder):
+    # Normalization is season-wide, but only reads the per-match component files
+    cache = effort_rating.load_component_cache()
+    ingested = []
+    for match_date in match_dates:
+        if os.path.exists(component_path(match_date)):
+            with open(component_path(match_date), "r") as file:
+                cache[match_date] = json.load(file)
+            ingested.append(match_date)
+    state = effort_rating.load_normalization_state()
+    rewritten = effort_rating.ingest_matches(ingested, data_folder, output_folder, state, cache)
+    effort_rating.save_component_cache(cache)
+    effort_rating.save_normalization_state(state)
+    return rewritten
+
+def _calibrate_task(schedule_path, data_dir):
+    heatmap_arbitrary_pitch.calibrate_venues(load_schedule(schedule_path), data_dir)
+
+def build_tasks(stages=STAGES, age=22, schedule_path=SCHEDULE_PATH):
+    """
+    Build the per-match task DAG of the pipeline.
+
+    Preprocessing of a match feeds its effort components, heatmap and
+    substitution tasks. The season-wide effort rating task depends on every
+    match's components, and venue calibration on every match's GPS data.
+
+    Args:
+        stages (list): Pipeline stages to include.
+        age (int): Player age, used for the HRmax estimate in substitution analysis.
+        schedule_path (str): Path of the match schedule.
+
+    Returns:
+        list: Task objects in pipeline order.
+    """
+    schedule = load_schedule(schedule_path)
+    matches = [match for _, match in schedule.iterrows()]
+    kinds = {kind for stage in stages for kind in STAGE_TASKS[stage]}
+    tasks = []
+
+    raw_match_dates = []
+    if os.path.isdir(raw_data_path):
+        raw_match_dates = sorted(load_and_preprocess_data.list_raw_match_dates(raw_data_path))
+    if 'preprocess' in kinds:
+        for match_date in raw_match_dates:
+            match_path = os.path.join(raw_data_path, f"match_{match_date}")
+            tasks.append(Task(
+                'preprocess', match_date, _preprocess_task, (match_date, raw_data_path, processed_data_path),
+                inputs=[os.path.join(match_path, f"{signal}_{match_date}.csv") for signal in SIGNAL_TYPES],
+                outputs=[signal_path(match_date, signal, processed_data_path) for signal in SIGNAL_TYPES],
+            ))
+
+    def preprocess_dep(match_date):
+        return [f"preprocess:{match_date}"]
+
+    if 'effort_components' in kinds:
+        effort_signals = sorted({signal for signal, _, _ in effort_rating.EFFORT_COMPONENTS.values()})
+        for match in matches:
+            match_date = match['date']
+            tasks.append(Task(
+                'effort_components', match_date, _effort_components_file_task,
+                (match_date, processed_data_path, component_path(match_date)),
+                inputs=_signal_inputs(match_date, effort_signals, processed_data_path),
+                outputs=[component_path(match_date)],
+                deps=preprocess_dep(match_date),
+            ))
+        match_dates = [match['date'] for match in matches]
+        tasks.append(Task(
+            'effort_ratings', 'effort_ratings', _effort_ratings_task, (match_dates, processed_data_path, output_folder),
+            inputs=[component_path(match_date) for match_date in match_dates],
+            outputs=[
+                *(os.path.join(output_folder, "effort_ratings", f"effort_rating_{match_date}.csv") for match_date in match_dates),
+                effort_rating.NORMALIZATION_STATE_PATH,
+            ],
+            deps=[f"effort_components:{match_date}" for match_date in match_dates],
+        ))
+
+    if 'calibrate' in kinds:
+        tasks.append(Task(
+            'calibrate', 'calibrate', _calibrate_task, (schedule_path, processed_data_path),
+            inputs=[
+                schedule_path,
+                VENUES_PATH,
+                *(path for match in matches for path in _signal_inputs(match['date'], ['gps_location'], processed_data_path)),
+            ],
+            outputs=[CALIBRATION_CACHE_PATH],
+            deps=[dep for match in matches for dep in preprocess_dep(match['date'])],
+        ))
+        for match in matches:
+            match_date, venue = match['date'], venue_key(match)
+            tasks.append(Task(
+                'heatmap', match_date, heatmap_arbitrary_pitch.process_match_heatmap,
+                (match_date, match['match_start'], match['match_end'], venue),
+                inputs=_signal_inputs(match_date, ['gps_location'], processed_data_path),
+                outputs=[os.path.join(heatmap_arbitrary_pitch.output_dir, f"heatmap_{match_date}.png")],
+                deps=[*preprocess_dep(match_date), 'calibrate'],
+                # Only this match's venue calibration matters, not the whole calibration cache
+                params=lambda venue=venue: get_calibration(venue),
+            ))
+
+    if 'substitution' in kinds:
+        for match in matches:
+            match_date = match['date']
+            tasks.append(Task(
+                'substitution', match_date, substitution_insight.process_match_substitutions,
+                (match_date, match['tolerance_start'], match['tolerance_end'], age),
+                inputs=_signal_inputs(match_date, list(substitution_insight.SUBSTITUTION_COLUMNS), processed_data_path),
+                outputs=[os.path.join(substitution_insight.output_folder, f"substitution_recommendations_{match_date}.txt")],
+                deps=preprocess_dep(match_date),
+            ))
+
+    return tasks
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline incrementally, skipping tasks whose inputs and code are unchanged.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Pipeline stages to run.")
+    parser.add_argument("--age", type=int, default=22, help="Player age, used to estimate HRmax.")
+    parser.add_argument("--force", action="store_true", help="Run every task even if it is up to date.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the tasks and their dependencies.")
+    parser.add_argument("--report", help="Path of the JSON run report (default: outputs/run_reports/orchestrator_<time>.json).")
+    args = parser.parse_args()
+
+    tasks = build_tasks(args.stages, args.age)
+    if args.dry_run:
+        for task in tasks:
+            print(f"{task.name} <- {', '.join(task.deps) or '-'}")
+        raise SystemExit(0)
+
+    started = datetime.now(timezone.utc)
+    wall_started = time.perf_counter()
+    with instrumentation.timed('pipeline', name='orchestrator'):
+        statuses = run_tasks(tasks, args.jobs, force=args.force)
+
+    failures = {kind: {} for stage in args.stages for kind in STAGE_TASKS[stage]}
+    for task in tasks:
+        status, detail = statuses[task.name]
+        if status in ('failed', 'blocked'):
+            failures[task.kind][task.key] = detail
+    write_run_report("orchestrator", args.report, started, wall_started, args.stages, args.jobs, failures)
+
+    for task in tasks:
+        status, detail = statuses[task.name]
+        if status == 'failed':
+            print(f"[{task.name}] failed:\n{detail}")
+        elif status == 'blocked':
+            print(f"[{task.name}] not run: {detail} failed.")
+    counts = {status: sum(1 for value, _ in statuses.values() if value == status) for status in ('ran', 'up to date', 'failed', 'blocked')}
+    print(f"Orchestrator run completed: {counts['ran']} ran, {counts['up to date']} up to date, "
+          f"{counts['failed']} failed, {counts['blocked']} blocked.")
+    if any(failures.values()):
+        raise SystemExit(1)
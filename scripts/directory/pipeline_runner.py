@@ -0,0 +1,184 @@
+import os
+import time
+import argparse
+import traceback
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import effort_rating
+import heatmap_arbitrary_pitch
+import instrumentation
+import load_and_preprocess_data
+import substitution_insight
+from match_times import load_schedule
+from pitch_projection import venue_key
+
+# Paths
+raw_data_path = "./raw_data/game_data"
+processed_data_path = "./processed_data"
+output_folder = "./outputs"
+report_dir = "./outputs/run_reports"
+
+STAGES = ['preprocess', 'effort', 'heatmap', 'substitution']
+
+def _run_task(task, args):
+    """
+    Run one per-match task, capturing any exception instead of raising it.
+
+    The task's instrumentation records are returned with its result, so timings
+    from worker processes end up in the parent's run report.
+    """
+    try:
+        outcome = True, task(*args)
+    except Exception:
+        outcome = False, traceback.format_exc()
+    return (*outcome, instrumentation.collect())
+
+def run_per_match(task, task_args, jobs=1, keys=None):
+    """
+    Run a per-match task for every match, optionally over a process pool.
+
+    Results are returned in the order of task_args regardless of completion
+    order, so output is deterministic for any worker count. A failing match does
+    not abort the batch; its traceback is collected instead.
+
+    Args:
+        task (callable): Module-level function taking one match's arguments.
+        task_args (list): One tuple of arguments per match; the first is the match date.
+        jobs (int): Number of worker processes. 1 runs everything in-process.
+        keys (list, optional): Result key per task, e.g. (player, match date);
+            defaults to each task's first argument.
+
+    Returns:
+        tuple: (results, failures) where results maps match date (or key) -> task
+        result and failures maps match date (or key) -> formatted traceback.
+    """
+    if jobs > 1 and len(task_args) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_run_task, task, args) for args in task_args]
+            outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [_run_task(task, args) for args in task_args]
+
+    if keys is None:
+        keys = [args[0] for args in task_args]
+
+    results, failures = {}, {}
+    for key, (ok, value, records) in zip(keys, outcomes):
+        instrumentation.merge(records)
+        if ok:
+            results[key] = value
+        else:
+            failures[key] = value
+    return results, failures
+
+def _preprocess_task(match_date, raw_path, processed_path):
+    # run_per_match keys results on the first argument, so the date goes first
+    load_and_preprocess_data.preprocess_match(raw_path, processed_path, match_date)
+
+def _effort_components_task(match_date, data_folder, cache_entry):
+    # Work on a one-match cache so the refreshed entry can be sent back to the parent
+    cache = {match_date: cache_entry} if cache_entry else {}
+    effort_rating.get_effort_components(match_date, data_folder, cache)
+    return cache.get(match_date)
+
+def run_effort_ratings(match_dates, jobs=1):
+    """
+    Extract effort components in parallel, then normalize and rate serially.
+
+    Returns:
+        dict: Match date -> formatted traceback for matches that failed.
+    """
+    cache = effort_rating.load_component_cache()
+    task_args = [(match_date, processed_data_path, cache.get(match_date)) for match_date in match_dates]
+    entries, failures = run_per_match(_effort_components_task, task_args, jobs)
+    for match_date, entry in entries.items():
+        if entry is not None:
+            cache[match_date] = entry
+
+    # Normalization needs every match, but only touches the cached components
+    state = effort_rating.load_normalization_state()
+    ok_dates = [match_date for match_date in match_dates if match_date not in failures]
+    effort_rating.ingest_matches(ok_dates, processed_data_path, output_folder, state, cache)
+    effort_rating.save_component_cache(cache)
+    effort_rating.save_normalization_state(state)
+    return failures
+
+def run_pipeline(stages=STAGES, jobs=1, age=22):
+    """
+    Run the selected pipeline stages for every scheduled match.
+
+    Args:
+        stages (list): Stages to run, in pipeline order.
+        jobs (int): Number of worker processes per stage.
+        age (int): Player age, used for the HRmax estimate in substitution analysis.
+
+    Returns:
+        dict: Stage -> {match date: formatted traceback} for every failed match.
+    """
+    schedule = load_schedule()
+    match_dates = list(schedule['date'])
+    failures = {}
+
+    if 'preprocess' in stages:
+        with instrumentation.timed('pipeline', name='preprocess'):
+            raw_match_dates = load_and_preprocess_data.list_raw_match_dates(raw_data_path)
+            task_args = [(match_date, raw_data_path, processed_data_path) for match_date in sorted(raw_match_dates)]
+            _, failures['preprocess'] = run_per_match(_preprocess_task, task_args, jobs)
+
+    if 'effort' in stages:
+        with instrumentation.timed('pipeline', name='effort'):
+            failures['effort'] = run_effort_ratings(match_dates, jobs)
+
+    if 'heatmap' in stages:
+        with instrumentation.timed('pipeline', name='heatmap'):
+            # Calibrate venues up front so workers only read the calibration cache
+            heatmap_arbitrary_pitch.calibrate_venues(schedule)
+            task_args = [(match['date'], match['match_start'], match['match_end'], venue_key(match)) for _, match in schedule.iterrows()]
+            _, failures['heatmap'] = run_per_match(heatmap_arbitrary_pitch.process_match_heatmap, task_args, jobs)
+
+    if 'substitution' in stages:
+        with instrumentation.timed('pipeline', name='substitution'):
+            task_args = [(match['date'], match['tolerance_start'], match['tolerance_end'], age) for _, match in schedule.iterrows()]
+            _, failures['substitution'] = run_per_match(substitution_insight.process_match_substitutions, task_args, jobs)
+
+    return failures
+
+def write_run_report(name, report_path, started, wall_started, stages, jobs, failures):
+    """
+    Write the instrumentation report of a run, by default to outputs/run_reports/<name>_<time>.json.
+    """
+    report_path = report_path or os.path.join(report_dir, f"{name}_{started.strftime('%Y%m%dT%H%M%SZ')}.json")
+    instrumentation.write_report(report_path, {
+        'started': started.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'wall_s': time.perf_counter() - wall_started,
+        'stages_run': stages,
+        'jobs': jobs,
+        'failures': {stage: sorted(stage_failures) for stage, stage_failures in failures.items()},
+    })
+    print(f"Run report saved to {report_path}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the hockey performance pipeline for every scheduled match.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Pipeline stages to run.")
+    parser.add_argument("--age", type=int, default=22, help="Player age, used to estimate HRmax.")
+    parser.add_argument("--report", help="Path of the JSON run report (default: outputs/run_reports/pipeline_<time>.json).")
+    parser.add_argument("--profile", action="store_true", help="Also write cProfile stats of the work done in the main process.")
+    args = parser.parse_args()
+
+    if args.profile:
+        instrumentation.enable_profiling()
+    started = datetime.now(timezone.utc)
+    wall_started = time.perf_counter()
+
+    failures = run_pipeline(args.stages, args.jobs, args.age)
+
+    write_run_report("pipeline", args.report, started, wall_started, args.stages, args.jobs, failures)
+
+    for stage, stage_failures in failures.items():
+        for match_date, error in stage_failures.items():
+            print(f"[{stage}] {match_date} failed:\n{error}")
+    print("Pipeline run completed.")
+    if any(failures.values()):
+        raise SystemExit(1)
@@ -0,0 +1,162 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Paths
+VENUES_PATH = "./reference_data/venues.csv"
+CALIBRATION_CACHE_PATH = "./cache/venue_calibrations.json"
+
+EARTH_RADIUS_M = 6_371_008.8  # Mean Earth radius
+M_PER_DEG_LAT = EARTH_RADIUS_M * np.pi / 180
+
+def venue_key(match):
+    """
+    Key identifying the ground a scheduled match was played at.
+
+    Uses the schedule's optional 'venue' column; otherwise home matches share
+    one ground and away matches are keyed by opponent.
+    """
+    venue = match.get('venue')
+    if isinstance(venue, str) and venue.strip():
+        return venue.strip()
+    if match['home_or_away'] == 'home':
+        return 'home'
+    return f"away: {match['opponent']}"
+
+def _local_metres(latitude, longitude, origin_lat, origin_lon):
+    # Equirectangular east/north offsets, exact enough over a pitch-sized area
+    east = (np.asarray(longitude) - origin_lon) * M_PER_DEG_LAT * np.cos(np.radians(origin_lat))
+    north = (np.asarray(latitude) - origin_lat) * M_PER_DEG_LAT
+    return east, north
+
+def estimate_calibration(latitude, longitude):
+    """
+    Estimate a pitch's centre and long-axis bearing from GPS positions on it.
+
+    The long axis is the principal component of the positions in local metres.
+    The centre is the mid-range of the 2nd-98th percentiles along both pitch axes.
+
+    Args:
+        latitude (np.ndarray): Latitudes in decimal degrees.
+        longitude (np.ndarray): Longitudes in decimal degrees.
+
+    Returns:
+        dict: origin_lat, origin_lon (pitch centre) and bearing_deg (long axis,
+        clockwise from north, in [0, 180)).
+    """
+    ref_lat, ref_lon = float(np.median(latitude)), float(np.median(longitude))
+    east, north = _local_metres(latitude, longitude, ref_lat, ref_lon)
+
+    # Ignore stray points (warm-up, walking off) when fitting the axis
+    keep = (
+        (east >= np.percentile(east, 2)) & (east <= np.percentile(east, 98)) &
+        (north >= np.percentile(north, 2)) & (north <= np.percentile(north, 98))
+    )
+    points = np.column_stack([east[keep], north[keep]])
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(points, rowvar=False))
+    axis_east, axis_north = eigenvectors[:, np.argmax(eigenvalues)]
+    bearing = np.degrees(np.arctan2(axis_east, axis_north)) % 180
+
+    theta = np.radians(bearing)
+    length = points[:, 0] * np.sin(theta) + points[:, 1] * np.cos(theta)
+    width = points[:, 0] * np.cos(theta) - points[:, 1] * np.sin(theta)
+    centre_length = (np.percentile(length, 2) + np.percentile(length, 98)) / 2
+    centre_width = (np.percentile(width, 2) + np.percentile(width, 98)) / 2
+
+    # Rotate the centre back to east/north, then to degrees
+    centre_east = centre_width * np.cos(theta) + centre_length * np.sin(theta)
+    centre_north = -centre_width * np.sin(theta) + centre_length * np.cos(theta)
+    return {
+        'origin_lat': ref_lat + centre_north / M_PER_DEG_LAT,
+        'origin_lon': ref_lon + centre_east / (M_PER_DEG_LAT * np.cos(np.radians(ref_lat))),
+        'bearing_deg': float(bearing),
+    }
+
+def calibration_matrix(calibration):
+    """
+    Affine transform taking [latitude, longitude] to [width, length] in pitch metres.
+
+    Returns:
+        tuple: (A, b) with pitch coordinates = [lat, lon] @ A.T + b.
+    """
+    theta = np.radians(calibration['bearing_deg'])
+    k_lat = M_PER_DEG_LAT
+    k_lon = M_PER_DEG_LAT * np.cos(np.radians(calibration['origin_lat']))
+    A = np.array([
+        [-k_lat * np.sin(theta), k_lon * np.cos(theta)],  # width
+        [k_lat * np.cos(theta), k_lon * np.sin(theta)],   # length
+    ])
+    b = -A @ np.array([calibration['origin_lat'], calibration['origin_lon']])
+    return A, b
+
+def project(latitude, longitude, calibration):
+    """
+    Project GPS positions onto the pitch's (width, length) axes in metres.
+
+    Args:
+        latitude (np.ndarray): Latitudes in decimal degrees.
+        longitude (np.ndarray): Longitudes in decimal degrees.
+        calibration (dict): Venue calibration from get_calibration.
+
+    Returns:
+        tuple: (width, length) arrays, centred on the middle of the pitch.
+    """
+    A, b = calibration_matrix(calibration)
+    coords = np.column_stack([latitude, longitude]) @ A.T + b
+    return coords[:, 0], coords[:, 1]
+
+def load_calibrations(cache_path=CALIBRATION_CACHE_PATH, venues_path=VENUES_PATH):
+    """
+    Known venue calibrations: estimated ones from the cache, overridden by reference data.
+
+    reference_data/venues.csv is optional and holds surveyed values with
+    columns venue, origin_lat, origin_lon, bearing_deg.
+    """
+    calibrations = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as file:
+            calibrations.update(json.load(file))
+    if os.path.exists(venues_path):
+        for _, venue in pd.read_csv(venues_path).iterrows():
+            calibrations[venue['venue']] = {
+                'origin_lat': float(venue['origin_lat']),
+                'origin_lon': float(venue['origin_lon']),
+                'bearing_deg': float(venue['bearing_deg']),
+                'source': 'reference',
+            }
+    return calibrations
+
+def get_calibration(venue, latitude=None, longitude=None, cache_path=CALIBRATION_CACHE_PATH):
+    """
+    Calibration for a venue, estimating and caching it on first use.
+
+    Args:
+        venue (str): Venue key, see venue_key.
+        latitude (np.ndarray, optional): GPS latitudes to estimate from if the venue is unknown.
+        longitude (np.ndarray, optional): GPS longitudes to estimate from if the venue is unknown.
+        cache_path (str): Path of the venue calibration cache.
+
+    Returns:
+        dict or None: The calibration, or None if the venue is unknown and no GPS data was given.
+    """
+    calibrations = load_calibrations(cache_path)
+    if venue in calibrations:
+        return calibrations[venue]
+    if latitude is None or len(latitude) == 0:
+        return None
+
+    calibration = {**estimate_calibration(latitude, longitude), 'source': 'estimated'}
+    cached = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as file:
+            cached = json.load(file)
+    cached[venue] = calibration
+
+    # Write atomically so concurrent readers never see a partial file
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(cached, file, indent=2)
+    os.replace(temp_path, cache_path)
+    return calibration
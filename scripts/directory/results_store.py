@@ -0,0 +1,288 @@
+import os
+import re
+import sqlite3
+import argparse
+import pandas as pd
+
+# Paths
+RESULTS_DB_PATH = "./outputs/results.db"
+
+# Player the single-player pipeline writes its results under
+DEFAULT_PLAYER = "default"
+
+# Per-match heatmap files; aggregate heatmaps (heatmap_aggregate_<suffix>.png) are not imported
+HEATMAP_FILE_PATTERN = re.compile(r"heatmap_(\d{4}-\d{2}-\d{2})\.png")
+
+# Effort component columns, in the order of effort_rating.EFFORT_COMPONENTS
+EFFORT_COLUMNS = ['active_zone_minutes', 'calories', 'distance', 'steps', 'avg_heart_rate', 'peak_exercise_heart_rate']
+
+# Training load columns, in the order of training_load.LOAD_COLUMNS
+TRAINING_LOAD_COLUMNS = [
+    'trimp', 'trimp_first_half', 'trimp_second_half',
+    'zone_1_minutes', 'zone_2_minutes', 'zone_3_minutes', 'zone_4_minutes', 'zone_5_minutes', 'recorded_minutes',
+    'acute_load', 'chronic_load', 'acwr',
+]
+
+# GPS kinematics columns, in the order of gps_kinematics.KINEMATICS_COLUMNS
+KINEMATICS_COLUMNS = [
+    'distance', 'high_speed_distance', 'sprint_distance', 'sprints',
+    'peak_speed', 'peak_acceleration', 'rejected_samples',
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS effort_ratings (
+    player TEXT NOT NULL,
+    match_date TEXT NOT NULL,
+    {', '.join(f'{component} REAL' for component in EFFORT_COLUMNS)},
+    effort_rating REAL NOT NULL,
+    PRIMARY KEY (player, match_date)
+);
+CREATE TABLE IF NOT EXISTS substitution_recommendations (
+    player TEXT NOT NULL,
+    match_date TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    signal TEXT NOT NULL,
+    reason TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS substitution_recommendations_match
+    ON substitution_recommendations (player, match_date, timestamp);
+CREATE TABLE IF NOT EXISTS substitution_analyses (
+    player TEXT NOT NULL,
+    match_date TEXT NOT NULL,
+    PRIMARY KEY (player, match_date)
+);
+CREATE TABLE IF NOT EXISTS training_load (
+    player TEXT NOT NULL,
+    match_date TEXT NOT NULL,
+    {', '.join(f'{column} REAL' for column in TRAINING_LOAD_COLUMNS)},
+    PRIMARY KEY (player, match_date)
+);
+CREATE TABLE IF NOT EXISTS kinematics (
+    player TEXT NOT NULL,
+    match_date TEXT NOT NULL,
+    {', '.join(f'{column} REAL' for column in KINEMATICS_COLUMNS)},
+    PRIMARY KEY (player, match_date)
+);
+CREATE TABLE IF NOT EXISTS heatmaps (
+    player TEXT NOT NULL,
+    match_date TEXT NOT NULL,
+    png BLOB NOT NULL,
+    PRIMARY KEY (player, match_date)
+);
+"""
+
+def connect(db_path=RESULTS_DB_PATH):
+    """
+    Open the results store, creating the database and its tables if needed.
+
+    The connection waits up to 30 s for a lock, so pipeline worker processes can
+    write concurrently.
+    """
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.executescript(SCHEMA)
+    return conn
+
+def write_effort_ratings(conn, ratings, player=DEFAULT_PLAYER):
+    """
+    Upsert effort ratings in one transaction.
+
+    Args:
+        conn (sqlite3.Connection): Results store connection.
+        ratings (list): (match_date, effort_components, effort_rating) tuples.
+        player (str): Player the ratings belong to.
+    """
+    columns = ['player', 'match_date', *EFFORT_COLUMNS, 'effort_rating']
+    rows = [
+        (player, match_date, *(components.get(component) for component in EFFORT_COLUMNS), effort_rating)
+        for match_date, components, effort_rating in ratings
+    ]
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO effort_ratings ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+
+def write_recommendations(conn, match_date, recommendations, player=DEFAULT_PLAYER):
+    """
+    Replace a match's substitution recommendations in one transaction.
+
+    Args:
+        conn (sqlite3.Connection): Results store connection.
+        match_date (str): The date of the match (YYYY-MM-DD).
+        recommendations (list): (epoch seconds, signal, reason) tuples.
+        player (str): Player the recommendations belong to.
+    """
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO substitution_analyses (player, match_date) VALUES (?, ?)", (player, match_date))
+        conn.execute("DELETE FROM substitution_recommendations WHERE player = ? AND match_date = ?", (player, match_date))
+        conn.executemany(
+            "INSERT INTO substitution_recommendations (player, match_date, timestamp, signal, reason) VALUES (?, ?, ?, ?, ?)",
+            [(player, match_date, int(timestamp), signal, reason) for timestamp, signal, reason in recommendations],
+        )
+
+def write_heatmap(conn, match_date, png, player=DEFAULT_PLAYER):
+    """
+    Store a rendered heatmap PNG.
+    """
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO heatmaps (player, match_date, png) VALUES (?, ?, ?)", (player, match_date, png))
+
+def _upsert_rows(conn, table, frame, columns):
+    # Insert or replace one row per player and match, with NaN stored as NULL
+    columns = ['player', 'match_date', *columns]
+    rows = [
+        tuple(None if pd.isna(value) else value for value in row)
+        for row in frame[columns].itertuples(index=False, name=None)
+    ]
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            rows,
+        )
+
+def write_training_load(conn, loads):
+    """
+    Upsert training load rows in one transaction.
+
+    Args:
+        conn (sqlite3.Connection): Results store connection.
+        loads (pd.DataFrame): One row per player and match with 'player', 'match_date' and TRAINING_LOAD_COLUMNS.
+    """
+    _upsert_rows(conn, 'training_load', loads, TRAINING_LOAD_COLUMNS)
+
+def write_kinematics(conn, kinematics):
+    """
+    Upsert GPS kinematics rows in one transaction.
+
+    Args:
+        conn (sqlite3.Connection): Results store connection.
+        kinematics (pd.DataFrame): One row per player and match with 'player', 'match_date' and KINEMATICS_COLUMNS.
+    """
+    _upsert_rows(conn, 'kinematics', kinematics, KINEMATICS_COLUMNS)
+
+def read_effort_rating(conn, match_date, player=DEFAULT_PLAYER):
+    """
+    Effort components and rating of one match.
+
+    Returns:
+        pd.DataFrame or None: One row in the column order of the effort CSVs, or None if not stored.
+    """
+    columns = [*EFFORT_COLUMNS, 'effort_rating']
+    row = conn.execute(
+        f"SELECT {', '.join(columns)} FROM effort_ratings WHERE player = ? AND match_date = ?", (player, match_date)
+    ).fetchone()
+    return pd.DataFrame([row], columns=columns) if row is not None else None
+
+def read_recommendations(conn, match_date, player=DEFAULT_PLAYER):
+    """
+    Substitution recommendations of one match in time order.
+
+    Returns:
+        list or None: (epoch seconds, signal, reason) tuples, or None if the match was never analysed.
+    """
+    analysed = conn.execute(
+        "SELECT 1 FROM substitution_analyses WHERE player = ? AND match_date = ?", (player, match_date)
+    ).fetchone()
+    if analysed is None:
+        return None
+    return conn.execute(
+        "SELECT timestamp, signal, reason FROM substitution_recommendations WHERE player = ? AND match_date = ? ORDER BY timestamp",
+        (player, match_date),
+    ).fetchall()
+
+def read_heatmap(conn, match_date, player=DEFAULT_PLAYER):
+    """
+    Rendered heatmap PNG bytes of one match, or None if not stored.
+    """
+    row = conn.execute("SELECT png FROM heatmaps WHERE player = ? AND match_date = ?", (player, match_date)).fetchone()
+    return row[0] if row is not None else None
+
+def season_effort(conn, player=DEFAULT_PLAYER):
+    """
+    Effort ratings of every stored match of a player, in date order.
+    """
+    return pd.read_sql_query(
+        "SELECT * FROM effort_ratings WHERE player = ? ORDER BY match_date", conn, params=(player,)
+    )
+
+def season_training_load(conn, player=DEFAULT_PLAYER):
+    """
+    Training load and acute:chronic workload ratio of every stored match of a player, in date order.
+    """
+    return pd.read_sql_query(
+        "SELECT * FROM training_load WHERE player = ? ORDER BY match_date", conn, params=(player,)
+    )
+
+def season_kinematics(conn, player=DEFAULT_PLAYER):
+    """
+    Distance, high-speed running and sprints of every stored match of a player, in date order.
+    """
+    return pd.read_sql_query(
+        "SELECT * FROM kinematics WHERE player = ? ORDER BY match_date", conn, params=(player,)
+    )
+
+def season_recommendations(conn, player=DEFAULT_PLAYER):
+    """
+    Number of substitution recommendations per match and signal for a player.
+    """
+    return pd.read_sql_query(
+        "SELECT match_date, signal, COUNT(*) AS recommendations FROM substitution_recommendations "
+        "WHERE player = ? GROUP BY match_date, signal ORDER BY match_date, signal",
+        conn,
+        params=(player,),
+    )
+
+def import_outputs(conn, output_folder="./outputs", player=DEFAULT_PLAYER):
+    """
+    Load existing per-match output files into the store.
+
+    Returns:
+        dict: Number of matches imported per output type.
+    """
+    imported = {'effort': 0, 'substitution': 0, 'heatmap': 0}
+
+    effort_dir = os.path.join(output_folder, "effort_ratings")
+    ratings = []
+    for file_name in sorted(os.listdir(effort_dir)) if os.path.isdir(effort_dir) else []:
+        if file_name.startswith("effort_rating_") and file_name.endswith(".csv"):
+            row = pd.read_csv(os.path.join(effort_dir, file_name)).iloc[0].to_dict()
+            ratings.append((file_name[len("effort_rating_"):-len(".csv")], row, row.pop('effort_rating')))
+    write_effort_ratings(conn, ratings, player)
+    imported['effort'] = len(ratings)
+
+    substitution_dir = os.path.join(output_folder, "substitution_recommendations")
+    for file_name in sorted(os.listdir(substitution_dir)) if os.path.isdir(substitution_dir) else []:
+        if file_name.startswith("substitution_recommendations_") and file_name.endswith(".txt"):
+            recommendations = []
+            with open(os.path.join(substitution_dir, file_name), "r") as file:
+                for line in file.read().splitlines():
+                    if not line.strip():
+                        continue
+                    # Lines are "<YYYY-MM-DD HH:MM:SS>: <reason>"; the timestamp has a fixed width
+                    timestamp, reason = line[:19], line[21:]
+                    signal = 'distance' if "movement" in reason.lower() else 'heart_rate'
+                    recommendations.append((int(pd.Timestamp(timestamp).timestamp()), signal, reason))
+            write_recommendations(conn, file_name[len("substitution_recommendations_"):-len(".txt")], recommendations, player)
+            imported['substitution'] += 1
+
+    heatmap_dir = os.path.join(output_folder, "heatmaps")
+    for file_name in sorted(os.listdir(heatmap_dir)) if os.path.isdir(heatmap_dir) else []:
+        match = HEATMAP_FILE_PATTERN.fullmatch(file_name)
+        if match:
+            with open(os.path.join(heatmap_dir, file_name), "rb") as file:
+                write_heatmap(conn, match.group(1), file.read(), player)
+            imported['heatmap'] += 1
+
+    return imported
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import existing output files into the results store.")
+    parser.add_argument("--db", default=RESULTS_DB_PATH, help="Path of the results database.")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    imported = import_outputs(conn)
+    conn.close()
+    print(f"Imported {imported['effort']} effort ratings, {imported['substitution']} recommendation files "
+          f"and {imported['heatmap']} heatmaps into {args.db}.")
@@ -0,0 +1,233 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from instrumentation import add, timed
+from match_store import PROCESSED_DATA_DIR, MatchData, source_path
+from match_times import MATCH_WINDOWS, datetimes_to_epoch, load_schedule
+from time_index import match_windows
+
+# Paths
+aligned_cache_dir = "./cache/aligned"
+
+# Default spacing of the common time grid, in seconds
+DEFAULT_STEP = 1
+
+# Aligned column -> (signal, source column, rule, max gap in seconds). Rules:
+#   'linear': interpolate between neighbouring samples at most max gap apart
+#   'hold':   last sample, valid for max gap seconds after it
+#   'rate':   per-interval totals (max gap = interval length) spread evenly over
+#             the interval; each grid cell gets the part overlapping it, so sums
+#             over the grid match the source for any step
+ALIGNMENT_RULES = {
+    'heart_rate': ('heart_rate', 'beats per minute', 'linear', 15),
+    'latitude': ('gps_location', 'latitude', 'linear', 5),
+    'longitude': ('gps_location', 'longitude', 'linear', 5),
+    'steps': ('steps', 'steps', 'rate', 60),
+    'distance': ('distance', 'distance', 'rate', 60),
+    'calories': ('calories', 'calories', 'rate', 60),
+    'heart_rate_zone': ('active_zone_minutes_day', 'heart rate zone', 'hold', 60),
+}
+
+# Bumped when the resampling changes, so cached frames of an older version are rebuilt
+ALIGNMENT_VERSION = 2
+
+# Storage dtypes of the aligned columns
+ALIGNED_DTYPES = {
+    'heart_rate': 'float32',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'steps': 'float32',
+    'distance': 'float32',
+    'calories': 'float32',
+}
+
+def _integrate_rate(times, values, grid, interval, step):
+    """
+    Totals of the grid cells [grid, grid + step) under per-interval totals spread over [time, time + interval).
+
+    The cumulative total up to t is the sum of the intervals ended by t plus
+    the elapsed share of those in progress, computed from prefix sums of the
+    values and of value * time, so every cell is the difference of two lookups.
+    """
+    values = values.astype(float)
+    ends = times + interval
+    total = np.concatenate([[0.0], np.cumsum(values)])
+    weighted = np.concatenate([[0.0], np.cumsum(values * times)])
+
+    def cumulative(t):
+        ended = np.searchsorted(ends, t, side='right')
+        started = np.searchsorted(times, t, side='left')
+        in_progress = (t * (total[started] - total[ended]) - (weighted[started] - weighted[ended])) / interval
+        return total[ended] + in_progress
+
+    aligned = cumulative(grid + step) - cumulative(grid)
+    # A cell is covered if any interval overlaps it
+    valid = np.searchsorted(times, grid + step, side='left') > np.searchsorted(ends, grid, side='right')
+    return aligned, valid
+
+def align_values(times, values, grid, rule, max_gap, step):
+    """
+    Resample one signal onto a time grid with vectorized as-of lookups.
+
+    Args:
+        times (np.ndarray): Sorted int64 epoch seconds of the samples.
+        values (np.ndarray): Sample values (float, or integer category codes for 'hold').
+        grid (np.ndarray): int64 epoch seconds to resample at.
+        rule (str): 'linear', 'hold' or 'rate' (see ALIGNMENT_RULES).
+        max_gap (int): Longest gap bridged, in seconds.
+        step (int): Grid spacing in seconds, used by 'rate'.
+
+    Returns:
+        tuple: (values at the grid times, boolean mask of the valid ones).
+    """
+    if len(times) == 0:
+        return np.zeros(len(grid), dtype=values.dtype), np.zeros(len(grid), dtype=bool)
+
+    if rule == 'rate':
+        return _integrate_rate(times, values, grid, max_gap, step)
+
+    # Last sample at or before each grid time
+    left = np.searchsorted(times, grid, side='right') - 1
+    has_left = left >= 0
+    left = np.clip(left, 0, len(times) - 1)
+
+    if rule == 'hold':
+        return values[left], has_left & (grid - times[left] < max_gap)
+
+    right = np.minimum(left + 1, len(times) - 1)
+    span = times[right] - times[left]
+    exact = has_left & (grid == times[left])
+    bridged = has_left & (right > left) & (span <= max_gap)
+    weight = np.where(bridged & (span > 0), (grid - times[left]) / np.maximum(span, 1), 0.0)
+    aligned = values[left] + weight * (values[right] - values[left])
+    return aligned, exact | bridged
+
+def align_match(match_date, start, end, step=DEFAULT_STEP, data_dir=PROCESSED_DATA_DIR):
+    """
+    Resample every signal of a match onto one grid of step seconds over [start, end).
+
+    The signals are read concurrently through MatchData (only the columns
+    needed) and each is resampled by its ALIGNMENT_RULES entry. Grid times a signal does not cover
+    are NaN (or missing for the categorical heart rate zone).
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        start (int): Epoch seconds of the first grid time.
+        end (int): Epoch seconds the grid stops before.
+        step (int): Grid spacing in seconds.
+        data_dir (str): Root of the processed data store.
+
+    Returns:
+        pd.DataFrame: 'timestamp' (int64 epoch seconds) plus one column per ALIGNMENT_RULES entry.
+    """
+    grid = np.arange(start, end, step, dtype=np.int64)
+    requests = {}
+    for signal, column, _, _ in ALIGNMENT_RULES.values():
+        requests.setdefault(signal, ['timestamp']).append(column)
+    frames = MatchData(match_date, data_dir).load_many(requests)
+    aligned = {'timestamp': grid}
+
+    for name, (signal, column, rule, max_gap) in ALIGNMENT_RULES.items():
+        data = frames[signal]
+        if data is not None:
+            data = data[['timestamp', column]].dropna(subset=['timestamp', column])
+        if data is None or data.empty:
+            aligned[name] = pd.Series(np.nan, index=range(len(grid)), dtype=ALIGNED_DTYPES.get(name, 'category'))
+            continue
+
+        times = datetimes_to_epoch(data['timestamp'])
+        order = np.argsort(times, kind='stable')
+        if isinstance(data[column].dtype, pd.CategoricalDtype):
+            values = data[column].cat.codes.to_numpy()[order]
+            codes, valid = align_values(times[order], values, grid, rule, max_gap, step)
+            aligned[name] = pd.Categorical.from_codes(np.where(valid, codes, -1), dtype=data[column].dtype)
+        else:
+            values = data[column].to_numpy(dtype=float)[order]
+            values, valid = align_values(times[order], values, grid, rule, max_gap, step)
+            aligned[name] = np.where(valid, values, np.nan).astype(ALIGNED_DTYPES[name])
+        add(rows=len(data))
+
+    return pd.DataFrame(aligned)
+
+def _alignment_key(match_date, start, end, step, data_dir):
+    # Everything the aligned frame depends on: the source files, the grid, the rules and their implementation
+    sources = []
+    for signal in sorted({signal for signal, _, _, _ in ALIGNMENT_RULES.values()}):
+        path = source_path(match_date, signal, data_dir)
+        stat = os.stat(path) if path else None
+        sources.append((signal, path, stat.st_size if stat else None, stat.st_mtime_ns if stat else None))
+    return repr((ALIGNMENT_VERSION, sources, start, end, step, sorted(ALIGNMENT_RULES.items())))
+
+def load_aligned(match_date, start, end, step=DEFAULT_STEP, data_dir=PROCESSED_DATA_DIR, cache_dir=aligned_cache_dir):
+    """
+    Aligned wide frame of a match over [start, end), cached as Parquet while its sources are unchanged.
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        start (int): Epoch seconds of the first grid time.
+        end (int): Epoch seconds the grid stops before.
+        step (int): Grid spacing in seconds.
+        data_dir (str): Root of the processed data store.
+        cache_dir (str or None): Directory of the aligned frame cache; None to always align from the sources.
+
+    Returns:
+        pd.DataFrame or None: The aligned frame, or None if the match has no data folder.
+    """
+    if not MatchData(match_date, data_dir).exists:
+        return None
+    key = _alignment_key(match_date, start, end, step, data_dir)
+
+    cache_path = os.path.join(cache_dir, f"aligned_{match_date}_{start}_{end}_{step}s.parquet") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        metadata = pq.read_schema(cache_path).metadata or {}
+        if metadata.get(b'alignment_key', b'').decode() == key:
+            with timed('load', match_date, 'aligned', bytes_read=os.path.getsize(cache_path)):
+                return pd.read_parquet(cache_path)
+
+    with timed('compute', match_date, 'align_match'):
+        aligned = align_match(match_date, start, end, step, data_dir)
+    if cache_path:
+        table = pa.Table.from_pandas(aligned, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'alignment_key': key.encode()})
+        os.makedirs(cache_dir, exist_ok=True)
+        pq.write_table(table, cache_path)
+    return aligned
+
+def get_aligned_frame(match, step=DEFAULT_STEP, window='tolerance', data_dir=PROCESSED_DATA_DIR, cache_dir=aligned_cache_dir):
+    """
+    Aligned wide frame of a named window of a scheduled match (see load_aligned).
+
+    Args:
+        match (pd.Series): One row of match_times.load_schedule().
+        step (int): Grid spacing in seconds.
+        window (str): Named match window the grid covers.
+        data_dir (str): Root of the processed data store.
+        cache_dir (str or None): Directory of the aligned frame cache.
+
+    Returns:
+        pd.DataFrame or None: The aligned frame, or None if the match has no data folder.
+    """
+    start, end = match_windows(match)[window]
+    return load_aligned(match['date'], start, end, step, data_dir, cache_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Align every signal of each match onto one time grid and cache the wide frames.")
+    parser.add_argument("match_dates", nargs="*", help="Match dates (YYYY-MM-DD); all scheduled matches if omitted.")
+    parser.add_argument("--step", type=int, default=DEFAULT_STEP, help="Grid spacing in seconds.")
+    parser.add_argument("--window", choices=list(MATCH_WINDOWS), default='tolerance', help="Match window the grid covers.")
+    args = parser.parse_args()
+
+    schedule = load_schedule()
+    if args.match_dates:
+        schedule = schedule[schedule['date'].isin(args.match_dates)]
+
+    for _, match in schedule.iterrows():
+        aligned = get_aligned_frame(match, args.step, args.window)
+        if aligned is None:
+            print(f"No data folder for match {match['date']}. Skipping.")
+            continue
+        coverage = ", ".join(f"{name} {aligned[name].notna().mean():.0%}" for name in ALIGNMENT_RULES)
+        print(f"Aligned {match['date']}: {len(aligned)} rows every {args.step} s ({coverage}).")
@@ -0,0 +1,201 @@
+import io
+import os
+import time
+import argparse
+from datetime import datetime, timezone
+import pandas as pd
+
+import effort_rating
+import heatmap_arbitrary_pitch
+import instrumentation
+import load_and_preprocess_data
+import substitution_insight
+from match_times import load_schedule
+from pipeline_runner import STAGES, _effort_components_task, run_per_match, write_run_report
+from pitch_projection import venue_key
+from results_store import connect, write_effort_ratings, write_heatmap, write_recommendations
+
+# Paths
+PLAYERS_PATH = "./reference_data/players.csv"
+squad_raw_data_path = "./raw_data/players"
+squad_processed_data_path = "./processed_data/players"
+squad_cache_dir = "./cache/players"
+
+def load_players(players_path=PLAYERS_PATH):
+    """
+    Load the player registry.
+
+    The registry CSV has columns player, age and optionally hr_max (measured),
+    hr_rest, sex and device. Players without a measured HRmax get the 220 - age
+    estimate; hr_rest and sex are left as None when not given.
+
+    Args:
+        players_path (str): Path to the registry CSV.
+
+    Returns:
+        dict: Player -> {'age', 'hr_max', 'hr_rest', 'sex', 'device'}, in registry order.
+    """
+    players = pd.read_csv(players_path, dtype={'player': str})
+    players.columns = players.columns.str.strip()
+    if 'hr_max' not in players:
+        players['hr_max'] = float('nan')
+    for column in ('hr_rest', 'sex', 'device'):
+        if column not in players:
+            players[column] = None
+    players['hr_max'] = players['hr_max'].fillna(220 - players['age'])
+
+    return {
+        player['player']: {
+            'age': int(player['age']),
+            'hr_max': float(player['hr_max']),
+            'hr_rest': None if pd.isna(player['hr_rest']) else float(player['hr_rest']),
+            'sex': None if pd.isna(player['sex']) else player['sex'],
+            'device': player['device'],
+        }
+        for player in players.to_dict('records')
+    }
+
+def player_data_dir(player):
+    """
+    Processed match store of one player: processed_data/players/<player>/match_<YYYY-MM-DD>/.
+    """
+    return os.path.join(squad_processed_data_path, player)
+
+def component_cache_path(player):
+    return os.path.join(squad_cache_dir, player, "effort_components.json")
+
+def _substitution_task(player, match_date, tolerance_start, tolerance_end, age, hr_max):
+    match_data = substitution_insight.load_match_data(
+        match_date, tolerance_start, tolerance_end, player_data_dir(player), os.path.join(squad_cache_dir, player, "aligned")
+    )
+    if match_data is None:
+        return None
+    recommendations = substitution_insight.generate_substitution_recommendations(
+        match_date, tolerance_start, tolerance_end, match_data, age, hr_max
+    )
+    conn = connect()
+    write_recommendations(conn, match_date, recommendations, player)
+    conn.close()
+    return len(recommendations)
+
+def _heatmap_task(player, match_date, match_start, match_end, venue):
+    gps_data = heatmap_arbitrary_pitch.load_gps_data(match_date, player_data_dir(player))
+    heatmap = heatmap_arbitrary_pitch.compute_heatmap(gps_data, match_date, match_start, match_end, venue)
+    if heatmap is None:
+        return None
+    png = io.BytesIO()
+    with instrumentation.timed('render', match_date, player):
+        heatmap_arbitrary_pitch.get_renderer().render(heatmap, f"Heatmap for {player}, Match {match_date}", png)
+    conn = connect()
+    write_heatmap(conn, match_date, png.getvalue(), player)
+    conn.close()
+    return True
+
+def run_squad_effort(players, match_dates, jobs=1):
+    """
+    Extract effort components for every player and match in parallel, then rate
+    them all in one vectorized pass normalized across the whole squad.
+
+    Returns:
+        dict: (player, match date) -> formatted traceback for tasks that failed.
+    """
+    caches = {player: effort_rating.load_component_cache(component_cache_path(player)) for player in players}
+    keys = [(player, match_date) for player in players for match_date in match_dates]
+    task_args = [(match_date, player_data_dir(player), caches[player].get(match_date)) for player, match_date in keys]
+    entries, failures = run_per_match(_effort_components_task, task_args, jobs, keys)
+
+    rows = []
+    for (player, match_date), entry in entries.items():
+        if entry is None:
+            continue
+        caches[player][match_date] = entry
+        rows.append({'player': player, 'match_date': match_date, **entry['components']})
+    for player, cache in caches.items():
+        effort_rating.save_component_cache(cache, component_cache_path(player))
+    if not rows:
+        return failures
+
+    components = pd.DataFrame(rows)
+    components['effort_rating'] = effort_rating.compute_effort_ratings(components)
+    conn = connect()
+    for player, player_components in components.groupby('player', sort=False):
+        ratings = [(row['match_date'], row, row['effort_rating']) for row in player_components.to_dict('records')]
+        write_effort_ratings(conn, ratings, player)
+    conn.close()
+    return failures
+
+def run_squad(stages=STAGES, jobs=1, players_path=PLAYERS_PATH):
+    """
+    Run the selected pipeline stages for every registered player and scheduled match.
+
+    Each (player, match) pair is one task on the process pool, so a run scales
+    with players x matches over the available cores. Results go to the results
+    store under each player's name.
+
+    Args:
+        stages (list): Stages to run, in pipeline order.
+        jobs (int): Number of worker processes per stage.
+        players_path (str): Path to the player registry CSV.
+
+    Returns:
+        dict: Stage -> {(player, match date): formatted traceback} for every failed task.
+    """
+    players = load_players(players_path)
+    schedule = load_schedule()
+    matches = [match for _, match in schedule.iterrows()]
+    failures = {}
+
+    if 'preprocess' in stages:
+        keys, task_args = [], []
+        for player in players:
+            raw_path = os.path.join(squad_raw_data_path, player)
+            for match_date in sorted(load_and_preprocess_data.list_raw_match_dates(raw_path)):
+                keys.append((player, match_date))
+                task_args.append((raw_path, player_data_dir(player), match_date))
+        _, failures['preprocess'] = run_per_match(load_and_preprocess_data.preprocess_match, task_args, jobs, keys)
+
+    if 'effort' in stages:
+        failures['effort'] = run_squad_effort(players, list(schedule['date']), jobs)
+
+    if 'heatmap' in stages:
+        # Calibrate venues up front so workers only read the calibration cache
+        for player in players:
+            heatmap_arbitrary_pitch.calibrate_venues(schedule, player_data_dir(player))
+        task_args = [
+            (player, match['date'], match['match_start'], match['match_end'], venue_key(match))
+            for player in players for match in matches
+        ]
+        _, failures['heatmap'] = run_per_match(_heatmap_task, task_args, jobs, [args[:2] for args in task_args])
+
+    if 'substitution' in stages:
+        task_args = [
+            (player, match['date'], match['tolerance_start'], match['tolerance_end'], details['age'], details['hr_max'])
+            for player, details in players.items() for match in matches
+        ]
+        _, failures['substitution'] = run_per_match(_substitution_task, task_args, jobs, [args[:2] for args in task_args])
+
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the hockey performance pipeline for every player in the squad.")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Pipeline stages to run.")
+    parser.add_argument("--players", default=PLAYERS_PATH, help="Path to the player registry CSV.")
+    parser.add_argument("--report", help="Path of the JSON run report (default: outputs/run_reports/squad_<time>.json).")
+    parser.add_argument("--profile", action="store_true", help="Also write cProfile stats of the work done in the main process.")
+    args = parser.parse_args()
+
+    if args.profile:
+        instrumentation.enable_profiling()
+    started = datetime.now(timezone.utc)
+    wall_started = time.perf_counter()
+
+    failures = run_squad(args.stages, args.jobs, args.players)
+    write_run_report("squad", args.report, started, wall_started, args.stages, args.jobs, failures)
+
+    for stage, stage_failures in failures.items():
+        for (player, match_date), error in stage_failures.items():
+            print(f"[{stage}] {player} {match_date} failed:\n{error}")
+    print("Squad run completed.")
+    if any(failures.values()):
+        raise SystemExit(1)
@@ -1,124 +1,213 @@
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from instrumentation import add, instrumented
+from match_store import MatchData
+from match_times import load_schedule
+from results_store import connect, write_recommendations
+from signal_alignment import aligned_cache_dir, load_aligned
 
-# Step 1: Load the match schedule
-schedule_path = "./reference_data/hockey_matches_schedule.csv"
-schedule = pd.read_csv(schedule_path)
-
-# Convert date and time columns into a single datetime column
-schedule['date'] = pd.to_datetime(schedule['date'], dayfirst=True).dt.strftime('%Y-%m-%d')
-schedule['match_start'] = pd.to_datetime(schedule['date'] + ' ' + schedule['start_time'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-schedule['match_end'] = pd.to_datetime(schedule['date'] + ' ' + schedule['end_time'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-
-# Add tolerance periods
-schedule['tolerance_start'] = schedule['match_start'] - timedelta(minutes=5)
-schedule['tolerance_end'] = schedule['match_end'] + timedelta(minutes=10)
-
-# Add half-time period
-schedule['halftime_start'] = schedule['match_start'] + timedelta(minutes=35)
-schedule['halftime_end'] = schedule['halftime_start'] + timedelta(minutes=10)
-
-# Create match periods that exclude halftime
-schedule['first_half_start'] = schedule['tolerance_start']
-schedule['first_half_end'] = schedule['halftime_start']
-schedule['second_half_start'] = schedule['halftime_end']
-schedule['second_half_end'] = schedule['tolerance_end']
-
-# Step 2: Prepare to filter match data
+# Paths
 processed_data_dir = "./processed_data/"
 output_folder = "./outputs/substitution_recommendations/"
 
-# Ensure the output directory exists
-os.makedirs(output_folder, exist_ok=True)
-
-def load_match_data(match_date):
-    match_data_path = os.path.join(processed_data_dir, f"match_{match_date}")
-    if not os.path.exists(match_data_path):
+# Sustained high heart rate window, and the longest gap between heart rate
+# samples that still counts as continuous effort
+FATIGUE_WINDOW_SECONDS = 240
+MAX_SAMPLE_GAP_SECONDS = 15
+
+# Grid spacing of the aligned frame, and the interval movement is totalled over
+ALIGNMENT_STEP = 1
+MOVEMENT_INTERVAL_SECONDS = 60
+
+# The source signals and columns the analysis depends on
+SUBSTITUTION_COLUMNS = {
+    'heart_rate': ['timestamp', 'beats per minute'],
+    'distance': ['timestamp', 'distance'],
+}
+
+def _epoch(time):
+    # Schedule times are timezone-naive UTC
+    return int(pd.Timestamp(time).tz_localize(None).timestamp())
+
+def load_match_data(match_date, start_time, end_time, data_dir=processed_data_dir, cache_dir=aligned_cache_dir):
+    """
+    Heart rate and movement of a match window on one 1-second grid, read from
+    the aligned frame of signal_alignment (cached while the sources are unchanged).
+
+    Args:
+        match_date (str): The date of the match (YYYY-MM-DD).
+        start_time (pd.Timestamp): Start of the window.
+        end_time (pd.Timestamp): End of the window (exclusive).
+        data_dir (str): Root of the processed data store.
+        cache_dir (str or None): Directory of the aligned frame cache; None to align without caching.
+
+    Returns:
+        pd.DataFrame or None: The aligned frame, or None if the match has no data folder.
+    """
+    if not MatchData(match_date, data_dir).exists:
         print(f"No data folder for match {match_date}. Skipping.")
         return None
-
-    data = {}
-    data_types = ['heart_rate', 'gps_location', 'steps', 'calories', 'distance', 'active_zone_minutes_day', 'UserExercises']
-
-    for data_type in data_types:
-        file_path = os.path.join(match_data_path, f"{data_type}.csv")
-        if os.path.exists(file_path):
-            data[data_type] = pd.read_csv(file_path)
-        else:
-            print(f"File not found: {file_path}")
-            data[data_type] = None
-
-    return data
-
-def generate_substitution_recommendations(match_date, start_time, end_time, data, age):
+    return load_aligned(match_date, _epoch(start_time), _epoch(end_time), ALIGNMENT_STEP, data_dir, cache_dir)
+
+def sustained_effort_mask(times, effort, window_seconds=FATIGUE_WINDOW_SECONDS, max_gap_seconds=MAX_SAMPLE_GAP_SECONDS):
+    """
+    Flag samples that end a window of sustained high effort.
+
+    Each sample stands for the time since the previous sample (capped at
+    max_gap_seconds; the first sample gets the median interval). A sample is
+    flagged when the high-effort time inside the trailing (t - window, t] time
+    window adds up to the full window length. Window sums use cumulative sums
+    and np.searchsorted, so the cost is O(n log n) with no per-row Python. On
+    data sampled every second this matches a 240-sample rolling count.
+
+    Args:
+        times (np.ndarray): Sorted int64 epoch seconds.
+        effort (np.ndarray): Boolean high-effort flag per sample.
+        window_seconds (int): Length of the trailing window.
+        max_gap_seconds (int): Longest interval a single sample may cover.
+
+    Returns:
+        np.ndarray: Boolean mask, True where effort was sustained for the whole window.
+    """
+    if len(times) == 0:
+        return np.zeros(0, dtype=bool)
+
+    intervals = np.diff(times, prepend=times[0])
+    intervals[0] = np.median(intervals[1:]) if len(times) > 1 else 1
+    intervals = np.minimum(intervals, max_gap_seconds)
+
+    effort_time = np.where(effort, intervals, 0)
+    cumulative = np.concatenate(([0], np.cumsum(effort_time)))
+
+    # First sample inside each trailing window
+    window_starts = np.searchsorted(times, times - window_seconds, side='right')
+    window_effort = cumulative[np.arange(1, len(times) + 1)] - cumulative[window_starts]
+
+    # The first sample's interval may reach back past the window start
+    overhang = np.maximum(0, (times - window_seconds) - (times[window_starts] - intervals[window_starts]))
+    window_effort -= np.where(effort[window_starts], overhang, 0)
+
+    return window_effort >= window_seconds
+
+def debounce_times(times, last_time, min_gap_seconds):
+    """
+    Greedily pick trigger times at least min_gap_seconds after the previous pick.
+
+    Each pick jumps straight to the next eligible candidate with np.searchsorted,
+    so the loop runs once per recommendation rather than once per candidate row.
+
+    Args:
+        times (np.ndarray): Sorted int64 epoch seconds of candidate triggers.
+        last_time (int): Epoch seconds of the previous substitution (or match start).
+        min_gap_seconds (int): Minimum time between two recommendations.
+
+    Returns:
+        tuple: (indices of the picked candidates, epoch seconds of the last pick).
+    """
+    picked = []
+    index = np.searchsorted(times, last_time + min_gap_seconds, side='left')
+    while index < len(times):
+        picked.append(index)
+        last_time = times[index]
+        index = np.searchsorted(times, last_time + min_gap_seconds, side='left')
+    return np.array(picked, dtype=np.intp), last_time
+
+def format_recommendation(timestamp, reason):
+    """
+    Text line of one recommendation, as written to the recommendation files.
+    """
+    return f"{pd.Timestamp(timestamp, unit='s')}: {reason}"
+
+@instrumented('compute')
+def generate_substitution_recommendations(match_date, start_time, end_time, data, age, hr_max=None):
+    """
+    Substitution recommendations for one match window, from its aligned frame.
+
+    Heart rate and movement are read from the same grid rows, so both signals
+    cover exactly the same times. The high-effort threshold is 80% of HRmax:
+    the measured hr_max if given, otherwise estimated as 220 - age. Movement is
+    the distance covered in each fully recorded minute of the window.
+
+    Args:
+        data (pd.DataFrame): Aligned frame from load_match_data.
+
+    Returns:
+        list: (epoch seconds, signal, reason) tuples, heart rate triggers first.
+    """
     recommendations = []
-    min_time_on_pitch = timedelta(minutes=5)
-    last_substitution_time = start_time.tz_localize(None)
+    min_time_on_pitch = int(timedelta(minutes=5).total_seconds())
+    window_start = _epoch(start_time)
+    last_substitution_time = window_start
 
     # HRmax and high-effort threshold
-    hr_max = 220 - age
+    if hr_max is None:
+        hr_max = 220 - age
     high_heart_rate_threshold = 0.8 * hr_max  # Lower threshold for high effort
 
-    # Filter heart rate data
-    heart_rate = data.get("heart_rate", pd.DataFrame())
-    if heart_rate is not None and not heart_rate.empty:
-        heart_rate['timestamp'] = pd.to_datetime(heart_rate['timestamp']).dt.tz_localize(None)
-        hr_filtered = heart_rate[(heart_rate['timestamp'] >= start_time) & 
-                                  (heart_rate['timestamp'] <= end_time)].copy()
-
-        # Identify high-effort zones
-        hr_filtered['effort'] = hr_filtered['beats per minute'] > high_heart_rate_threshold
-        hr_filtered['effort_period'] = hr_filtered['effort'].astype(int).rolling(window=240, min_periods=1).sum()  # Adjusted to 240 seconds
-        fatigue_periods = hr_filtered[hr_filtered['effort_period'] >= 240]  # Adjusted threshold
-
-        for _, row in fatigue_periods.iterrows():
-            current_time = row['timestamp']
-            if current_time - last_substitution_time >= min_time_on_pitch:
-                recommendations.append(f"{current_time}: Sustained high heart rate detected. Consider substitution.")
-                last_substitution_time = current_time
-
-    # Filter and preprocess distance data
-    distance = data.get("distance", pd.DataFrame())
-    if distance is not None and not distance.empty:
-        distance['timestamp'] = pd.to_datetime(distance['timestamp']).dt.tz_localize(None)
-        dist_filtered = distance[(distance['timestamp'] >= start_time) & 
-                                  (distance['timestamp'] <= end_time)].copy()
-
-        # Calculate time differences and distance differences
-        dist_filtered['time_diff'] = dist_filtered['timestamp'].diff().dt.total_seconds().fillna(0)
-        dist_filtered['distance_diff'] = dist_filtered['distance'].diff().fillna(0)
-        dist_filtered['rate_of_change'] = dist_filtered['distance_diff'] / dist_filtered['time_diff']
+    # Grid rows inside the window
+    times = data['timestamp'].to_numpy()
+    first = np.searchsorted(times, window_start, side='left')
+    last = np.searchsorted(times, _epoch(end_time), side='right')
+    data, times = data.iloc[first:last], times[first:last]
+    add(rows=len(data))
+
+    # Identify high-effort zones sustained over a 240 second time window,
+    # on the grid times with a (possibly interpolated) heart rate
+    heart_rate = data['heart_rate'].to_numpy(dtype=float)
+    has_heart_rate = ~np.isnan(heart_rate)
+    if has_heart_rate.any():
+        hr_times = times[has_heart_rate]
+        effort = heart_rate[has_heart_rate] > high_heart_rate_threshold
+        fatigue_times = hr_times[sustained_effort_mask(hr_times, effort)]
+
+        picked, last_substitution_time = debounce_times(fatigue_times, last_substitution_time, min_time_on_pitch)
+        for current_time in fatigue_times[picked]:
+            recommendations.append((int(current_time), 'heart_rate', "Sustained high heart rate detected. Consider substitution."))
+
+    # Distance covered per minute of the window, over minutes recorded throughout
+    minute = (times - window_start) // MOVEMENT_INTERVAL_SECONDS
+    per_minute = data['distance'].groupby(minute).agg(['sum', 'count'])
+    per_minute = per_minute[per_minute['count'] == MOVEMENT_INTERVAL_SECONDS // ALIGNMENT_STEP]
+    if not per_minute.empty:
+        # Minutes are stamped at their start, like the source's per-minute rows;
+        # calculate the change in movement between them
+        minute_times = window_start + per_minute.index.to_numpy() * MOVEMENT_INTERVAL_SECONDS
+        movement = pd.DataFrame({'distance': per_minute['sum'].to_numpy()}, index=minute_times)
+        movement['time_diff'] = np.diff(minute_times, prepend=minute_times[0])
+        movement['distance_diff'] = movement['distance'].diff().fillna(0)
+        movement['rate_of_change'] = movement['distance_diff'] / movement['time_diff']
 
         # Define a threshold for significant drops in rate of change
         static_threshold = -0.3  # More permissive
-        dynamic_threshold = dist_filtered['rate_of_change'].quantile(0.4)  # Increase dynamic threshold percentile
+        dynamic_threshold = movement['rate_of_change'].quantile(0.4)  # Increase dynamic threshold percentile
         drop_threshold = min(static_threshold, dynamic_threshold)
 
         # Identify sustained drops (rate below threshold for 2 out of 5 intervals)
-        dist_filtered['drop_detected'] = dist_filtered['rate_of_change'] < drop_threshold
-        dist_filtered['sustained_drop'] = dist_filtered['drop_detected'].rolling(window=5, min_periods=1).sum() >= 2  # Adjusted to require 2 intervals
+        movement['drop_detected'] = movement['rate_of_change'] < drop_threshold
+        movement['sustained_drop'] = movement['drop_detected'].rolling(window=5, min_periods=1).sum() >= 2  # Adjusted to require 2 intervals
 
         # Trigger recommendations for sustained drops
-        sustained_drops = dist_filtered[dist_filtered['sustained_drop']]
-        for _, row in sustained_drops.iterrows():
-            current_time = row['timestamp']
-            if current_time - last_substitution_time >= min_time_on_pitch:
-                recommendations.append(f"{current_time}: Sustained significant drop in movement rate detected. Consider substitution.")
-                last_substitution_time = current_time
+        drop_times = movement.index[movement['sustained_drop']].to_numpy()
+        picked, last_substitution_time = debounce_times(drop_times, last_substitution_time, min_time_on_pitch)
+        for current_time in drop_times[picked]:
+            recommendations.append((int(current_time), 'distance', "Sustained significant drop in movement rate detected. Consider substitution."))
 
     return recommendations
 
-# Step 3: Iterate over matches and analyze data
-for _, match in schedule.iterrows():
-    match_date = match['date']
-    tolerance_start = match['tolerance_start']
-    tolerance_end = match['tolerance_end']
+def process_match_substitutions(match_date, tolerance_start, tolerance_end, age=22):
+    """
+    Generate and save the substitution recommendations for a single match, to
+    the recommendation text file and the results store.
 
+    Returns:
+        list or None: (epoch seconds, signal, reason) tuples, or None if the match has no data.
+    """
     # Load match data
-    match_data = load_match_data(match_date)
+    match_data = load_match_data(match_date, tolerance_start, tolerance_end)
     if match_data is None:
-        continue
+        return None
 
     # Generate recommendations
     recommendations = generate_substitution_recommendations(
@@ -126,11 +215,28 @@ for _, match in schedule.iterrows():
         tolerance_start,
         tolerance_end,
         match_data,
-        age=22  # Replace with the user's age
+        age=age
     )
-    
-    # Step 4: Save recommendations
+
+    # Save recommendations
+    os.makedirs(output_folder, exist_ok=True)
     output_path = os.path.join(output_folder, f"substitution_recommendations_{match_date}.txt")
     with open(output_path, "w") as file:
-        file.write("\n".join(recommendations))
-    print(f"Recommendations for {match_date} saved to {output_path}.")
\ No newline at end of file
+        file.write("\n".join(format_recommendation(timestamp, reason) for timestamp, _, reason in recommendations))
+    conn = connect()
+    write_recommendations(conn, match_date, recommendations)
+    conn.close()
+    print(f"Recommendations for {match_date} saved to {output_path}.")
+    return recommendations
+
+if __name__ == "__main__":
+    schedule = load_schedule()
+
+    # Iterate over matches and analyze data
+    for _, match in schedule.iterrows():
+        process_match_substitutions(
+            match['date'],
+            match['tolerance_start'],
+            match['tolerance_end'],
+            age=22  # Replace with the user's age
+        )
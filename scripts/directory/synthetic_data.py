@@ -0,0 +1,231 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from match_times import EXERCISE_FORMAT, ISO_UTC_FORMAT, load_schedule
+from pitch_projection import M_PER_DEG_LAT
+
+# Home ground centre and long-axis bearing, close to the real home venue
+HOME_ORIGIN = (51.4224, -0.5587)
+HOME_BEARING = 35.0
+
+OPPONENTS = ["Brighton 1's", "Royal Holloway 1's", "Surrey 2's", "Kingston 1's", "Reading 3's", "Oxford 2's"]
+KICKOFF_TIMES = ["15:00:00", "17:45:00", "19:30:00"]
+MATCH_MINUTES = 80
+
+# UserExercises export columns, in file order
+EXERCISE_COLUMNS = [
+    'exercise_id', 'exercise_start', 'exercise_end', 'utc_offset', 'exercise_created', 'exercise_last_updated',
+    'activity_name', 'log_type', 'pool_length', 'pool_length_unit', 'intervals', 'distance_units',
+    'tracker_total_calories', 'tracker_total_steps', 'tracker_total_distance_mm', 'tracker_total_altitude_mm',
+    'tracker_avg_heart_rate', 'tracker_peak_heart_rate', 'tracker_avg_pace_mm_per_second',
+    'tracker_avg_speed_mm_per_second', 'tracker_peak_speed_mm_per_second', 'tracker_auto_stride_run_mm',
+    'tracker_auto_stride_walk_mm', 'tracker_swim_lengths', 'tracker_pool_length', 'tracker_pool_length_unit',
+    'tracker_cardio_load', 'manually_logged_total_calories', 'manually_logged_total_steps',
+    'manually_logged_total_distance_mm', 'manually_logged_pool_length', 'manually_logged_pool_length_unit', 'events',
+]
+
+def _smooth(values, alpha):
+    # First-order low-pass filter: y[n] = alpha * x[n] + (1 - alpha) * y[n-1]
+    return lfilter([alpha], [1, alpha - 1], values, zi=[(1 - alpha) * values[0]])[0]
+
+def _iso(seconds):
+    return pd.to_datetime(seconds, unit='s').strftime(ISO_UTC_FORMAT)
+
+def generate_schedule(n_matches, seed=0, first_date="2024-09-04"):
+    """
+    Weekly schedule in the format of reference_data/hockey_matches_schedule.csv.
+    """
+    rng = np.random.default_rng([seed, 0])
+    dates = pd.date_range(first_date, periods=n_matches, freq='7D')
+    goals_for = rng.integers(0, 6, n_matches)
+    goals_against = rng.integers(0, 6, n_matches)
+    start = pd.to_timedelta([KICKOFF_TIMES[i % len(KICKOFF_TIMES)] for i in range(n_matches)])
+    return pd.DataFrame({
+        'date': dates.strftime('%d/%m/%Y'),
+        'start_time': [str(t).split()[-1] for t in start],
+        'end_time': [str(t).split()[-1] for t in start + pd.Timedelta(minutes=MATCH_MINUTES)],
+        'opponent': [OPPONENTS[i % len(OPPONENTS)] for i in range(n_matches)],
+        'home_or_away': ['home' if i % 2 else 'away' for i in range(n_matches)],
+        'scoreline': [f"{a}-{b}" for a, b in zip(goals_for, goals_against)],
+        'result': np.select([goals_for > goals_against, goals_for < goals_against], ['Win', 'Loss'], 'Draw'),
+        'user_goals_scored': rng.integers(0, 3, n_matches),
+        'match_type': 'League Game',
+    })
+
+def venue_layout(match, seed=0):
+    """
+    Pitch centre (lat, lon) and bearing of a synthetic match's ground.
+    """
+    if match['home_or_away'] == 'home':
+        return HOME_ORIGIN, HOME_BEARING
+    rng = np.random.default_rng([seed, 1, OPPONENTS.index(match['opponent']) if match['opponent'] in OPPONENTS else 99])
+    origin = (HOME_ORIGIN[0] + rng.uniform(-0.5, 0.5), HOME_ORIGIN[1] + rng.uniform(-0.5, 0.5))
+    return origin, float(rng.uniform(0, 180))
+
+def generate_match(match, age=22, seed=0, player_index=0, match_index=0):
+    """
+    Synthesize one player's exports for one scheduled match.
+
+    Heart rate is sampled every 1-5 s from four hours before kick-off, GPS at
+    1 Hz from the warm-up to just after the final whistle, and steps, distance,
+    calories and active zone minutes per minute, as in the device exports.
+
+    Args:
+        match (pd.Series): One row of match_times.load_schedule().
+        age (int): Player age, sets HRmax and the heart rate zones.
+        seed (int): Season seed; the same arguments always give the same data.
+        player_index (int): Index of the player in the squad.
+        match_index (int): Index of the match in the season.
+
+    Returns:
+        dict: Signal type -> DataFrame with the raw export columns.
+    """
+    rng = np.random.default_rng([seed, 2, player_index, match_index])
+    hr_max = 220 - age
+    kickoff = int(match['match_start'].timestamp())
+    final_whistle = int(match['match_end'].timestamp())
+    halftime_start = kickoff + 35 * 60
+    halftime_end = halftime_start + 10 * 60
+    day_start = int(pd.Timestamp(match['date']).timestamp())
+
+    # Heart rate: irregular 1-5 s samples around an activity-dependent target
+    intervals = rng.choice([1, 2, 3, 4, 5], size=int(6.5 * 3600 / 2.2), p=[0.17, 0.55, 0.26, 0.01, 0.01])
+    hr_times = kickoff - 4 * 3600 + np.cumsum(intervals)
+    hr_times = hr_times[hr_times <= final_whistle + 2 * 3600]
+    on_pitch = (hr_times >= kickoff) & (hr_times <= final_whistle)
+    target = np.full(len(hr_times), 85.0)
+    target[(hr_times >= kickoff - 20 * 60) & (hr_times < kickoff)] = 0.65 * hr_max
+    target[on_pitch] = 0.8 * hr_max
+    target[(hr_times >= halftime_start) & (hr_times < halftime_end)] = 0.6 * hr_max
+    for bout_start in rng.uniform(kickoff, final_whistle - 8 * 60, size=4):
+        bout = (hr_times >= bout_start) & (hr_times < bout_start + rng.uniform(3, 7) * 60)
+        target[bout] = 0.93 * hr_max
+    heart_rate = _smooth(target, 0.05) + _smooth(rng.normal(0, 12, len(hr_times)), 0.3)
+    heart_rate = np.clip(np.round(heart_rate), 55, hr_max + 5)
+
+    # GPS: an Ornstein-Uhlenbeck walk around the player's position on the pitch
+    gps_times = np.arange(kickoff - 15 * 60, final_whistle + 5 * 60)
+    base_width, base_length = rng.uniform(-15, 15), rng.uniform(-30, 30)
+    width = base_width + lfilter([1], [1, -0.995], rng.normal(0, 0.8, len(gps_times)))
+    length = base_length + lfilter([1], [1, -0.995], rng.normal(0, 1.2, len(gps_times)))
+    width, length = np.clip(width, -27, 27), np.clip(length, -45, 45)
+    resting = (gps_times < kickoff) | ((gps_times >= halftime_start) & (gps_times < halftime_end))
+    width[resting] = 26 + rng.normal(0, 0.5, resting.sum())
+    (origin_lat, origin_lon), bearing = venue_layout(match, seed)
+    theta = np.radians(bearing)
+    east = width * np.cos(theta) + length * np.sin(theta)
+    north = -width * np.sin(theta) + length * np.cos(theta)
+    latitude = np.round(origin_lat + north / M_PER_DEG_LAT, 6)
+    longitude = np.round(origin_lon + east / (M_PER_DEG_LAT * np.cos(np.radians(origin_lat))), 6)
+    altitude = np.round(30 + _smooth(rng.normal(0, 25, len(gps_times)), 0.2), 1)
+
+    # Per-minute activity: all minutes around the match, some minutes the rest of the day
+    step_lengths = np.hypot(np.diff(width, prepend=width[0]), np.diff(length, prepend=length[0]))
+    gps_minutes = (gps_times - day_start) // 60
+    match_distance = np.bincount(gps_minutes, weights=step_lengths, minlength=1440)[:1440]
+    minutes = np.arange(1440)
+    around_match = (minutes >= (kickoff - day_start) // 60 - 120) & (minutes <= (final_whistle - day_start) // 60 + 120)
+    active = around_match & ((match_distance > 0) | (rng.random(1440) < 0.4))
+    walking = rng.uniform(10, 80, 1440)
+    distance = np.round(np.where(match_distance > 0, match_distance, walking), 2)
+    steps = np.round(distance * rng.uniform(1.3, 1.6, 1440)).astype(int)
+
+    hr_minutes = (hr_times - day_start) // 60
+    minute_hr = np.bincount(hr_minutes, weights=heart_rate, minlength=1440)[:1440] / np.maximum(np.bincount(hr_minutes, minlength=1440)[:1440], 1)
+    calories = np.round(1.24 + np.where(minute_hr > 0, np.maximum(minute_hr - 70, 0) * 0.12, 0), 2)
+
+    zone = np.select([minute_hr >= 0.86 * hr_max, minute_hr >= 0.76 * hr_max, minute_hr >= 0.64 * hr_max], ['peak', 'cardio', 'fat burn'], '')
+    in_zone = zone != ''
+
+    exercise_start, exercise_end = kickoff - 15 * 60, final_whistle + 10 * 60
+    in_exercise = (hr_times >= exercise_start) & (hr_times <= exercise_end)
+    exercise = dict.fromkeys(EXERCISE_COLUMNS, np.nan)
+    exercise.update({
+        'exercise_id': int(rng.integers(10 ** 18, 9 * 10 ** 18)),
+        'exercise_start': pd.Timestamp(exercise_start, unit='s', tz='UTC').strftime(EXERCISE_FORMAT),
+        'exercise_end': pd.Timestamp(exercise_end, unit='s', tz='UTC').strftime(EXERCISE_FORMAT),
+        'utc_offset': '+00:00',
+        'exercise_created': pd.Timestamp(final_whistle + 6 * 3600, unit='s', tz='UTC').strftime(EXERCISE_FORMAT),
+        'exercise_last_updated': pd.Timestamp(final_whistle + 6 * 3600, unit='s', tz='UTC').strftime(EXERCISE_FORMAT),
+        'activity_name': 'Sport', 'log_type': 'TRACKER', 'pool_length': 0, 'pool_length_unit': 'UNSPECIFIED',
+        'distance_units': 'METRIC',
+        'tracker_total_calories': float(calories[(exercise_start - day_start) // 60:(exercise_end - day_start) // 60].sum().round()),
+        'tracker_total_steps': float(steps[active].sum()),
+        'tracker_total_distance_mm': float(round(step_lengths.sum() * 1000)),
+        'tracker_total_altitude_mm': 0.0,
+        'tracker_avg_heart_rate': float(round(heart_rate[in_exercise].mean())),
+        'tracker_peak_heart_rate': float(heart_rate[in_exercise].max()),
+        'tracker_avg_pace_mm_per_second': 0.0,
+        'tracker_avg_speed_mm_per_second': float(round(step_lengths.mean() * 1000)),
+        'tracker_peak_speed_mm_per_second': float(round(step_lengths.max() * 1000)),
+        'tracker_auto_stride_run_mm': 1250.0, 'tracker_auto_stride_walk_mm': 680.0,
+        'tracker_swim_lengths': 0.0, 'tracker_pool_length': 0.0, 'tracker_pool_length_unit': 'UNSPECIFIED',
+        'tracker_cardio_load': 0.0,
+    })
+
+    minute_times = day_start + 60 * minutes
+    return {
+        'heart_rate': pd.DataFrame({'timestamp': _iso(hr_times), 'beats per minute': heart_rate}),
+        'gps_location': pd.DataFrame({'timestamp': _iso(gps_times), 'latitude': latitude, 'longitude': longitude, 'altitude': altitude}),
+        'steps': pd.DataFrame({'timestamp': _iso(minute_times[active]), 'steps': steps[active]}),
+        'calories': pd.DataFrame({'timestamp': _iso(minute_times), 'calories': calories}),
+        'distance': pd.DataFrame({'timestamp': _iso(minute_times[active]), 'distance': distance[active]}),
+        'active_zone_minutes_day': pd.DataFrame({
+            'timestamp': _iso(minute_times[in_zone]),
+            'heart rate zone': zone[in_zone],
+            'total minutes': np.where(zone[in_zone] == 'fat burn', 1, 2),
+        }),
+        'UserExercises': pd.DataFrame([exercise], columns=EXERCISE_COLUMNS),
+    }
+
+def generate_season(output_dir, n_players=1, n_matches=6, seed=0):
+    """
+    Write a synthetic squad season in the repository's raw layout.
+
+    Creates reference_data/hockey_matches_schedule.csv, reference_data/players.csv
+    and raw_data/players/<player>/match_<YYYY-MM-DD>/<signal>_<YYYY-MM-DD>.csv
+    under output_dir. Output is deterministic for a given seed.
+
+    Returns:
+        tuple: (schedule path, players path, raw data path).
+    """
+    reference_dir = os.path.join(output_dir, "reference_data")
+    raw_dir = os.path.join(output_dir, "raw_data", "players")
+    os.makedirs(reference_dir, exist_ok=True)
+
+    schedule_path = os.path.join(reference_dir, "hockey_matches_schedule.csv")
+    generate_schedule(n_matches, seed).to_csv(schedule_path, index=False)
+    schedule = load_schedule(schedule_path)
+
+    rng = np.random.default_rng([seed, 3])
+    players = pd.DataFrame({
+        'player': [f"player_{i + 1:02d}" for i in range(n_players)],
+        'age': rng.integers(18, 35, n_players),
+        'hr_max': np.nan,
+        'device': 'fitbit',
+    })
+    players_path = os.path.join(reference_dir, "players.csv")
+    players.to_csv(players_path, index=False)
+
+    for player_index, player in players.iterrows():
+        for match_index, match in schedule.iterrows():
+            match_dir = os.path.join(raw_dir, player['player'], f"match_{match['date']}")
+            os.makedirs(match_dir, exist_ok=True)
+            signals = generate_match(match, int(player['age']), seed, player_index, match_index)
+            for signal, data in signals.items():
+                data.to_csv(os.path.join(match_dir, f"{signal}_{match['date']}.csv"), index=False)
+
+    print(f"Synthetic season of {n_players} players x {n_matches} matches written to {output_dir}.")
+    return schedule_path, players_path, raw_dir
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic squad season.")
+    parser.add_argument("output_dir", help="Directory to write the season to.")
+    parser.add_argument("--players", type=int, default=1, help="Number of players.")
+    parser.add_argument("--matches", type=int, default=6, help="Number of weekly matches.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    args = parser.parse_args()
+
+    generate_season(args.output_dir, args.players, args.matches, args.seed)
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from match_times import MATCH_WINDOWS, datetimes_to_epoch
+
+def to_epoch(value):
+    """
+    Convert a window bound (epoch seconds, datetime or timestamp string) to epoch seconds.
+
+    Timezone-naive datetimes are taken to be UTC, like read_signal timestamps.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).timestamp())
+
+def match_windows(match):
+    """
+    Named windows of a scheduled match as (start, end) epoch seconds.
+
+    Args:
+        match (pd.Series): One row of match_times.load_schedule().
+
+    Returns:
+        dict: Window name (see MATCH_WINDOWS) -> (start, end) epoch seconds.
+    """
+    return {
+        name: (int(match[f"{start_column}_epoch"]), int(match[f"{end_column}_epoch"]))
+        for name, (start_column, end_column) in MATCH_WINDOWS.items()
+    }
+
+class TimeIndex:
+    """
+    Sorted epoch-second index over one signal frame for fast window slicing.
+
+    The frame is sorted by time once; every window lookup is then two binary
+    searches and a positional slice, instead of a boolean mask over all rows.
+    Windows are closed on both ends, matching (ts >= start) & (ts <= end).
+    """
+
+    def __init__(self, data, time_column='timestamp'):
+        """
+        Args:
+            data (pd.DataFrame): Signal frame, e.g. from read_signal.
+            time_column (str): Column holding datetimes or epoch seconds.
+        """
+        times = data[time_column]
+        if pd.api.types.is_datetime64_any_dtype(times):
+            epoch = datetimes_to_epoch(times)
+        else:
+            epoch = times.to_numpy(dtype=np.int64)
+
+        if len(epoch) > 1 and np.any(epoch[1:] < epoch[:-1]):
+            order = np.argsort(epoch, kind='stable')
+            data = data.iloc[order].reset_index(drop=True)
+            epoch = epoch[order]
+
+        self.data = data
+        self.times = epoch
+
+    def bounds(self, start, end):
+        """
+        Positional [lo, hi) bounds of the rows with start <= time <= end.
+        """
+        lo = np.searchsorted(self.times, to_epoch(start), side='left')
+        hi = np.searchsorted(self.times, to_epoch(end), side='right')
+        return lo, max(lo, hi)
+
+    def slice(self, start, end):
+        """
+        Rows with start <= time <= end, as a positional slice of the sorted frame.
+        """
+        lo, hi = self.bounds(start, end)
+        return self.data.iloc[lo:hi]
+
+    def values(self, column, start, end):
+        """
+        Zero-copy NumPy view of one column within a window.
+        """
+        lo, hi = self.bounds(start, end)
+        return self.data[column].to_numpy()[lo:hi]
+
+    def window(self, match, name):
+        """
+        Rows within a named window of a scheduled match.
+
+        Args:
+            match (pd.Series): One row of match_times.load_schedule().
+            name (str): 'match', 'tolerance', 'first_half', 'halftime' or 'second_half'.
+        """
+        start, end = match_windows(match)[name]
+        return self.slice(start, end)
+
+    def windows(self, match):
+        """
+        All named windows of a scheduled match, name -> rows.
+        """
+        return {name: self.slice(start, end) for name, (start, end) in match_windows(match).items()}
@@ -0,0 +1,135 @@
+import argparse
+import numpy as np
+import pandas as pd
+from gps_kinematics import load_track, track_kinematics
+from instrumentation import timed
+from match_store import PROCESSED_DATA_DIR, MatchData
+from match_times import datetimes_to_epoch, epoch_to_datetimes, load_schedule
+from time_index import match_windows
+
+# Timeline -> (signal, source column) of the full-resolution series; speed is derived from GPS
+TIMELINE_SOURCES = {
+    'heart_rate': ('heart_rate', 'beats per minute'),
+    'speed': ('gps_location', None),
+    'distance': ('distance', 'distance'),
+}
+
+# Points sent to the browser per chart
+DEFAULT_POINTS = 800
+
+def lttb(times, values, points):
+    """
+    Indices of the points kept by largest-triangle-three-buckets downsampling.
+
+    The first and last points are always kept. The points in between are split
+    into points - 2 equal buckets, and from each bucket the point forming the
+    largest triangle with the previously kept point and the average of the next
+    bucket is kept. This preserves peaks and drops that plain decimation loses.
+
+    Args:
+        times (np.ndarray): Sorted x values (e.g. epoch seconds).
+        values (np.ndarray): y values, without NaN.
+        points (int): Number of points to keep.
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points (all indices if there are at most points).
+    """
+    n = len(times)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x, y = np.asarray(times, dtype=float), np.asarray(values, dtype=float)
+
+    # Bucket b covers [edges[b], edges[b + 1]); bucket averages are computed once
+    edges = (np.arange(points - 1) * (n - 2) / (points - 2)).astype(np.int64) + 1
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    next_x, next_y = np.append(average_x[1:], x[-1]), np.append(average_y[1:], y[-1])
+
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Twice the triangle areas of every candidate in the bucket at once
+        area = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+def full_resolution(match, timeline, data_dir=PROCESSED_DATA_DIR, window='tolerance'):
+    """
+    Full-resolution series of one timeline over a match window, sorted by time.
+
+    Source files are read through MatchData, so recently used matches are
+    served from memory when a chart is zoomed.
+
+    Args:
+        match (dict or pd.Series): One row of match_times.load_schedule().
+        timeline (str): 'heart_rate' (bpm), 'speed' (smoothed GPS speed, m/s) or 'distance' (metres per interval).
+        data_dir (str): Root of the processed data store.
+        window (str): Named match window covered.
+
+    Returns:
+        tuple: (int64 epoch seconds, float values); empty arrays if the match has no data.
+    """
+    if timeline == 'speed':
+        track = load_track(match, data_dir, window)
+        if track is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        samples = track_kinematics(*track)
+        samples = samples[samples['speed'].notna()]
+        return samples['timestamp'].to_numpy(), samples['speed'].to_numpy()
+
+    signal, column = TIMELINE_SOURCES[timeline]
+    data = MatchData(match['date'], data_dir).load(signal, ['timestamp', column])
+    if data is None or data.empty:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    data = data.dropna(subset=['timestamp', column])
+    times = datetimes_to_epoch(data['timestamp'])
+    start, end = match_windows(match)[window]
+    inside = (times >= start) & (times <= end)
+    order = np.argsort(times[inside], kind='stable')
+    return times[inside][order], data[column].to_numpy(dtype=float)[inside][order]
+
+def downsampled_timeline(match, timeline, start=None, end=None, points=DEFAULT_POINTS, data_dir=PROCESSED_DATA_DIR):
+    """
+    One timeline of a match between start and end, downsampled with LTTB to at most points points.
+
+    Zooming in narrows [start, end], so the full-resolution samples of just
+    that window are downsampled and the chart shows more detail.
+
+    Args:
+        match (dict or pd.Series): One row of match_times.load_schedule().
+        timeline (str): A TIMELINE_SOURCES key.
+        start (int, optional): Epoch seconds of the window start; the tolerance window start if omitted.
+        end (int, optional): Epoch seconds of the window end; the tolerance window end if omitted.
+        points (int): Maximum number of points returned.
+        data_dir (str): Root of the processed data store.
+
+    Returns:
+        pd.DataFrame: 'timestamp' (UTC datetimes) and 'value'.
+    """
+    with timed('compute', match['date'], f"timeline_{timeline}"):
+        times, values = full_resolution(match, timeline, data_dir)
+        first = np.searchsorted(times, start, side='left') if start is not None else 0
+        last = np.searchsorted(times, end, side='right') if end is not None else len(times)
+        times, values = times[first:last], values[first:last]
+        kept = lttb(times, values, points)
+    return pd.DataFrame({'timestamp': epoch_to_datetimes(times[kept]), 'value': values[kept]})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the size of the downsampled timelines of a match.")
+    parser.add_argument("match_date", help="Match date (YYYY-MM-DD).")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS, help="Points per timeline.")
+    args = parser.parse_args()
+
+    schedule = load_schedule()
+    match = schedule[schedule['date'] == args.match_date].iloc[0]
+    for timeline in TIMELINE_SOURCES:
+        full_times, _ = full_resolution(match, timeline)
+        series = downsampled_timeline(match, timeline, points=args.points)
+        print(f"{timeline}: {len(full_times)} samples -> {len(series)} points.")
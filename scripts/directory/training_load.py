@@ -0,0 +1,320 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from instrumentation import timed
+from match_store import PROCESSED_DATA_DIR, MatchData, source_path
+from match_times import datetimes_to_epoch, load_schedule
+from results_store import DEFAULT_PLAYER, connect, write_training_load
+from substitution_insight import MAX_SAMPLE_GAP_SECONDS
+from time_index import match_windows
+
+# Incremental per-player training load state
+STATE_PATH = "./cache/training_load_state.json"
+
+# Lower edges of heart rate zones 1-5 as fractions of HRmax
+HR_ZONE_EDGES = [0.5, 0.6, 0.7, 0.8, 0.9]
+ZONE_COLUMNS = [f"zone_{zone}_minutes" for zone in range(1, len(HR_ZONE_EDGES) + 1)]
+
+# Banister TRIMP weighting factors (a, b) in a * HRr * exp(b * HRr), by sex
+TRIMP_WEIGHTS = {'male': (0.64, 1.92), 'female': (0.86, 1.67)}
+DEFAULT_SEX = 'male'
+RESTING_HR = 60
+
+# TRIMP column -> match window it covers
+TRIMP_WINDOWS = {'trimp': 'match', 'trimp_first_half': 'first_half', 'trimp_second_half': 'second_half'}
+
+# EWMA spans in days of the acute and chronic workloads. Ratios of matches
+# within the first chronic span of a player's history are not reported, as
+# the chronic workload is still building up from zero
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+# Bumped when the workload model changes, so stored player histories are recomputed
+ACWR_VERSION = 2
+
+LOAD_COLUMNS = [*TRIMP_WINDOWS, *ZONE_COLUMNS, 'recorded_minutes']
+ACWR_COLUMNS = ['acute_load', 'chronic_load', 'acwr']
+
+def heart_rate_samples(match, data_dir=PROCESSED_DATA_DIR):
+    """
+    Heart rate samples inside a match's window, with the time each one stands for.
+
+    Each sample covers the time since the previous sample, capped at
+    MAX_SAMPLE_GAP_SECONDS (the first gets the median interval), as in the
+    substitution analysis.
+
+    Returns:
+        pd.DataFrame or None: 'timestamp' (epoch seconds), 'bpm', 'seconds' and one
+        boolean column per TRIMP window, or None if the match has no heart rate data.
+    """
+    data = MatchData(match['date'], data_dir).load('heart_rate', ['timestamp', 'beats per minute'])
+    if data is None or data.empty:
+        return None
+    times = datetimes_to_epoch(data['timestamp'])
+    order = np.argsort(times, kind='stable')
+    times, bpm = times[order], data['beats per minute'].to_numpy(dtype=float)[order]
+
+    seconds = np.diff(times, prepend=times[0]).astype(float)
+    seconds[0] = np.median(seconds[1:]) if len(times) > 1 else 1
+    seconds = np.minimum(seconds, MAX_SAMPLE_GAP_SECONDS)
+
+    windows = match_windows(match)
+    samples = pd.DataFrame({'timestamp': times, 'bpm': bpm, 'seconds': seconds})
+    for window in TRIMP_WINDOWS.values():
+        start, end = windows[window]
+        samples[window] = (times >= start) & (times < end)
+    samples = samples[samples['match']]
+    return samples if not samples.empty else None
+
+def compute_training_load(samples, hr_max, hr_rest, sex):
+    """
+    Vectorized time-in-zone and Banister TRIMP for many player-matches at once.
+
+    All samples are processed in one pass: per-sample values are summed into
+    their player-match group with np.bincount.
+
+    Args:
+        samples (list): heart_rate_samples frame per player-match.
+        hr_max (list): HRmax per player-match.
+        hr_rest (list): Resting heart rate per player-match.
+        sex (list): 'male' or 'female' per player-match, selecting the TRIMP weights.
+
+    Returns:
+        pd.DataFrame: LOAD_COLUMNS, one row per player-match in input order.
+    """
+    n = len(samples)
+    group = np.repeat(np.arange(n), [len(frame) for frame in samples])
+    stacked = pd.concat(samples, ignore_index=True)
+    bpm, seconds = stacked['bpm'].to_numpy(), stacked['seconds'].to_numpy()
+
+    hr_max, hr_rest = np.asarray(hr_max, dtype=float)[group], np.asarray(hr_rest, dtype=float)[group]
+    a, b = np.array([TRIMP_WEIGHTS[value] for value in sex]).reshape(n, 2)[group].T
+    heart_rate_reserve = np.clip((bpm - hr_rest) / (hr_max - hr_rest), 0, None)
+    trimp = seconds / 60 * heart_rate_reserve * a * np.exp(b * heart_rate_reserve)
+
+    loads = {
+        column: np.bincount(group, trimp * stacked[window].to_numpy(), minlength=n)
+        for column, window in TRIMP_WINDOWS.items()
+    }
+
+    # Zone 0 is time below zone 1
+    zones = np.digitize(bpm / hr_max, HR_ZONE_EDGES)
+    zone_seconds = np.bincount(group * (len(HR_ZONE_EDGES) + 1) + zones, seconds, minlength=n * (len(HR_ZONE_EDGES) + 1))
+    zone_minutes = zone_seconds.reshape(n, len(HR_ZONE_EDGES) + 1)[:, 1:] / 60
+    for index, column in enumerate(ZONE_COLUMNS):
+        loads[column] = zone_minutes[:, index]
+    loads['recorded_minutes'] = np.bincount(group, seconds, minlength=n) / 60
+    return pd.DataFrame(loads, columns=LOAD_COLUMNS)
+
+def _ewma_factors():
+    return 2 / (ACUTE_DAYS + 1), 2 / (CHRONIC_DAYS + 1)
+
+def _day(match_date):
+    return int(np.datetime64(match_date, 'D').astype(np.int64))
+
+def acwr_series(loads):
+    """
+    Acute and chronic EWMA workloads and their ratio over whole seasons, batched over players.
+
+    Match loads go on a daily grid (rest days count as zero load) with one row
+    per player, and both EWMAs run along it with scipy.signal.lfilter, starting
+    from zero load before the player's first match. The ratio is NaN for
+    matches less than CHRONIC_DAYS after the player's first match.
+
+    Args:
+        loads (pd.DataFrame): 'player', 'match_date' and 'trimp' per match.
+
+    Returns:
+        pd.DataFrame: The rows of loads with ACWR_COLUMNS added.
+    """
+    loads = loads.copy()
+    players, player_index = np.unique(loads['player'], return_inverse=True)
+    days = np.array([_day(match_date) for match_date in loads['match_date']])
+    first_day = days.min()
+    daily = np.zeros((len(players), days.max() - first_day + 1))
+    np.add.at(daily, (player_index, days - first_day), loads['trimp'].to_numpy(dtype=float))
+
+    for column, factor in zip(ACWR_COLUMNS, _ewma_factors()):
+        ewma = lfilter([factor], [1, factor - 1], daily, axis=1)
+        loads[column] = ewma[player_index, days - first_day]
+
+    first_days = pd.Series(days).groupby(player_index).min().to_numpy()
+    reliable = (days - first_days[player_index] >= CHRONIC_DAYS) & (loads['chronic_load'] > 0)
+    loads['acwr'] = (loads['acute_load'] / loads['chronic_load']).where(reliable)
+    return loads
+
+def fold_acwr(player_state, match_date, trimp):
+    """
+    Fold a match later than every stored match into a player's EWMA workloads in O(1).
+
+    Both EWMAs decay over the rest days since the last match (from zero before
+    the first match), then take in the new load, as in acwr_series.
+
+    Args:
+        player_state (dict): The player's entry of the training load state, updated in place.
+        match_date (str): The date of the match (YYYY-MM-DD).
+        trimp (float): The match's TRIMP.
+    """
+    acute_factor, chronic_factor = _ewma_factors()
+    last_date = player_state.get('last_date')
+    if last_date is None:
+        player_state['first_date'] = match_date
+        acute, chronic = acute_factor * trimp, chronic_factor * trimp
+    else:
+        gap = _day(match_date) - _day(last_date)
+        acute = acute_factor * trimp + (1 - acute_factor) ** gap * player_state['acute_load']
+        chronic = chronic_factor * trimp + (1 - chronic_factor) ** gap * player_state['chronic_load']
+    reliable = _day(match_date) - _day(player_state['first_date']) >= CHRONIC_DAYS and chronic > 0
+    player_state.update({'last_date': match_date, 'acute_load': acute, 'chronic_load': chronic, 'version': ACWR_VERSION})
+    player_state['matches'][match_date].update({'acute_load': acute, 'chronic_load': chronic, 'acwr': acute / chronic if reliable else None})
+
+def rebuild_acwr(state, players):
+    """
+    Recompute the EWMA workloads of whole player histories in one batched pass.
+
+    Returns:
+        list: (player, match date) of every recomputed match.
+    """
+    history = pd.DataFrame([
+        {'player': player, 'match_date': match_date, 'trimp': entry['trimp']}
+        for player in players for match_date, entry in state[player]['matches'].items()
+    ])
+    if history.empty:
+        return []
+    for player in players:
+        if state[player]['matches']:
+            state[player]['first_date'] = min(state[player]['matches'])
+    history = acwr_series(history).sort_values(['player', 'match_date'])
+    for row in history.to_dict('records'):
+        acwr = None if pd.isna(row['acwr']) else row['acwr']
+        state[row['player']]['matches'][row['match_date']].update({'acute_load': row['acute_load'], 'chronic_load': row['chronic_load'], 'acwr': acwr})
+        state[row['player']].update({'last_date': row['match_date'], 'acute_load': row['acute_load'], 'chronic_load': row['chronic_load'], 'version': ACWR_VERSION})
+    return list(zip(history['player'], history['match_date']))
+
+def load_state(state_path=STATE_PATH):
+    if os.path.exists(state_path):
+        with open(state_path, "r") as file:
+            return json.load(file)
+    return {}
+
+def save_state(state, state_path=STATE_PATH):
+    """
+    Persist the training load state atomically.
+    """
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    temp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(temp_path, state_path)
+
+def _source_key(match_date, data_dir, details):
+    # What a match's load depends on: its heart rate file and the player's heart rate parameters
+    path = source_path(match_date, 'heart_rate', data_dir)
+    if path is None:
+        return None
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns, details['hr_max'], details['hr_rest'], details['sex']]
+
+def update_training_load(players, schedule, data_dirs, state):
+    """
+    Compute training load for new or changed player-matches and update the ACWR incrementally.
+
+    Player-matches whose heart rate file and parameters are unchanged are
+    skipped. The others are computed together in one batched pass, then folded
+    into each player's EWMA workloads in date order.
+
+    Args:
+        players (dict): Player -> {'hr_max', 'hr_rest', 'sex', ...}, as from squad.load_players.
+        schedule (pd.DataFrame): Match schedule from load_schedule.
+        data_dirs (dict): Player -> processed data directory.
+        state (dict): Training load state from load_state, updated in place.
+
+    Returns:
+        pd.DataFrame: 'player', 'match_date', LOAD_COLUMNS and ACWR_COLUMNS of every changed row.
+    """
+    pending, samples = [], []
+    for player, details in players.items():
+        details = {
+            'hr_max': details['hr_max'],
+            'hr_rest': details.get('hr_rest') or RESTING_HR,
+            'sex': details.get('sex') or DEFAULT_SEX,
+        }
+        player_state = state.setdefault(player, {'matches': {}})
+        for _, match in schedule.sort_values('date').iterrows():
+            key = _source_key(match['date'], data_dirs[player], details)
+            entry = player_state['matches'].get(match['date'])
+            if key is None or (entry is not None and entry['key'] == key):
+                continue
+            match_samples = heart_rate_samples(match, data_dirs[player])
+            if match_samples is None:
+                continue
+            pending.append((player, match['date'], key, details))
+            samples.append(match_samples)
+
+    # Matches appended after a player's latest one are folded in; any other
+    # change (or a player's first matches, or a history stored by an older
+    # ACWR_VERSION) rebuilds that player's history
+    rebuild = {
+        player for player, match_date, _, _ in pending
+        if state[player].get('last_date') is None or match_date <= state[player]['last_date']
+    }
+    rebuild.update(
+        player for player in players
+        if state[player]['matches'] and state[player].get('version') != ACWR_VERSION
+    )
+
+    changed = set()
+    if pending:
+        with timed('compute', name='training_load', rows=sum(len(frame) for frame in samples)):
+            loads = compute_training_load(
+                samples,
+                [details['hr_max'] for *_, details in pending],
+                [details['hr_rest'] for *_, details in pending],
+                [details['sex'] for *_, details in pending],
+            )
+        for (player, match_date, key, _), row in zip(pending, loads.to_dict('records')):
+            state[player]['matches'][match_date] = {'key': key, **row}
+            if player not in rebuild:
+                fold_acwr(state[player], match_date, row['trimp'])
+                changed.add((player, match_date))
+    changed.update(rebuild_acwr(state, sorted(rebuild)))
+
+    rows = [
+        {'player': player, 'match_date': match_date, **{column: state[player]['matches'][match_date].get(column) for column in [*LOAD_COLUMNS, *ACWR_COLUMNS]}}
+        for player, match_date in sorted(changed)
+    ]
+    return pd.DataFrame(rows, columns=['player', 'match_date', *LOAD_COLUMNS, *ACWR_COLUMNS])
+
+if __name__ == "__main__":
+    from squad import PLAYERS_PATH, load_players, player_data_dir
+
+    parser = argparse.ArgumentParser(description="Compute heart rate zones, TRIMP and acute:chronic workload ratios.")
+    parser.add_argument("--squad", action="store_true", help="Run for every player in the squad registry.")
+    parser.add_argument("--players", default=PLAYERS_PATH, help="Path to the player registry CSV.")
+    parser.add_argument("--age", type=int, default=22, help="Player age, used to estimate HRmax (single player).")
+    parser.add_argument("--hr-rest", type=float, default=RESTING_HR, help="Resting heart rate (single player).")
+    args = parser.parse_args()
+
+    if args.squad:
+        players = load_players(args.players)
+        data_dirs = {player: player_data_dir(player) for player in players}
+    else:
+        players = {DEFAULT_PLAYER: {'hr_max': 220 - args.age, 'hr_rest': args.hr_rest, 'sex': None}}
+        data_dirs = {DEFAULT_PLAYER: PROCESSED_DATA_DIR}
+
+    state = load_state()
+    changed = update_training_load(players, load_schedule(), data_dirs, state)
+    save_state(state)
+
+    conn = connect()
+    write_training_load(conn, changed)
+    conn.close()
+
+    for row in changed.to_dict('records'):
+        acwr = f"{row['acwr']:.2f}" if pd.notna(row['acwr']) else "n/a"
+        print(f"{row['player']} {row['match_date']}: TRIMP {row['trimp']:.0f} "
+              f"({row['trimp_first_half']:.0f} / {row['trimp_second_half']:.0f}), ACWR {acwr}")
+    print(f"Training load updated for {len(changed)} matches.")
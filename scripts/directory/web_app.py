@@ -1,34 +1,182 @@
 import os
+import threading
+from datetime import timedelta
 import streamlit as st
+import altair as alt
 import pandas as pd
-from PIL import Image
+from effort_rating import ingest_matches, load_component_cache, load_normalization_state, save_component_cache, save_normalization_state
+from heatmap_arbitrary_pitch import process_match_heatmap
+from match_store import SIGNAL_TYPES, source_path
+from match_times import load_schedule
+from pitch_projection import venue_key
+import results_store
+from substitution_insight import process_match_substitutions
+from timeline import DEFAULT_POINTS, downsampled_timeline
 
 # Constants for directory paths
 BASE_DIR = os.path.abspath(os.getcwd())
-HEATMAP_DIR = os.path.join(BASE_DIR, "outputs", "heatmaps")
-EFFORT_DIR = os.path.join(BASE_DIR, "outputs", "effort_ratings")
-SUBSTITUTION_DIR = os.path.join(BASE_DIR, "outputs", "substitution_recommendations")
+PROCESSED_DATA_DIR = os.path.join(BASE_DIR, "processed_data")
+RESULTS_DB_PATH = os.path.join(BASE_DIR, "outputs", "results.db")
+SCHEDULE_PATH = os.path.join(BASE_DIR, "reference_data", "hockey_matches_schedule.csv")
 
-# Load match schedule
-schedule_path = os.path.join(BASE_DIR, "reference_data", "hockey_matches_schedule.csv")
-schedule = pd.read_csv(schedule_path)
-schedule['date'] = pd.to_datetime(schedule['date'], dayfirst=True).dt.strftime('%Y-%m-%d')
+# Timeline marker label per recommendation signal; other signals show the stored reason
+MARKER_LABELS = {'heart_rate': "Sustained high heart rate", 'distance': "Movement drop"}
 
-# Add enhanced match titles
-schedule['match_title'] = schedule.apply(
-    lambda row: f"{row['date']} (vs {row['opponent']} - {'Home' if row['home_or_away'] == 'home' else 'Away'}, Goals: {row['user_goals_scored']})", axis=1
-)
+def file_mtime(path):
+    """
+    Modification time of a file (None if it does not exist), used as part of cache keys.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def match_data_version(match_date):
+    """
+    Latest modification time of a match's processed signal files (None if it has none).
+
+    The files are overwritten in place when a match is reprocessed, which does
+    not change the mtime of the match folder itself.
+    """
+    mtimes = [
+        file_mtime(path)
+        for path in (source_path(match_date, signal, PROCESSED_DATA_DIR) for signal in SIGNAL_TYPES)
+        if path is not None
+    ]
+    return max((mtime for mtime in mtimes if mtime is not None), default=None)
+
+@st.cache_resource
+def load_matches(schedule_path, mtime):
+    """
+    Match schedule as an ordered dict of date -> match details, shared by all sessions.
+    """
+    schedule = load_schedule(schedule_path)
+    location = schedule['home_or_away'].map({'home': 'Home'}).fillna('Away')
+    schedule['match_title'] = (
+        schedule['date'] + " (vs " + schedule['opponent'].astype(str) + " - " + location +
+        ", Goals: " + schedule['user_goals_scored'].astype(str) + ")"
+    )
+    return {match['date']: match for match in schedule.to_dict('records')}
+
+@st.cache_resource
+def store_connection():
+    # One results store connection for the whole server
+    return results_store.connect(RESULTS_DB_PATH)
+
+# Cached lookups: the version argument (the store's mtime) is only part of the
+# cache key, so results written by the pipeline are picked up on the next rerun
+@st.cache_data
+def read_effort_rating(match_date, version):
+    return results_store.read_effort_rating(store_connection(), match_date)
+
+@st.cache_data
+def read_heatmap(match_date, version):
+    return results_store.read_heatmap(store_connection(), match_date)
+
+@st.cache_data
+def read_substitution_recommendations(match_date, version):
+    recommendations = results_store.read_recommendations(store_connection(), match_date)
+    if recommendations is None:
+        return None
+
+    formatted_subs = []
+    for timestamp, signal, reason in recommendations:
+        reason_text = "movement" if signal == 'distance' else "heart rate"
+        formatted_subs.append(f"**{pd.Timestamp(timestamp, unit='s')}** - Substitution recommended due to significant drop in {reason_text}.")
+    return formatted_subs
+
+@st.cache_data
+def read_recommendation_markers(match_date, version):
+    recommendations = results_store.read_recommendations(store_connection(), match_date)
+    if recommendations is None:
+        return None
+    markers = pd.DataFrame(recommendations, columns=['timestamp', 'signal', 'reason'])
+    markers['timestamp'] = pd.to_datetime(markers['timestamp'], unit='s')
+    markers['reason'] = [MARKER_LABELS.get(signal, reason) for signal, reason in zip(markers['signal'], markers['reason'])]
+    return markers
+
+# Downsampled timelines are cached per match, zoom window and version of the
+# match's processed data; zooming only reads the samples inside the window
+@st.cache_data(show_spinner=False)
+def read_timeline(match_date, timeline, start, end, data_mtime):
+    return downsampled_timeline(matches[match_date], timeline, start, end, DEFAULT_POINTS, PROCESSED_DATA_DIR)
+
+@st.cache_resource
+def compute_lock():
+    # One lock per server: the pipeline steps share on-disk caches
+    return threading.Lock()
+
+def compute_effort_rating(match):
+    # Ratings are normalized across matches: a single match gives min == max for
+    # every component, so every match with data is ingested, and nothing is
+    # rated until there are at least two
+    match_dates = [
+        match_date for match_date in matches
+        if os.path.isdir(os.path.join(PROCESSED_DATA_DIR, f"match_{match_date}"))
+    ]
+    if match['date'] not in match_dates or len(match_dates) < 2:
+        return
+    cache = load_component_cache()
+    state = load_normalization_state()
+    ingest_matches(match_dates, PROCESSED_DATA_DIR, os.path.join(BASE_DIR, "outputs"), state, cache)
+    save_component_cache(cache)
+    save_normalization_state(state)
+
+def compute_heatmap(match):
+    process_match_heatmap(match['date'], match['match_start'], match['match_end'], venue_key(match))
+
+def compute_substitution_recommendations(match):
+    process_match_substitutions(match['date'], match['tolerance_start'], match['tolerance_end'])
+
+@st.cache_data(show_spinner=False)
+def attempt_compute(kind, match_date, data_mtime):
+    """
+    Run a pipeline step for one match, at most once per version of its processed data.
+
+    Matches without usable data produce no output; caching the attempt keeps
+    every rerun from trying again until the data folder changes.
+    """
+    compute = {
+        'effort': compute_effort_rating,
+        'heatmap': compute_heatmap,
+        'substitution': compute_substitution_recommendations,
+    }[kind]
+    with compute_lock():
+        compute(matches[match_date])
+    return True
+
+def ensure_output(kind, match_date, read):
+    """
+    Look up a match's output in the results store, computing it on demand if it is missing.
+
+    Args:
+        kind (str): 'effort', 'heatmap' or 'substitution'.
+        match_date (str): The date of the match (YYYY-MM-DD).
+        read (callable): Cached lookup taking (match_date, store version).
+
+    Returns:
+        The lookup result, or None if the output could not be produced.
+    """
+    result = read(match_date, file_mtime(RESULTS_DB_PATH))
+    if result is None:
+        with st.spinner(f"Computing {kind} for {match_date}..."):
+            attempt_compute(kind, match_date, match_data_version(match_date))
+        result = read(match_date, file_mtime(RESULTS_DB_PATH))
+    return result
+
+# Load match schedule
+matches = load_matches(SCHEDULE_PATH, file_mtime(SCHEDULE_PATH))
 
 # Sidebar for match day selection
 st.sidebar.title("Match Insights Viewer")
 selected_match_date = st.sidebar.selectbox(
     "Select Match Date",
-    options=schedule['date'],
-    format_func=lambda x: schedule.loc[schedule['date'] == x, 'match_title'].values[0]
+    options=list(matches),
+    format_func=lambda x: matches[x]['match_title']
 )
 
 # Extract selected match details
-selected_match_details = schedule.loc[schedule['date'] == selected_match_date].iloc[0]
+selected_match_details = matches[selected_match_date]
 match_opponent = selected_match_details['opponent']
 match_location = "Home" if selected_match_details['home_or_away'] == 'home' else "Away"
 user_goals = selected_match_details['user_goals_scored']
@@ -55,9 +203,8 @@ st.markdown(
 
 # Function to display effort rating
 def display_effort_rating(selected_match_date):
-    effort_file = os.path.join(EFFORT_DIR, f"effort_rating_{selected_match_date}.csv")
-    if os.path.exists(effort_file):
-        effort_data = pd.read_csv(effort_file)
+    effort_data = ensure_output('effort', selected_match_date, read_effort_rating)
+    if effort_data is not None:
 
         # Extract the effort rating (last value in the table)
         effort_rating = effort_data.iloc[0, -1]
@@ -88,35 +235,58 @@ def display_effort_rating(selected_match_date):
 
 # Function to load and display heatmap
 def display_heatmap(selected_match_date):
-    heatmap_path = os.path.join(HEATMAP_DIR, f"heatmap_{selected_match_date}.png")
-    if os.path.exists(heatmap_path):
+    heatmap = ensure_output('heatmap', selected_match_date, read_heatmap)
+    if heatmap is not None:
         st.subheader("Heatmap")
-        st.image(Image.open(heatmap_path), caption=f"Heatmap for {selected_match_date}", use_container_width=True)
+        st.image(heatmap, caption=f"Heatmap for {selected_match_date}", use_container_width=True)
     else:
         st.warning(f"No heatmap available for {selected_match_date}.")
 
 # Function to load and display substitution recommendations
 def display_substitution_recommendations(selected_match_date):
-    substitution_file = os.path.join(SUBSTITUTION_DIR, f"substitution_recommendations_{selected_match_date}.txt")
-    if os.path.exists(substitution_file):
+    formatted_subs = ensure_output('substitution', selected_match_date, read_substitution_recommendations)
+    if formatted_subs is not None:
         st.subheader("Substitution Recommendations")
-        with open(substitution_file, "r") as file:
-            substitution_data = file.readlines()
-
-        formatted_subs = []
-        for line in substitution_data:
-            time, reason = line.strip().split(": ")
-            reason_text = "movement" if "movement" in reason.lower() else "heart rate"
-            formatted_subs.append(f"**{time}** - Substitution recommended due to significant drop in {reason_text}.")
-
         for sub in formatted_subs:
             st.markdown(f"- {sub}")
     else:
         st.warning(f"No substitution recommendations available for {selected_match_date}.")
 
+# Function to display heart rate, speed and distance timelines with substitution markers
+def display_timelines(selected_match_date):
+    match = matches[selected_match_date]
+    window_start, window_end = match['tolerance_start'].to_pydatetime(), match['tolerance_end'].to_pydatetime()
+    st.subheader("Timelines")
+    zoom_start, zoom_end = st.slider(
+        "Time window (UTC)", min_value=window_start, max_value=window_end,
+        value=(window_start, window_end), step=timedelta(minutes=1), format="HH:mm",
+    )
+    start, end = int(pd.Timestamp(zoom_start).timestamp()), int(pd.Timestamp(zoom_end).timestamp())
+    data_mtime = match_data_version(selected_match_date)
+
+    markers = ensure_output('substitution', selected_match_date, read_recommendation_markers)
+    if markers is not None:
+        markers = markers[(markers['timestamp'] >= pd.Timestamp(zoom_start)) & (markers['timestamp'] <= pd.Timestamp(zoom_end))]
+
+    for timeline, title in [('heart_rate', "Heart Rate (bpm)"), ('speed', "Speed (m/s)"), ('distance', "Distance per Minute (m)")]:
+        series = read_timeline(selected_match_date, timeline, start, end, data_mtime)
+        if series.empty:
+            st.info(f"No {title.split(' (')[0].lower()} data for {selected_match_date}.")
+            continue
+        chart = alt.Chart(series).mark_line().encode(
+            x=alt.X('timestamp:T', title="Time (UTC)"),
+            y=alt.Y('value:Q', title=title),
+        )
+        if markers is not None and not markers.empty:
+            chart += alt.Chart(markers).mark_rule(color='red', strokeDash=[4, 4]).encode(
+                x='timestamp:T', tooltip=[alt.Tooltip('timestamp:T', title="Time"), alt.Tooltip('reason:N', title="Substitution")],
+            )
+        st.altair_chart(chart.interactive(bind_y=False), use_container_width=True)
+
 # Display all insights
 display_effort_rating(selected_match_date)
 display_heatmap(selected_match_date)
+display_timelines(selected_match_date)
 display_substitution_recommendations(selected_match_date)
 
 # Footer
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The pipeline modules are flat scripts that import each other by name
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts", "directory"))
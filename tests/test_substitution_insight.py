@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from substitution_insight import FATIGUE_WINDOW_SECONDS, debounce_times, sustained_effort_mask
+
+def _random_effort(rng, n):
+    # Alternating runs of effort and rest, long enough for some windows to be sustained
+    runs = rng.integers(1, 2 * FATIGUE_WINDOW_SECONDS, size=n)
+    return np.repeat(np.arange(len(runs)) % 2 == rng.integers(0, 2), runs)[:n]
+
+def test_sustained_effort_mask_matches_rolling_count_on_1s_data():
+    rng = np.random.default_rng(0)
+    sustained = 0
+    for _ in range(200):
+        n = int(rng.integers(1, 3000))
+        times = 1_700_000_000 + np.arange(n, dtype=np.int64)
+        effort = _random_effort(rng, n)
+
+        expected = pd.Series(effort).rolling(FATIGUE_WINDOW_SECONDS).sum() >= FATIGUE_WINDOW_SECONDS
+        np.testing.assert_array_equal(sustained_effort_mask(times, effort), expected.to_numpy())
+        sustained += expected.any()
+    # Both outcomes are exercised
+    assert 0 < sustained < 200
+
+def test_sustained_effort_mask_bridges_short_gaps_only():
+    times = np.concatenate([np.arange(0, 120), np.arange(130, 260)]).astype(np.int64)
+    effort = np.ones(len(times), dtype=bool)
+    assert sustained_effort_mask(times, effort, max_gap_seconds=15)[-1]
+    assert not sustained_effort_mask(times, effort, max_gap_seconds=5).any()
+
+def test_sustained_effort_mask_empty():
+    assert len(sustained_effort_mask(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool))) == 0
+
+def test_debounce_times_keeps_minimum_gap():
+    times = np.array([10, 100, 350, 400, 700, 701], dtype=np.int64)
+    picked, last_time = debounce_times(times, 0, 300)
+    np.testing.assert_array_equal(times[picked], [350, 700])
+    assert last_time == 700
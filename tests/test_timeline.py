@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from match_store import write_signal
+from match_times import MATCH_WINDOWS
+from timeline import downsampled_timeline, lttb
+
+def reference_lttb(x, y, points):
+    # Largest-triangle-three-buckets as published (Steinarsson, 2013), one point at a time
+    n = len(x)
+    if points >= n or points < 3:
+        return list(range(n))
+    kept = [0]
+    previous = 0
+    for bucket in range(points - 2):
+        start = bucket * (n - 2) // (points - 2) + 1
+        end = (bucket + 1) * (n - 2) // (points - 2) + 1
+        next_end = min((bucket + 2) * (n - 2) // (points - 2) + 1, n)
+        average_x, average_y = np.mean(x[end:next_end]), np.mean(y[end:next_end])
+
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            area = abs((x[previous] - average_x) * (y[index] - y[previous]) - (x[previous] - x[index]) * (average_y - y[previous]))
+            if area > best_area:
+                best, best_area = index, area
+        kept.append(best)
+        previous = best
+    kept.append(n - 1)
+    return kept
+
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        n = int(rng.integers(3, 2000))
+        points = int(rng.integers(3, n + 1))
+        times = np.sort(rng.choice(10 * n, size=n, replace=False)).astype(np.int64)
+        values = np.cumsum(rng.normal(size=n))
+        np.testing.assert_array_equal(lttb(times, values, points), reference_lttb(times.astype(float), values, points))
+
+def test_lttb_keeps_endpoints_and_peaks():
+    times = np.arange(1000)
+    values = np.zeros(1000)
+    values[437] = 50.0
+    kept = lttb(times, values, 20)
+    assert len(kept) == 20
+    assert kept[0] == 0 and kept[-1] == 999
+    assert 437 in kept
+    assert np.all(np.diff(kept) > 0)
+
+def test_lttb_returns_everything_when_small():
+    np.testing.assert_array_equal(lttb(np.arange(5), np.arange(5.0), 10), np.arange(5))
+
+def _match_with_heart_rate(data_dir, seconds):
+    # One match whose windows all cover the recorded samples, with a spike of heart rate mid-match
+    start = pd.Timestamp('2024-10-16 14:00:00')
+    times = start + pd.to_timedelta(np.arange(seconds), unit='s')
+    bpm = np.full(seconds, 120)
+    bpm[seconds // 3] = 190
+    write_signal(pd.DataFrame({'timestamp': times, 'beats per minute': bpm}), '2024-10-16', 'heart_rate', data_dir)
+    epoch_start = int(start.timestamp())
+    match = {'date': '2024-10-16'}
+    for start_column, end_column in MATCH_WINDOWS.values():
+        match[f"{start_column}_epoch"], match[f"{end_column}_epoch"] = epoch_start, epoch_start + seconds - 1
+    return match, epoch_start
+
+def test_downsampled_timeline_limits_points_and_keeps_peaks(tmp_path):
+    match, _ = _match_with_heart_rate(str(tmp_path), 3600)
+    series = downsampled_timeline(match, 'heart_rate', points=100, data_dir=str(tmp_path))
+    assert len(series) == 100
+    assert series['value'].max() == 190
+    assert series['timestamp'].is_monotonic_increasing
+
+def test_downsampled_timeline_zoom_returns_only_the_window(tmp_path):
+    match, epoch_start = _match_with_heart_rate(str(tmp_path), 3600)
+    start, end = epoch_start + 600, epoch_start + 659
+    series = downsampled_timeline(match, 'heart_rate', start, end, points=100, data_dir=str(tmp_path))
+    # A 60-second window has fewer samples than points, so all of them are returned
+    assert len(series) == 60
+    assert series['timestamp'].iloc[0] == pd.Timestamp(start, unit='s')
+    assert series['timestamp'].iloc[-1] == pd.Timestamp(end, unit='s')
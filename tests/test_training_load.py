@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from training_load import ACUTE_DAYS, CHRONIC_DAYS, acwr_series, fold_acwr, rebuild_acwr
+
+def _fold(history):
+    # Fold every match of each player in date order, as incremental runs do
+    state = {}
+    for row in history.sort_values(['player', 'match_date']).to_dict('records'):
+        player_state = state.setdefault(row['player'], {'matches': {}})
+        player_state['matches'][row['match_date']] = {'trimp': row['trimp']}
+        fold_acwr(player_state, row['match_date'], row['trimp'])
+    return state
+
+def test_acwr_series_matches_hand_computed_ewma():
+    history = pd.DataFrame({
+        'player': ['a', 'a', 'a'],
+        'match_date': ['2024-09-01', '2024-09-04', '2024-10-06'],
+        'trimp': [100.0, 50.0, 80.0],
+    })
+    acute_factor, chronic_factor = 2 / (ACUTE_DAYS + 1), 2 / (CHRONIC_DAYS + 1)
+
+    # Both workloads start from zero and decay over the rest days between matches
+    acute = [acute_factor * 100]
+    chronic = [chronic_factor * 100]
+    for gap, trimp in ((3, 50), (32, 80)):
+        acute.append(acute_factor * trimp + (1 - acute_factor) ** gap * acute[-1])
+        chronic.append(chronic_factor * trimp + (1 - chronic_factor) ** gap * chronic[-1])
+
+    result = acwr_series(history)
+    np.testing.assert_allclose(result['acute_load'], acute)
+    np.testing.assert_allclose(result['chronic_load'], chronic)
+    # Only the match at least CHRONIC_DAYS after the first has a ratio
+    assert result['acwr'].iloc[:2].isna().all()
+    assert result['acwr'].iloc[2] == pytest.approx(acute[2] / chronic[2])
+
+def test_rebuild_matches_incremental_fold():
+    rng = np.random.default_rng(0)
+    days = pd.date_range('2024-09-01', '2025-03-01')
+    history = pd.DataFrame([
+        {'player': player, 'match_date': str(day)[:10], 'trimp': float(rng.uniform(50, 300))}
+        for player in ['a', 'b', 'c']
+        for day in sorted(rng.choice(days, size=int(rng.integers(1, 30)), replace=False))
+    ])
+
+    folded = _fold(history)
+    rebuilt = {player: {'matches': {date: {'trimp': entry['trimp']} for date, entry in state['matches'].items()}} for player, state in folded.items()}
+    rebuild_acwr(rebuilt, sorted(rebuilt))
+
+    for player, state in folded.items():
+        for key in ('first_date', 'last_date'):
+            assert rebuilt[player][key] == state[key]
+        for key in ('acute_load', 'chronic_load'):
+            assert rebuilt[player][key] == pytest.approx(state[key])
+        for match_date, entry in state['matches'].items():
+            rebuilt_entry = rebuilt[player]['matches'][match_date]
+            assert rebuilt_entry['acute_load'] == pytest.approx(entry['acute_load'])
+            assert rebuilt_entry['chronic_load'] == pytest.approx(entry['chronic_load'])
+            assert (rebuilt_entry['acwr'] is None) == (entry['acwr'] is None)
+            if entry['acwr'] is not None:
+                assert rebuilt_entry['acwr'] == pytest.approx(entry['acwr'])